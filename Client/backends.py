@@ -0,0 +1,316 @@
+from abc import ABC, abstractmethod
+from array import array
+
+SHAPE_TYPES = ("line", "rectangle", "oval", "text")
+NAMED_COLOURS = {"black": 0x000000, "white": 0xffffff, "red": 0xff0000, "green": 0x00ff00, "blue": 0x0000ff}
+
+
+class CanvasBackend(ABC):
+    """
+    The drawing surface that Commands and CanvasApp draw on.
+
+    It is the subset of the Tk canvas API the client uses, so a Tk canvas, the in-memory
+    backend or a test double can be used interchangeably. Item ids are positive integers
+    handed out by the backend, and "all" can be passed wherever an item id is expected by
+    `delete`.
+    """
+
+    @abstractmethod
+    def create_line(self, x1, y1, x2, y2, **options):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_rectangle(self, x1, y1, x2, y2, **options):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_oval(self, x1, y1, x2, y2, **options):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_text(self, x, y, **options):
+        raise NotImplementedError
+
+    @abstractmethod
+    def itemconfig(self, item, **options):
+        raise NotImplementedError
+
+    def itemconfigure(self, item, **options):
+        return self.itemconfig(item, **options)
+
+    @abstractmethod
+    def coords(self, item, *coords):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, item):
+        raise NotImplementedError
+
+    @abstractmethod
+    def type(self, item):
+        raise NotImplementedError
+
+
+class TkBackend(CanvasBackend):
+    """
+    Draws on a Tk canvas.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+
+    def create_line(self, x1, y1, x2, y2, **options):
+        return self.canvas.create_line(x1, y1, x2, y2, **options)
+
+    def create_rectangle(self, x1, y1, x2, y2, **options):
+        return self.canvas.create_rectangle(x1, y1, x2, y2, **options)
+
+    def create_oval(self, x1, y1, x2, y2, **options):
+        return self.canvas.create_oval(x1, y1, x2, y2, **options)
+
+    def create_text(self, x, y, **options):
+        return self.canvas.create_text(x, y, **options)
+
+    def itemconfig(self, item, **options):
+        return self.canvas.itemconfig(item, **options)
+
+    def coords(self, item, *coords):
+        return self.canvas.coords(item, *coords)
+
+    def delete(self, item):
+        self.canvas.delete(item)
+
+    def type(self, item):
+        return self.canvas.type(item)
+
+
+class MemoryBackend(CanvasBackend):
+    """
+    Keeps the items in compact arrays instead of drawing them.
+
+    Items are numbered from 1 in creation order, like on a Tk canvas, and are never
+    renumbered. Item n lives at index n - first_item of each array. A deleted item is left
+    as a tombstone so that the items after it keep their index, but the arrays do not keep
+    growing with them: `delete("all")`, which every redraw does, starts the arrays afresh
+    from the next item number, and the tombstones at the front are cut off once they make
+    up half of the arrays. Every item has four coordinates (text repeats its anchor point)
+    and a single colour, which is the fill of lines and text and the outline of rectangles
+    and ovals.
+    """
+
+    def __init__(self):
+        self.first_item = 1  # Item number of index 0
+        self.dead_prefix = 0  # Number of tombstones at the front of the arrays
+        self.count = 0
+        self.texts = {}  # item -> text
+        self.named_colours = {}  # item -> colour name
+        self._reset(1)
+
+    def __len__(self):
+        return self.count
+
+    def _reset(self, first_item):
+        """
+        Empties the arrays, numbering the next item `first_item`.
+        """
+        self.types = bytearray()  # 0 for a deleted item, otherwise 1 + index into SHAPE_TYPES
+        self.coordinates = array('i')
+        self.colours = array('l')  # 0xRRGGBB, or -1 when the colour is kept in named_colours
+        self.hidden = bytearray()
+        self.first_item = first_item
+        self.dead_prefix = 0
+
+    def _trim(self):
+        """
+        Cuts the tombstones off the front of the arrays once they make up half of them.
+
+        Each cut costs as much as the tombstones it removes, so deleting the oldest items
+        one by one stays O(1) per delete on average.
+        """
+        while self.dead_prefix < len(self.types) and not self.types[self.dead_prefix]:
+            self.dead_prefix += 1
+        dead = self.dead_prefix
+        if dead == len(self.types):
+            self._reset(self.first_item + dead)
+        elif 2 * dead >= len(self.types):
+            del self.types[:dead]
+            del self.coordinates[:4 * dead]
+            del self.colours[:dead]
+            del self.hidden[:dead]
+            self.first_item += dead
+            self.dead_prefix = 0
+
+    def _create(self, shape_type, x1, y1, x2, y2, options):
+        self.types.append(SHAPE_TYPES.index(shape_type) + 1)
+        self.coordinates.extend((int(x1), int(y1), int(x2), int(y2)))
+        self.colours.append(0)
+        self.hidden.append(0)
+        self.count += 1
+        item = self.first_item + len(self.types) - 1
+        self.itemconfig(item, **options)
+        return item
+
+    def _index(self, item):
+        """
+        Returns the array index of a live item, or None if there is no such item.
+        """
+        try:
+            index = int(item) - self.first_item
+        except (TypeError, ValueError):
+            return None
+        if 0 <= index < len(self.types) and self.types[index]:
+            return index
+        return None
+
+    def create_line(self, x1, y1, x2, y2, **options):
+        return self._create("line", x1, y1, x2, y2, options)
+
+    def create_rectangle(self, x1, y1, x2, y2, **options):
+        return self._create("rectangle", x1, y1, x2, y2, options)
+
+    def create_oval(self, x1, y1, x2, y2, **options):
+        return self._create("oval", x1, y1, x2, y2, options)
+
+    def create_text(self, x, y, **options):
+        return self._create("text", x, y, x, y, options)
+
+    def itemconfig(self, item, **options):
+        index = self._index(item)
+        if index is None:
+            return
+        colour = options.get("fill", options.get("outline"))
+        if colour is not None:
+            if colour.startswith("#"):
+                self.colours[index] = int(colour[1:], 16)
+                self.named_colours.pop(int(item), None)
+            elif colour in NAMED_COLOURS:
+                self.colours[index] = NAMED_COLOURS[colour]
+            else:
+                self.colours[index] = -1
+                self.named_colours[int(item)] = colour
+        if "text" in options:
+            self.texts[int(item)] = options["text"]
+        if "state" in options:
+            self.hidden[index] = options["state"] == "hidden"
+
+    def coords(self, item, *coords):
+        index = self._index(item)
+        if index is None:
+            return []
+        if coords:
+            if len(coords) == 2:
+                coords = coords * 2
+            self.coordinates[4 * index:4 * index + 4] = array('i', map(int, coords[:4]))
+            return None
+        if self.types[index] == SHAPE_TYPES.index("text") + 1:
+            return [float(c) for c in self.coordinates[4 * index:4 * index + 2]]
+        return [float(c) for c in self.coordinates[4 * index:4 * index + 4]]
+
+    def delete(self, item):
+        if item == "all":
+            self._reset(self.first_item + len(self.types))
+            self.texts.clear()
+            self.named_colours.clear()
+            self.count = 0
+            return
+        index = self._index(item)
+        if index is None:
+            return
+        self.types[index] = 0
+        self.texts.pop(int(item), None)
+        self.named_colours.pop(int(item), None)
+        self.count -= 1
+        if index == self.dead_prefix:
+            self._trim()
+
+    def type(self, item):
+        index = self._index(item)
+        if index is None:
+            return None
+        return SHAPE_TYPES[self.types[index] - 1]
+
+    def itemcget(self, item, option):
+        """
+        Returns an item option the way Tk reports it: colours as "#rrggbb", state as "normal" or "hidden".
+        """
+        index = self._index(item)
+        if index is None:
+            return None
+        if option in ("fill", "outline"):
+            if self.colours[index] < 0:
+                return self.named_colours[int(item)]
+            return '#{:06x}'.format(self.colours[index])
+        if option == "text":
+            return self.texts.get(int(item), "")
+        if option == "state":
+            return "hidden" if self.hidden[index] else "normal"
+        return None
+
+    def find(self, shape_type=None, bbox=None, include_hidden=True):
+        """
+        Finds the live items matching a type and overlapping a bounding box.
+
+        Parameters:
+            shape_type (str, optional): Only return items of this type.
+            bbox (tuple, optional): Only return items whose bounds overlap (x1, y1, x2, y2).
+            include_hidden (bool, optional): Whether hidden items are returned. Defaults to True.
+
+        Returns:
+            list: The matching item ids, in creation order.
+        """
+        wanted = SHAPE_TYPES.index(shape_type) + 1 if shape_type is not None else None
+        coords = self.coordinates
+        items = []
+        if not self.count:
+            return items
+        for index, item_type in enumerate(self.types):
+            if not item_type or (wanted is not None and item_type != wanted):
+                continue
+            if not include_hidden and self.hidden[index]:
+                continue
+            if bbox is not None:
+                x1, y1, x2, y2 = coords[4 * index:4 * index + 4]
+                if max(x1, x2) < bbox[0] or min(x1, x2) > bbox[2] or max(y1, y2) < bbox[1] or min(y1, y2) > bbox[3]:
+                    continue
+            items.append(self.first_item + index)
+        return items
+
+
+class NullBackend(CanvasBackend):
+    """
+    Hands out item ids and discards everything else.
+
+    Useful for measuring the cost of the Commands logic on its own.
+    """
+
+    def __init__(self):
+        self.next_item = 1
+
+    def _create(self):
+        item = self.next_item
+        self.next_item += 1
+        return item
+
+    def create_line(self, x1, y1, x2, y2, **options):
+        return self._create()
+
+    def create_rectangle(self, x1, y1, x2, y2, **options):
+        return self._create()
+
+    def create_oval(self, x1, y1, x2, y2, **options):
+        return self._create()
+
+    def create_text(self, x, y, **options):
+        return self._create()
+
+    def itemconfig(self, item, **options):
+        pass
+
+    def coords(self, item, *coords):
+        return []
+
+    def delete(self, item):
+        pass
+
+    def type(self, item):
+        return None
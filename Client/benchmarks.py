@@ -0,0 +1,813 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import MemoryBackend, NullBackend
+from canvas_app import RECV_SIZE, CanvasApp
+from commands import Commands, parse_command
+from raster import rasterise
+from relay import Relay
+from stand_in_server import StandInServer
+
+
+async def _count_frames(reader, expected):
+    """
+    Reads from a stream until the expected number of END-delimited frames has arrived.
+
+    Parameters:
+        reader (asyncio.StreamReader): The stream to read from.
+        expected (int): The number of frames to wait for.
+
+    Returns:
+        None
+    """
+    count = 0
+    tail = b""
+    while count < expected:
+        data = await reader.read(65536)
+        if not data:
+            return
+        data = tail + data
+        count += data.count(b"END\n")
+        tail = data[-3:]  # Too short to hold a delimiter, so nothing is counted twice
+
+
+async def _run_relay(viewers, updates, snapshot_size):
+    """
+    Measures how long a relay takes to fan a burst of updates out to a number of viewers.
+
+    A stub upstream sends a snapshot when the relay connects and then a burst of draw
+    broadcasts. Every viewer connects through the relay and reads until it has seen the
+    whole snapshot and every update.
+
+    Returns:
+        float: The seconds between the first update being sent and the last viewer receiving it.
+    """
+    upstream_writers = []
+    connected = asyncio.Event()
+    snapshot = "".join(f"draw line {i} 0 0 10 10 0 0 0\nEND\n" for i in range(snapshot_size))
+
+    async def handle_relay(reader, writer):
+        writer.write(snapshot.encode())
+        upstream_writers.append(writer)
+        connected.set()
+        try:
+            await reader.read()
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+
+    upstream = await asyncio.start_server(handle_relay, "127.0.0.1", 0)
+    relay = Relay(*upstream.sockets[0].getsockname()[:2], port=0)
+    await relay.start()
+    await connected.wait()
+
+    streams = [await asyncio.open_connection(*relay.address) for _ in range(viewers)]
+    readers = [asyncio.ensure_future(_count_frames(reader, snapshot_size + updates)) for reader, _ in streams]
+    while len(relay.viewers) < viewers:
+        await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    burst = "".join(f"draw circle {snapshot_size + i} 5 5 20 20 255 0 0\nEND\n" for i in range(updates))
+    upstream_writers[0].write(burst.encode())
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+
+    for _, writer in streams:
+        writer.close()
+    while relay.viewers:
+        await asyncio.sleep(0.01)
+    await relay.stop()
+    upstream.close()
+    return elapsed
+
+
+def bench_relay(viewer_counts, updates, snapshot_size, target_rate):
+    """
+    Benchmarks relay fan-out at increasing viewer counts on a single core.
+
+    The relay, the stub upstream and every viewer share one event loop, so the viewers'
+    own reads are charged to the same core and the numbers are a lower bound for a relay
+    running in its own process.
+
+    Parameters:
+        viewer_counts (list): The numbers of viewers to measure.
+        updates (int): The number of broadcasts in each burst.
+        snapshot_size (int): The number of shapes already on the board.
+        target_rate (int): The updates per second each viewer should receive.
+
+    Returns:
+        list: One result dictionary per viewer count.
+    """
+    results = []
+    print(f"{'viewers':>8} {'seconds':>9} {'frames/s':>12} {'viewers @ ' + str(target_rate) + '/s':>16}")
+    for viewers in viewer_counts:
+        elapsed = asyncio.run(_run_relay(viewers, updates, snapshot_size))
+        frames_per_second = viewers * updates / elapsed
+        supported = int(frames_per_second / target_rate)
+        results.append({"viewers": viewers, "seconds": elapsed, "frames_per_second": frames_per_second, "supported_viewers": supported})
+        print(f"{viewers:>8} {elapsed:>9.3f} {frames_per_second:>12.0f} {supported:>16}")
+    return results
+
+
+async def _read_until(reader, marker):
+    """
+    Reads from a stream until a marker has arrived.
+
+    Returns:
+        int: The number of bytes read.
+    """
+    data = b""
+    while marker not in data:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        data += chunk
+    return len(data)
+
+
+async def _count_bytes(reader, marker):
+    """
+    Reads from a stream until a marker has arrived, without keeping more than a little of it.
+
+    Returns:
+        int: The number of bytes read.
+    """
+    total = 0
+    tail = b""
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            return total
+        total += len(chunk)
+        if marker in tail + chunk:
+            return total
+        tail = (tail + chunk)[-len(marker):]
+
+
+async def _run_regions(address, shapes, clients, extent, view, subscribed, seed=0):
+    """
+    Measures the bytes each client receives while another client fills the board.
+
+    Every client either subscribes to a view-sized region at a random spot or receives the
+    whole board. The writer then draws `shapes` small shapes spread over an `extent` square
+    and finishes with a delete, which every client receives.
+
+    Returns:
+        float: The mean number of bytes received per client.
+    """
+    rng = random.Random(seed)
+    writer_stream = await asyncio.open_connection(*address)
+    writer_stream[1].write(b"clear all\n")
+    await _read_until(writer_stream[0], b"END\n")
+
+    streams = [await asyncio.open_connection(*address) for _ in range(clients)]
+    for i, (_, writer) in enumerate(streams):
+        if subscribed:
+            x, y = rng.randrange(extent - view[0]), rng.randrange(extent - view[1])
+            writer.write(f"req {i} view {x} {y} {x + view[0]} {y + view[1]}\n".encode())
+        else:
+            writer.write(f"req {i} view all\n".encode())
+    # Once every subscription is acked, every client is registered and subscribed
+    await asyncio.gather(*(_read_until(reader, f"ack {i} ".encode()) for i, (reader, _) in enumerate(streams)))
+
+    counters = [asyncio.ensure_future(_count_bytes(reader, b"delete regions.done")) for reader, _ in streams]
+    burst = []
+    for i in range(shapes):
+        x, y = rng.randrange(extent - 50), rng.randrange(extent - 50)
+        burst.append(f"draw rectangle regions.{i} {x} {y} {x + rng.randrange(10, 50)} {y + rng.randrange(10, 50)} 0 0 0\n")
+    burst.append("delete regions.done\n")
+    writer_stream[1].write("".join(burst).encode())
+    acks = asyncio.ensure_future(_count_frames(writer_stream[0], len(burst)))
+    received = await asyncio.gather(*counters)
+    await acks
+
+    for _, writer in streams + [writer_stream]:
+        writer.close()
+    return sum(received) / clients
+
+
+def bench_regions(board_sizes, client_counts, extent, view, server=None):
+    """
+    Benchmarks the bytes each client receives with and without region subscriptions.
+
+    Runs against the stand-in server unless the address of a real server is given.
+
+    Parameters:
+        board_sizes (list): The numbers of shapes to draw.
+        client_counts (list): The numbers of receiving clients.
+        extent (int): The width and height of the board the shapes are spread over.
+        view (tuple): The (width, height) of each client's region.
+        server (tuple, optional): The (host, port) of a server to run against.
+
+    Returns:
+        list: One result dictionary per board size and client count.
+    """
+    stand_in = None
+    if server is None:
+        stand_in = StandInServer()
+        server = stand_in.start()
+    results = []
+    print(f"{'shapes':>9} {'clients':>8} {'all bytes/client':>17} {'region bytes/client':>20} {'ratio':>7}")
+    for shapes in board_sizes:
+        for clients in client_counts:
+            everything = asyncio.run(_run_regions(server, shapes, clients, extent, view, False))
+            region = asyncio.run(_run_regions(server, shapes, clients, extent, view, True))
+            results.append({"shapes": shapes, "clients": clients, "all_bytes_per_client": everything,
+                            "region_bytes_per_client": region, "ratio": region / everything})
+            print(f"{shapes:>9} {clients:>8} {everything:>17.0f} {region:>20.0f} {region / everything:>7.3f}")
+    if stand_in is not None:
+        stand_in.stop()
+    return results
+
+
+def bench_commands(sizes, backend_names):
+    """
+    Benchmarks the Commands logic on display-free backends.
+
+    Each run draws `size` shapes, modifies every one of them and then deletes them all,
+    through `apply_draw_command` as if the commands had arrived from the server. The
+    client's diagnostic printing is discarded so that it does not dominate the numbers.
+
+    Parameters:
+        sizes (list): The numbers of shapes to draw in each run.
+        backend_names (list): The backends to run on, "memory" and/or "null".
+
+    Returns:
+        list: One result dictionary per size and backend.
+    """
+    backends = {"memory": MemoryBackend, "null": NullBackend}
+    shapes = ("line", "rectangle", "circle")
+    results = []
+    print(f"{'backend':>8} {'shapes':>9} {'draw ops/s':>12} {'modify ops/s':>13} {'delete ops/s':>13}")
+    for size in sizes:
+        draws = [f"draw {shapes[i % 3]} {i} {i % 800} {i % 600} {i % 800 + 10} {i % 600 + 10} 255 0 0" for i in range(size)]
+        for name in backend_names:
+            commands = Commands()
+            canvas = backends[name]()
+            rates = []
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                start = time.perf_counter()
+                for command in draws:
+                    commands.apply_draw_command(canvas, command)
+                rates.append(size / (time.perf_counter() - start))
+
+                start = time.perf_counter()
+                for shape_id in range(size):
+                    commands.apply_draw_command(canvas, f"modify {shape_id} colour 0 0 255 draw 1 2 3 4")
+                rates.append(size / (time.perf_counter() - start))
+
+                start = time.perf_counter()
+                for shape_id in range(size):
+                    commands.apply_draw_command(canvas, f"delete {shape_id}")
+                rates.append(size / (time.perf_counter() - start))
+                # Drop the discarded output as we go so that it does not grow with the run
+                output.seek(0)
+                output.truncate()
+            results.append({"backend": name, "shapes": size, "draw": rates[0], "modify": rates[1], "delete": rates[2]})
+            print(f"{name:>8} {size:>9} {rates[0]:>12.0f} {rates[1]:>13.0f} {rates[2]:>13.0f}")
+    return results
+
+
+def bench_raster(sizes, scales, shape_size):
+    """
+    Benchmarks rendering a board offscreen with the NumPy rasteriser.
+
+    Each board holds `size` lines, rectangles, ovals and text boxes in equal numbers, up to
+    `shape_size` pixels across, at random spots on an 800x600 board.
+
+    Parameters:
+        sizes (list): The numbers of shapes on each board.
+        scales (list): The image sizes relative to the board, e.g. 1.0 for exports and 0.25 for thumbnails.
+        shape_size (int): The largest width and height of a shape.
+
+    Returns:
+        list: One result dictionary per size and scale.
+    """
+    rng = random.Random(0)
+    results = []
+    print(f"{'shapes':>9} {'scale':>6} {'ms':>9} {'shapes/ms':>10}")
+    for size in sizes:
+        canvas = MemoryBackend()
+        for i in range(size):
+            x, y = rng.randrange(800 - shape_size), rng.randrange(600 - shape_size)
+            x2, y2 = x + rng.randrange(shape_size), y + rng.randrange(shape_size)
+            if i % 4 == 0:
+                canvas.create_line(x, y, x2, y2, fill="#ff0000")
+            elif i % 4 == 1:
+                canvas.create_rectangle(x, y, x2, y2, outline="#00ff00")
+            elif i % 4 == 2:
+                canvas.create_oval(x, y, x2, y2, outline="#0000ff")
+            else:
+                canvas.create_text(x, y, text="label", fill="black")
+        for scale in scales:
+            start = time.perf_counter()
+            rasterise(canvas, 800, 600, scale)
+            elapsed = (time.perf_counter() - start) * 1000
+            results.append({"shapes": size, "scale": scale, "ms": elapsed, "shapes_per_ms": size / elapsed})
+            print(f"{size:>9} {scale:>6} {elapsed:>9.1f} {size / elapsed:>10.0f}")
+    return results
+
+
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+headless = sys.argv[2] == "headless"
+if headless:
+    from backends import MemoryBackend
+else:
+    import tkinter as tk
+from canvas_app import CanvasApp
+from endpoints import parse_endpoints
+imported = time.perf_counter()
+
+class HeadlessRoot:
+    def title(self, text):
+        pass
+
+    def after(self, delay, func, *args):
+        if delay == 0:
+            func(*args)
+
+    def update(self):
+        pass
+
+root = HeadlessRoot() if headless else tk.Tk()
+app = CanvasApp(root, parse_endpoints(sys.argv[1]), MemoryBackend() if headless else None, heartbeat_interval=0)
+root.update()
+shown = time.perf_counter()
+
+shapes = int(sys.argv[3])
+connected = loaded = None
+deadline = shown + 10
+while shapes and loaded is None and time.perf_counter() < deadline:
+    root.update()
+    if connected is None and app.server_address is not None:
+        connected = time.perf_counter()
+    if len(app.commands.shapes) >= shapes:
+        loaded = time.perf_counter()
+    time.sleep(0.001)
+
+def ms(moment):
+    return None if moment is None else (moment - start) * 1000
+
+print(json.dumps({"import_ms": ms(imported), "window_ms": ms(shown), "connected_ms": ms(connected), "board_ms": ms(loaded)}))
+"""
+
+
+async def _fill_board(address, shapes):
+    """
+    Draws shapes on a server's board and waits for every one of them to be acked.
+    """
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write("".join(f"draw line s.{i} {i % 800} {i % 600} 10 10 0 0 0\n" for i in range(shapes)).encode())
+    await _count_frames(reader, shapes)
+    writer.close()
+
+
+def _unresponsive_endpoint():
+    """
+    Opens a listener whose backlog is full, so that further connection attempts hang.
+
+    Returns:
+        tuple: The (host, port) of the listener, and the sockets to close when done with it.
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    address = listener.getsockname()
+    sockets = [listener]
+    for _ in range(8):
+        filler = socket.socket()
+        filler.setblocking(False)
+        filler.connect_ex(address)
+        sockets.append(filler)
+    return address, sockets
+
+
+def bench_startup(runs, shapes, headless):
+    """
+    Benchmarks client startup in fresh processes: import time and time to the first frame.
+
+    Each run starts a new interpreter, so the imports are not already cached. It reports the
+    time from the start of the imports until they are done, until the window has been drawn
+    (the first frame), until the client has connected and until the snapshot of a board of
+    `shapes` shapes has been applied. It runs once against a stand-in server and once against
+    a server that never accepts the connection, where only the window can be shown.
+
+    Parameters:
+        runs (int): The number of runs per scenario. The medians are reported.
+        shapes (int): The number of shapes on the stand-in's board.
+        headless (bool): Draw on the in-memory backend instead of a Tk window, e.g. without a display.
+
+    Returns:
+        list: One result dictionary per scenario.
+    """
+    stand_in = StandInServer()
+    address = stand_in.start()
+    asyncio.run(_fill_board(address, shapes))
+    unresponsive, sockets = _unresponsive_endpoint()
+
+    client_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    print(f"{'server':>13} {'import ms':>10} {'first frame ms':>15} {'connected ms':>13} {'board ms':>9}")
+    for name, endpoint, board in (("stand-in", address, shapes), ("unresponsive", unresponsive, 0)):
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE, f"{endpoint[0]}:{endpoint[1]}", "headless" if headless else "tk", str(board)],
+                cwd=client_dir, stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        result = {"server": name}
+        for key in ("import_ms", "window_ms", "connected_ms", "board_ms"):
+            values = [sample[key] for sample in samples if sample[key] is not None]
+            result[key] = statistics.median(values) if values else None
+        results.append(result)
+        cells = ["-" if result[key] is None else f"{result[key]:.1f}" for key in ("import_ms", "window_ms", "connected_ms", "board_ms")]
+        print(f"{name:>13} {cells[0]:>10} {cells[1]:>15} {cells[2]:>13} {cells[3]:>9}")
+
+    for sock in sockets:
+        sock.close()
+    stand_in.stop()
+    return results
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+# Slowdown of a score relative to the baseline that fails the gate. Even after calibration,
+# scores on a shared machine vary by up to about 30% between runs
+REGRESSION_THRESHOLD = 0.5
+MIN_SUITE_OPERATIONS = 100000  # Operations per round, so small sizes are run many times
+
+
+def _draw_commands(size):
+    shapes = ("line", "rectangle", "circle")
+    return [f"draw {shapes[i % 3]} s.{i} {i % 800} {i % 600} {i % 800 + 10} {i % 600 + 10} 255 0 0" for i in range(size)]
+
+
+def _board(draws):
+    """
+    Returns a Commands board with the given shapes drawn on a MemoryBackend, all drawn by this client.
+    """
+    commands = Commands()
+    canvas = MemoryBackend()
+    for command in draws:
+        parts = command.split()
+        commands.add_command(parts[2], command, canvas.create_line(*map(int, parts[3:7])))
+    return commands, canvas
+
+
+def _timed(function, *args):
+    """
+    Times a call with the garbage collector off, as timeit does, so that collections caused by
+    the setup do not land in the timing at random.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def micro_apply_draw_command(size):
+    draws = _draw_commands(size)
+
+    def run():
+        commands, canvas = Commands(), MemoryBackend()
+        return _timed(lambda: [commands.apply_draw_command(canvas, command) for command in draws])
+    return run
+
+
+def micro_redraw(size):
+    commands, canvas = _board(_draw_commands(size))
+    return lambda: _timed(commands.redraw, canvas)
+
+
+def micro_list_commands(size):
+    commands, _ = _board(_draw_commands(size))
+    return lambda: _timed(commands.list_commands, "line", "mine")
+
+
+def micro_clear_mine(size):
+    draws = _draw_commands(size)
+    message = "clear mine " + " ".join(command.split()[2] for command in draws)
+
+    def run():
+        commands, canvas = _board(draws)
+        return _timed(commands.apply_draw_command, canvas, message)
+    return run
+
+
+def micro_receive_framing(size):
+    stream = "".join(f"ver {i + 1} {command}\nEND\n" for i, command in enumerate(_draw_commands(size)))
+    chunks = [stream[i:i + RECV_SIZE] for i in range(0, len(stream), RECV_SIZE)]
+    # A bare CanvasApp, without the connection and threads that the constructor starts
+    app = CanvasApp.__new__(CanvasApp)
+    app.parse_pool = None
+
+    def run():
+        app.pending = ""
+        return _timed(lambda: [app.parse_frames(list(app.read_frames(chunk))) for chunk in chunks])
+    return run
+
+
+# Each sets up a run of `size` operations, one per shape, and returns a function that does
+# the run and returns the seconds it took. update_draw_commands, which renumbered the shapes
+# after a delete, went away with global shape ids; redraw is what rebuilds the canvas now
+MICROBENCHMARKS = {
+    "apply_draw_command": micro_apply_draw_command,
+    "redraw": micro_redraw,
+    "list_commands": micro_list_commands,
+    "clear_mine": micro_clear_mine,
+    "receive_framing": micro_receive_framing,
+}
+
+
+def _calibrate():
+    """
+    Times a fixed pure-Python workload of string and dict operations, like the client's own.
+
+    Dividing a benchmark's time by this one takes out most of the difference between machines,
+    and between busy and quiet moments on the same machine.
+
+    Returns:
+        float: The fastest of three timings, in seconds.
+    """
+    def workload():
+        table = {}
+        for i in range(20000):
+            table[f"k{i}"] = str(i).split()
+    return min(_timed(workload) for _ in range(3))
+
+
+def run_suite(sizes, names=None, repeat=5):
+    """
+    Runs the client microbenchmarks, each at every size.
+
+    Each benchmark and size is measured in `repeat` rounds. A round first times the calibration
+    workload, then does about MIN_SUITE_OPERATIONS operations in as many runs as that takes,
+    and at least one. The fastest run of a round, divided by its calibration time, is the
+    round's score, and the median score is kept, so that neither a lucky nor a disturbed
+    round decides it. The client's diagnostic printing is discarded.
+
+    Parameters:
+        sizes (list): The numbers of operations per run, e.g. 1000 to 1000000.
+        names (list, optional): The benchmarks to run. Defaults to all of MICROBENCHMARKS.
+        repeat (int, optional): The number of rounds. Defaults to 5.
+
+    Returns:
+        list: One result dictionary per benchmark and size, with the time per operation and
+            the score: calibration workloads per 1000 operations.
+    """
+    results = []
+    for name in names or MICROBENCHMARKS:
+        for size in sizes:
+            runs = max(1, MIN_SUITE_OPERATIONS // size)
+            best, scores = float("inf"), []
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                run = MICROBENCHMARKS[name](size)
+                for _ in range(repeat):
+                    calibration = _calibrate()
+                    round_best = float("inf")
+                    for _ in range(runs):
+                        round_best = min(round_best, run())
+                        output.seek(0)
+                        output.truncate()
+                    best = min(best, round_best)
+                    scores.append(round_best / calibration * 1000 / size)
+            results.append({"benchmark": name, "size": size, "runs": runs * repeat, "seconds": best,
+                            "ns_per_op": best / size * 1e9, "ops_per_second": size / best, "score": statistics.median(scores)})
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares the scores of suite results with a baseline, per benchmark and size.
+
+    Parameters:
+        results (list): The results returned by `run_suite`.
+        baseline (list): Results from an earlier run, e.g. loaded from the baseline file.
+        threshold (float, optional): The slowdown that counts as a regression, 0.5 for 50%. Defaults to REGRESSION_THRESHOLD.
+
+    Returns:
+        list: One comparison per result, with the baseline's score, the ratio to it and whether
+            it regressed. A result missing from the baseline has no score or ratio and is marked
+            as missing, which fails the gate like a regression.
+    """
+    previous = {(entry["benchmark"], entry["size"]): entry["score"] for entry in baseline}
+    comparisons = []
+    for result in results:
+        baseline_score = previous.get((result["benchmark"], result["size"]))
+        ratio = result["score"] / baseline_score if baseline_score is not None else None
+        comparisons.append({"benchmark": result["benchmark"], "size": result["size"], "score": result["score"],
+                            "baseline_score": baseline_score, "ratio": ratio, "missing": baseline_score is None,
+                            "regressed": ratio is not None and ratio > 1 + threshold})
+    return comparisons
+
+
+def bench_suite(sizes, names, repeat, baseline_path, threshold, json_path=None, update_baseline=False):
+    """
+    Runs the microbenchmark suite and gates it against the stored baseline.
+
+    Parameters:
+        sizes (list): The numbers of operations per run.
+        names (list): The benchmarks to run, or None for all of them.
+        repeat (int): The number of rounds per benchmark and size.
+        baseline_path (str): The baseline file to compare with, or to write.
+        threshold (float): The slowdown that counts as a regression.
+        json_path (str, optional): Where to write the report as JSON, "-" for stdout.
+        update_baseline (bool, optional): Write the results to the baseline file instead of comparing with it.
+
+    Returns:
+        bool: True if no benchmark regressed and every result had a baseline to compare with,
+            or if the baseline was written.
+    """
+    results = run_suite(sizes, names, repeat)
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "threshold": threshold,
+        "results": results,
+    }
+    comparisons = []
+    baseline_found = os.path.exists(baseline_path)
+    if update_baseline:
+        with open(baseline_path, "w") as file:
+            json.dump({key: report[key] for key in ("time", "python", "machine", "results")}, file, indent=2)
+            file.write("\n")
+    else:
+        baseline = []
+        if baseline_found:
+            with open(baseline_path) as file:
+                baseline = json.load(file)["results"]
+        comparisons = compare_to_baseline(results, baseline, threshold)
+    report["comparisons"] = comparisons
+    report["passed"] = not any(comparison["regressed"] or comparison["missing"] for comparison in comparisons)
+
+    if json_path == "-":
+        print(json.dumps(report, indent=2))
+        return report["passed"]
+    by_key = {(comparison["benchmark"], comparison["size"]): comparison for comparison in comparisons}
+    print(f"{'benchmark':>20} {'size':>9} {'ns/op':>10} {'score':>8} {'baseline':>9} {'ratio':>7}")
+    for result in results:
+        comparison = by_key.get((result["benchmark"], result["size"]))
+        if comparison is None:
+            baseline_cell, ratio_cell, flag = "-", "-", ""
+        elif comparison["missing"]:
+            baseline_cell, ratio_cell, flag = "-", "-", " MISSING"
+        else:
+            baseline_cell, ratio_cell = f"{comparison['baseline_score']:.3f}", f"{comparison['ratio']:.2f}"
+            flag = " REGRESSED" if comparison["regressed"] else ""
+        print(f"{result['benchmark']:>20} {result['size']:>9} {result['ns_per_op']:>10.0f} {result['score']:>8.3f} "
+              f"{baseline_cell:>9} {ratio_cell:>7}{flag}")
+    missing = sum(comparison["missing"] for comparison in comparisons)
+    if update_baseline:
+        print(f"Baseline written to {baseline_path}")
+    elif not baseline_found:
+        print(f"FAILED: no baseline in {baseline_path}; run with --update-baseline to create it")
+    elif missing:
+        print(f"FAILED: {missing} results have no baseline in {baseline_path}; run with --update-baseline to record them")
+    else:
+        print("PASSED" if report["passed"] else f"FAILED: slower than the baseline by more than {threshold:.0%}")
+    if json_path:
+        with open(json_path, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    return report["passed"]
+
+
+def bench_parse(sizes, workers):
+    """
+    Benchmarks how much Tk main-thread time parsing on the receive side saves.
+
+    The old path parses and applies every frame on the main thread. The new path parses on
+    the receive thread, optionally with a worker pool, and leaves only `apply_operations`
+    for the main thread. Both paths draw on the in-memory backend.
+
+    Parameters:
+        sizes (list): The numbers of incoming shapes to measure.
+        workers (int): The size of the parse pool to measure as well, or 0 for none.
+
+    Returns:
+        list: One result dictionary per size, with times in milliseconds.
+    """
+    shapes = ("line", "rectangle", "circle")
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    results = []
+    print(f"{'shapes':>9} {'old main ms':>12} {'new main ms':>12} {'saved ms/100k':>14} {'parse ms':>9} {'pool parse ms':>14}")
+    for size in sizes:
+        frames = [f"draw {shapes[i % 3]} {i} {i % 800} {i % 600} {i % 800 + 10} {i % 600 + 10} 255 0 0\n" for i in range(size)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            commands, canvas = Commands(), MemoryBackend()
+            start = time.perf_counter()
+            for frame in frames:
+                commands.apply_draw_command(canvas, frame)
+            old_main = time.perf_counter() - start
+
+            start = time.perf_counter()
+            operations = [parse_command(frame) for frame in frames]
+            parse = time.perf_counter() - start
+
+            pool_parse = None
+            if pool is not None:
+                start = time.perf_counter()
+                list(pool.map(parse_command, frames, chunksize=max(1, size // (4 * workers))))
+                pool_parse = time.perf_counter() - start
+
+            commands, canvas = Commands(), MemoryBackend()
+            start = time.perf_counter()
+            commands.apply_operations(canvas, operations)
+            new_main = time.perf_counter() - start
+
+        saved = (old_main - new_main) * 1000 * 100000 / size
+        result = {"shapes": size, "old_main_ms": old_main * 1000, "new_main_ms": new_main * 1000,
+                  "saved_ms_per_100k": saved, "parse_ms": parse * 1000,
+                  "pool_parse_ms": pool_parse * 1000 if pool_parse is not None else None}
+        results.append(result)
+        pool_column = f"{result['pool_parse_ms']:>14.1f}" if pool_parse is not None else f"{'-':>14}"
+        print(f"{size:>9} {result['old_main_ms']:>12.1f} {result['new_main_ms']:>12.1f} {saved:>14.1f} {result['parse_ms']:>9.1f} {pool_column}")
+    if pool is not None:
+        pool.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NetSketch client benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    relay_parser = subparsers.add_parser("relay", help="fan-out throughput of the relay")
+    relay_parser.add_argument("--viewers", type=int, nargs="+", default=[10, 100, 250, 500])
+    relay_parser.add_argument("--updates", type=int, default=200)
+    relay_parser.add_argument("--snapshot", type=int, default=1000)
+    relay_parser.add_argument("--rate", type=int, default=30, help="updates per second each viewer must receive")
+
+    commands_parser = subparsers.add_parser("commands", help="throughput of the Commands logic without a display")
+    commands_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    commands_parser.add_argument("--backends", nargs="+", choices=["memory", "null"], default=["memory", "null"])
+
+    parse_parser = subparsers.add_parser("parse", help="Tk main-thread time saved by parsing on the receive side")
+    parse_parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    parse_parser.add_argument("--workers", type=int, default=0, help="also measure parsing with a pool of this many processes")
+
+    raster_parser = subparsers.add_parser("raster", help="offscreen rendering of a board with NumPy")
+    raster_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    raster_parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.25])
+    raster_parser.add_argument("--shape-size", type=int, default=20, help="largest width and height of a shape")
+
+    startup_parser = subparsers.add_parser("startup", help="client import time and time to the first frame")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--shapes", type=int, default=10000, help="shapes on the board the client loads")
+    startup_parser.add_argument("--headless", action="store_true", help="use the in-memory backend instead of a Tk window")
+
+    suite_parser = subparsers.add_parser("suite", help="client microbenchmarks, gated against a stored baseline")
+    suite_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    suite_parser.add_argument("--benchmarks", nargs="+", choices=list(MICROBENCHMARKS), help="defaults to all of them")
+    suite_parser.add_argument("--repeat", type=int, default=5, help="rounds per benchmark and size; the median score is kept")
+    suite_parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with")
+    suite_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                              help="slowdown of a score that fails the gate, e.g. 0.5 for 50%%")
+    suite_parser.add_argument("--json", metavar="PATH", help="also write the report as JSON, or '-' to print only the JSON")
+    suite_parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+
+    regions_parser = subparsers.add_parser("regions", help="bytes received per client with and without region subscriptions")
+    regions_parser.add_argument("--shapes", type=int, nargs="+", default=[1000, 10000])
+    regions_parser.add_argument("--clients", type=int, nargs="+", default=[10, 50])
+    regions_parser.add_argument("--extent", type=int, default=8000, help="width and height of the board")
+    regions_parser.add_argument("--view", type=int, nargs=2, default=[800, 600], metavar=("WIDTH", "HEIGHT"))
+    regions_parser.add_argument("--server", help="host:port of a server to run against instead of the stand-in")
+
+    args = parser.parse_args()
+    if args.benchmark == "relay":
+        bench_relay(args.viewers, args.updates, args.snapshot, args.rate)
+    elif args.benchmark == "commands":
+        bench_commands(args.sizes, args.backends)
+    elif args.benchmark == "parse":
+        bench_parse(args.sizes, args.workers)
+    elif args.benchmark == "raster":
+        bench_raster(args.sizes, args.scales, args.shape_size)
+    elif args.benchmark == "startup":
+        bench_startup(args.runs, args.shapes, args.headless or not (os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin")))
+    elif args.benchmark == "suite":
+        if not bench_suite(args.sizes, args.benchmarks, args.repeat, args.baseline, args.threshold, args.json, args.update_baseline):
+            sys.exit(1)
+    elif args.benchmark == "regions":
+        server = None
+        if args.server:
+            host, _, port = args.server.rpartition(":")
+            server = (host or "127.0.0.1", int(port))
+        bench_regions(args.shapes, args.clients, args.extent, tuple(args.view), server)
@@ -1,34 +1,85 @@
-import tkinter as tk
+import os
 import socket
 import threading
 import sys
 import select
-from commands import Commands
+import time
+from commands import Commands, parse_command
+from backends import TkBackend
+from endpoints import EndpointHealth, HashRing, connect_first, connect_in_order, format_endpoint
+
+LIST_PAGE_SIZE = 100  # Default number of entries per list page, matching the server
+RECV_SIZE = 65536
+MAX_BATCH_SIZE = 1 << 20  # Most bytes read before a batch is parsed and handed to the Tk thread
+PARALLEL_PARSE_THRESHOLD = 5000  # Fewest frames in a batch worth sending to the worker pool
+HEARTBEAT_INTERVAL = 0.25  # Seconds between pings
+MISSED_BEATS = 3  # Pings in a row without any data from the server before it is considered dead
+RECONNECT_DELAY = 0.5  # Seconds to wait before trying to reconnect again
+RTT_SMOOTHING = 0.125  # Weight of a new RTT sample in the smoothed RTT, as in TCP
+CONNECT_TIMEOUT = 5.0  # Seconds to wait for the first connection to the server
 
 class CanvasApp:
-    def __init__(self, root):
+    def __init__(self, root, server_address=('127.0.0.1', 6001), backend=None, recorder=None, parse_workers=0, client_tag=None,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, missed_beats=MISSED_BEATS, board=None):
         self.root = root
+        # The endpoints are tried in parallel, preferring earlier ones. A named board lives on
+        # its owner on the hash ring, and only moves along the ring when that server is down,
+        # so its endpoints are tried one at a time in ring order instead
+        endpoints = [server_address] if isinstance(server_address, tuple) else list(server_address)
+        self.board = board
+        self.endpoints = HashRing(endpoints).preference(board) if board else endpoints
+        self.health = EndpointHealth()
+        self.server_address = None  # The endpoint currently connected to
+        self.client_socket = None  # Set by the receive thread once it has connected
+        self.connected = threading.Event()
+        self.unsent = []  # Messages sent before the first connection was made
+        self.recorder = recorder
         self.root.title("Shared Canvas")
         self.user_commands = set()
+        # Shape ids are "<tag>.<counter>"; the random tag keeps them unique across clients
+        self.client_tag = client_tag or os.urandom(4).hex()
         self.shape_id_counter = 0
         self.selected_command_id = None
-
-        # Create canvas
-        self.canvas = tk.Canvas(root, width=800, height=600, bg="white")
-        self.canvas.pack()
-
-        # Setup server connection
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.client_socket.connect(('127.0.0.1', 6001))
-        self.client_socket.settimeout(0.1)  # Set a short timeout for non-blocking operations
-
-        # Initialize Commands
+        self.list_filter = None
+        self.pending = ""
+        self.closing = False
+        self.send_lock = threading.Lock()  # Keeps the heartbeat's pings from splitting another message
+        self.heartbeat_interval = heartbeat_interval
+        self.missed_beats = missed_beats
+        # The heartbeat and receive threads both update the pings and the RTT stats
+        self.heartbeat_lock = threading.Lock()
+        self.ping_times = {}  # ping token -> time it was sent
+        self.next_ping = 0
+        self.unanswered_beats = 0  # Pings sent since data last arrived from the server
+        self.view = None  # (x1, y1, x2, y2) region subscribed to, or None for the whole board
+        self.stats = {"rtt_ms": None, "srtt_ms": None, "pings": 0, "pongs": 0, "dead_peers": 0, "reconnects": 0}
+
+        # Create canvas, drawing on a Tk canvas unless another backend is given
+        if backend is None:
+            import tkinter as tk  # Loaded here, so that clients without a display do not pay for it
+            tk_canvas = tk.Canvas(root, width=800, height=600, bg="white")
+            tk_canvas.pack()
+            backend = TkBackend(tk_canvas)
+        self.canvas = backend
+
+        # Initialize Commands, and a worker pool for parsing large snapshots if requested
         self.commands = Commands()
-
-        # Start receiving thread
+        self.parse_pool = None
+        self.parse_workers = parse_workers
+        if parse_workers:
+            from concurrent.futures import ProcessPoolExecutor
+            self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers)
+
+        # Start receiving thread, which connects to the server first. Connecting in the
+        # background lets the window appear straight away, even if the server is slow or down
         self.receive_thread = threading.Thread(target=self.receive_data, daemon=True)
         self.receive_thread.start()
 
+        # Start the heartbeat, which measures the RTT and notices a dead server
+        if heartbeat_interval:
+            self.heartbeat_thread = threading.Thread(target=self.heartbeat, daemon=True)
+            self.heartbeat_thread.start()
+
         # Initialize current tool and color
         self.current_tool = None
         self.current_color = None
@@ -87,10 +138,13 @@ class CanvasApp:
                 x1, y1 = int(parts[1]), int(parts[2])
                 text = ' '.join(parts[3:])
                 color = self.rgb_to_hex(self.current_color) if self.current_color else "black"
-                shape_id = self.canvas.create_text(x1, y1, text=text, fill=color)
+                shape_id = self.next_shape_id()
+                item = self.canvas.create_text(x1, y1, text=text, fill=color)
                 command = f"draw text {shape_id} {x1} {y1} '{text}' {self.current_color}\n"
+                self.commands.add_command(shape_id, command, item)
+                self.user_commands.add(shape_id)
                 try:
-                    self.client_socket.sendall(command.encode())
+                    self.send_command(command, shape_id)
                     print(f"Sent command: {command}")
                 except socket.error as e:
                     print(f"Socket error: {e}")
@@ -107,22 +161,38 @@ class CanvasApp:
         elif cmd == "help":
             self.show_help()
         elif cmd == "list":
-            filter_tool, filter_user = parts[1], parts[2]
-            send_command = f"list {filter_tool} {filter_user}\n"
+            if len(parts) > 1 and parts[1] == "more":
+                if self.commands.list_cursor is None or self.list_filter is None:
+                    print("No more entries to list.")
+                    return
+                filter_tool, filter_user, limit = self.list_filter
+                args = [filter_tool, filter_user, str(limit), self.commands.list_cursor]
+            else:
+                if len(parts) < 3:
+                    print("Invalid list command. Usage: list <tool> <user> [limit] [cursor]")
+                    return
+                filter_tool, filter_user = parts[1], parts[2]
+                limit = parts[3] if len(parts) > 3 else LIST_PAGE_SIZE
+                self.list_filter = (filter_tool, filter_user, limit)
+                args = parts[1:5]
+            self.commands.list_cursor = None
+            send_command = f"list {' '.join(args)}\n"
             try:
-                self.client_socket.sendall(send_command.encode())
+                self.send_command(send_command)
                 print(f"Sent command: {send_command}")
             except socket.error as e:
                 print(f"Socket error: {e}")
         elif cmd == "modify":
             self.modify_command(parts[1:])
         elif cmd == "delete":
-            if len(parts) > 1:
-                self.commands.delete_command(self.canvas, int(parts[1]))
-            self.user_commands.discard(int(parts[1])) 
+            if len(parts) < 2:
+                print("Invalid delete command. Usage: delete <ID>")
+                return
+            self.commands.delete_command(self.canvas, parts[1])
+            self.user_commands.discard(parts[1])
             delete_command = f"delete {parts[1]}\n"
             try:
-                self.client_socket.sendall(delete_command.encode())
+                self.send_command(delete_command, parts[1])
                 print(f"Sent command: {delete_command}")
             except socket.error as e:
                 print(f"Socket error: {e}")
@@ -130,16 +200,15 @@ class CanvasApp:
             self.commands.undo_last(self.canvas)
         elif cmd == "clear":
             if parts[1] == "all":
-                self.canvas.delete("all")
+                self.commands.apply_operation(self.canvas, ("clear_all",))
                 self.user_commands.clear()
                 print("All shapes cleared from the canvas")
                 try:
-                    self.client_socket.sendall("clear all\n".encode())
+                    self.send_command("clear all\n")
                 except socket.error as e:
                     print(f"Socket error: {e}")
             elif parts[1] == "mine":
                 for shape_id in list(self.user_commands):
-                    self.canvas.delete(shape_id)
                     self.commands.delete_command(self.canvas, shape_id)
                 print("User's shapes cleared from the canvas")
                 try:
@@ -148,22 +217,180 @@ class CanvasApp:
                         command += f"{shape_id} "
                     command += "\n"
                     print(f"Sending command: {command}")
-                    self.client_socket.sendall(command.encode())
+                    self.send_command(command)
                 except socket.error as e:
                     print(f"Socket error: {e}")
                 self.user_commands.clear()
         elif cmd == "show":
             self.show_commands(parts[1] if len(parts) > 1 else "all")
         elif cmd == "exit":
-            self.client_socket.close()
+            self.closing = True
+            if self.client_socket is not None:
+                self.client_socket.close()
             self.root.quit()
+        elif cmd == "view":
+            if parts[1:] == ["all"]:
+                self.unsubscribe()
+            elif len(parts) == 5:
+                self.subscribe(*map(int, parts[1:5]))
+            else:
+                print("Invalid view command. Usage: view <x1> <y1> <x2> <y2> | view all")
+        elif cmd == "stats":
+            self.show_stats()
         elif cmd == "select":
             if len(parts) > 1:
-                self.commands.selected_command_id = int(parts[1])
+                self.commands.selected_command_id = None if parts[1] == "none" else parts[1]
                 print(f"Selected command ID: {self.commands.selected_command_id}")
         else:
             print(f"Unknown command: {cmd}")
 
+    def send_command(self, command, shape_id=None):
+        """
+        Sends a command to the server, recording it first if the session is being recorded.
+
+        The command is prefixed with a request id, so its ack can be matched to it while
+        other commands are still in flight. Commands sent before the first connection is made
+        are held and sent as soon as it is.
+
+        Parameters:
+            command (str): The command to be sent.
+            shape_id (str, optional): The shape the command changes, which has already been changed locally.
+
+        Raises:
+            socket.error: If there is a socket error while sending the command.
+        """
+        request_id = self.commands.track_request(shape_id)
+        data = f"req {request_id} {command}".encode()
+        if self.recorder is not None:
+            self.recorder.record_sent(data)
+        with self.send_lock:
+            if self.client_socket is None:
+                self.unsent.append(data)
+            else:
+                self.client_socket.sendall(data)
+
+    def subscribe(self, x1, y1, x2, y2):
+        """
+        Subscribes to the updates that touch a region of the board.
+
+        Call it again whenever the view moves. The server sends the shapes in the new region
+        straight away, and from then on only the draws and modifies that touch it; deletes and
+        clears always arrive. Shapes outside the region stay as they were last seen until the
+        view covers them again.
+
+        Parameters:
+            x1, y1, x2, y2 (int): Two opposite corners of the region.
+
+        Raises:
+            socket.error: If there is a socket error while sending the subscription.
+        """
+        self.view = (x1, y1, x2, y2)
+        self.send_command(f"view {x1} {y1} {x2} {y2}\n")
+
+    def resubscribe(self):
+        """
+        Sends the current subscription again, on a new connection.
+        """
+        if self.view is not None:
+            self.subscribe(*self.view)
+
+    def unsubscribe(self):
+        """
+        Goes back to receiving every update on the board.
+
+        Raises:
+            socket.error: If there is a socket error while sending the request.
+        """
+        self.view = None
+        self.send_command("view all\n")
+
+    def heartbeat(self):
+        """
+        Pings the server every heartbeat interval until the app closes.
+
+        Each ping carries a token that the server sends back in its pong, which gives an RTT
+        sample. Any data from the server shows it is alive. If `missed_beats` pings in a row go
+        by without any, the connection is shut down, so the receive thread reconnects within
+        about a second instead of waiting for the operating system to notice.
+
+        Pings are not recorded, since they are not part of the session. The heartbeat starts
+        once the first connection has been made.
+
+        Returns:
+            None
+        """
+        self.connected.wait()
+        while not self.closing:
+            time.sleep(self.heartbeat_interval)
+            with self.heartbeat_lock:
+                dead = self.unanswered_beats >= self.missed_beats
+                if dead:
+                    print(f"No reply to {self.unanswered_beats} heartbeats, reconnecting...")
+                    self.stats["dead_peers"] += 1
+                    self.unanswered_beats = 0
+                else:
+                    self.next_ping += 1
+                    token = str(self.next_ping)
+                    self.ping_times[token] = time.perf_counter()
+                    self.unanswered_beats += 1
+            if dead:
+                try:
+                    self.client_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # Already closed
+                continue
+            try:
+                with self.send_lock:
+                    self.client_socket.sendall(f"ping {token}\n".encode())
+                self.stats["pings"] += 1
+            except OSError:
+                pass  # The receive thread reconnects
+
+    def record_pong(self, token):
+        """
+        Takes an RTT sample from a pong and updates the smoothed RTT.
+
+        Parameters:
+            token (str): The token of the ping the pong answers.
+
+        Returns:
+            None
+        """
+        with self.heartbeat_lock:
+            sent_at = self.ping_times.pop(token, None)
+            if sent_at is None:
+                return
+            rtt_ms = (time.perf_counter() - sent_at) * 1000
+            # Pings sent before this one will not be answered any more
+            self.ping_times = {t: sent for t, sent in self.ping_times.items() if sent > sent_at}
+            self.stats["pongs"] += 1
+            self.stats["rtt_ms"] = rtt_ms
+            srtt = self.stats["srtt_ms"]
+            self.stats["srtt_ms"] = rtt_ms if srtt is None else srtt + RTT_SMOOTHING * (rtt_ms - srtt)
+
+    def show_stats(self):
+        """
+        Prints the connection statistics, and the health of every endpoint tried.
+        """
+        for name, value in self.stats.items():
+            if isinstance(value, float):
+                value = f"{value:.3f}"
+            print(f"{name}: {value}")
+        if self.server_address is not None:
+            print(f"connected to: {format_endpoint(self.server_address)}")
+        for endpoint, entry in self.health.endpoints.items():
+            connect_ms = "-" if entry["connect_ms"] is None else f"{entry['connect_ms']:.3f}"
+            state = "healthy" if self.health.is_healthy(endpoint) else "backing off"
+            print(f"{format_endpoint(endpoint)}: {state}, {entry['successes']} connected, {entry['failures']} failed, "
+                  f"connect_ms {connect_ms}, last error {entry['last_error']}")
+
+    def next_shape_id(self):
+        """
+        Returns a new global shape ID for a shape drawn by this client.
+        """
+        self.shape_id_counter += 1
+        return f"{self.client_tag}.{self.shape_id_counter}"
+
     def modify_command(self, args):
         """
         Modifies the selected command and sends the modification command to the server.
@@ -185,9 +412,9 @@ class CanvasApp:
 
         try:
             # Construct the modification command as a single string
-            modify_cmd = f"modify {self.commands.selected_command_id} {' '.join(args)}"
+            modify_cmd = f"modify {self.commands.selected_command_id} {' '.join(args)}\n"
             print(f"Sending command: {modify_cmd}")
-            self.client_socket.sendall(modify_cmd.encode())
+            self.send_command(modify_cmd, self.commands.selected_command_id)
 
             # Apply the modification locally
             result = self.commands.modify_command(self.canvas, args)
@@ -206,7 +433,7 @@ class CanvasApp:
         Draws a shape on the canvas.
 
         Parameters:
-            shape (str): The type of shape to draw. Supported shapes are "line", "rectangle", "circle", and "text".
+            shape (str): The type of shape to draw. Supported shapes are "line", "rectangle" and "circle"; text is drawn by `execute_command`.
             x1 (int): The x-coordinate of the starting point of the shape.
             y1 (int): The y-coordinate of the starting point of the shape.
             x2 (int): The x-coordinate of the ending point of the shape.
@@ -225,27 +452,25 @@ class CanvasApp:
             print(f"Invalid color format: {color}")
             return
 
+        shape_id = self.next_shape_id()
         if shape == "line":
-            shape_id = self.canvas.create_line(x1, y1, x2, y2, fill=color)
+            item = self.canvas.create_line(x1, y1, x2, y2, fill=color)
         elif shape == "rectangle":
-            shape_id = self.canvas.create_rectangle(x1, y1, x2, y2, outline=color)
+            item = self.canvas.create_rectangle(x1, y1, x2, y2, outline=color)
         elif shape == "circle":
-            shape_id = self.canvas.create_oval(x1, y1, x2, y2, outline=color)
-        elif shape == "text":
-            shape_id = text = input("Enter text: ")  # This will prompt in the terminal
-            self.canvas.create_text(x1, y1, text=text, fill=color)
-            command = f"draw text {shape_id} {x1} {y1} '{text}' {color}\n"
+            item = self.canvas.create_oval(x1, y1, x2, y2, outline=color)
         else:
             print(f"Unsupported shape: {shape}")
             return
         
         command = f"draw {shape} {shape_id} {x1} {y1} {x2} {y2} {rgb_colour}\n"
         
-        # Add the shape_id to user_commands
+        # Record the shape and add its id to user_commands
+        self.commands.add_command(shape_id, command, item)
         self.user_commands.add(shape_id)
         
         try:
-            self.client_socket.sendall(command.encode())
+            self.send_command(command, shape_id)
             print(f"Sent command: {command}")
         except socket.error as e:
             print(f"Socket error: {e}")
@@ -254,7 +479,10 @@ class CanvasApp:
         """
         Receive data from the client socket and process the received commands.
 
-        This method continuously listens for incoming data from the client socket. It receives the data, splits it into commands using the 'END\n' delimiter, and applies each command to the canvas using the `apply_draw_command` method of the `commands` object.
+        This method continuously listens for incoming data from the client socket. It reads whatever data is available, splits it into commands using the 'END\n' delimiter via `read_frames`, and parses them into operations on this thread. The whole batch is then handed to the Tk thread, which only has to apply it with the `apply_operations` method of the `commands` object. Pongs are timed here, so the RTT does not include the wait for the Tk thread.
+
+        It first connects to the server, retrying until it succeeds. When the connection is lost, it
+        reconnects and carries on receiving until the app closes.
 
         Raises:
             socket.timeout: If a timeout occurs while receiving data from the client socket.
@@ -264,26 +492,109 @@ class CanvasApp:
         Returns:
             None
         """
-        while True:
+        while self.client_socket is None and not self.closing:
             try:
-                message = self.client_socket.recv(1024).decode()
-                commands = message.split('END\n')  # Split by delimiter
-                for command in commands:
-                    if command:
-                        #print(f"Received command: {command}")
-                        self.root.after(0, self.commands.apply_draw_command, self.canvas, command)
-            except socket.timeout:
-                continue
-            except socket.error as e:
-                print(f"Socket error: {e}")
-                break
-            except Exception as e:
-                print(f"Unexpected error: {e}")
+                self.connect(CONNECT_TIMEOUT)
+                print(f"Connected to the server at {format_endpoint(self.server_address)}.")
+            except OSError as e:
+                print(f"Failed to connect: {e}")
+                time.sleep(RECONNECT_DELAY)
+
+        while not self.closing:
+            while True:
+                try:
+                    data = self.read_available()
+                    if not data:
+                        if not self.closing:
+                            print("Server closed the connection")
+                        break
+                    with self.heartbeat_lock:
+                        self.unanswered_beats = 0
+                    if self.recorder is not None:
+                        self.recorder.record_received(data)
+                    frames = list(self.read_frames(data.decode()))
+                    if frames:
+                        operations = self.parse_frames(frames)
+                        for operation in operations:
+                            if operation is not None and operation[0] == "pong":
+                                self.record_pong(operation[1])
+                        self.root.after(0, self.commands.apply_operations, self.canvas, operations)
+                except socket.timeout:
+                    continue
+                except socket.error as e:
+                    if not self.closing:
+                        print(f"Socket error: {e}")
+                    break
+                except Exception as e:
+                    print(f"Unexpected error: {e}")
+                    break
+
+            if self.closing:
+                return
+            self.client_socket.close()
+            print("Socket closed, attempting to reconnect...")
+            while not self.reinitialize_connection() and not self.closing:
+                time.sleep(RECONNECT_DELAY)
+
+    def read_available(self):
+        """
+        Waits for data from the server, then reads everything else that is already available.
+
+        Reading a large snapshot in big batches keeps the per-batch overhead of parsing and of
+        scheduling work on the Tk thread low.
+
+        Returns:
+            bytes: The data read, at most about MAX_BATCH_SIZE bytes.
+
+        Raises:
+            socket.timeout: If no data arrives before the socket timeout.
+        """
+        data = self.client_socket.recv(RECV_SIZE)
+        while data and len(data) < MAX_BATCH_SIZE and select.select([self.client_socket], [], [], 0)[0]:
+            chunk = self.client_socket.recv(RECV_SIZE)
+            if not chunk:
                 break
+            data += chunk
+        return data
 
-        self.client_socket.close()
-        print("Socket closed, attempting to reconnect...")
-        self.reinitialize_connection()
+    def parse_frames(self, frames):
+        """
+        Parses frames into operations, using the worker pool for very large batches.
+
+        Parameters:
+            frames (list): The frames to parse.
+
+        Returns:
+            list: The parsed operations, in the same order as the frames.
+        """
+        if self.parse_pool is not None and len(frames) >= PARALLEL_PARSE_THRESHOLD:
+            chunksize = max(1, len(frames) // (4 * self.parse_workers))
+            return list(self.parse_pool.map(parse_command, frames, chunksize=chunksize))
+        return [parse_command(frame) for frame in frames]
+
+    def read_frames(self, data):
+        """
+        Adds received data to the pending buffer and yields every complete frame.
+
+        Frames are delimited by 'END\n'. Anything after the last delimiter is kept until the rest of
+        the frame arrives. A list reply that is still arriving is streamed: its complete lines are
+        yielded straight away, so a long listing is printed as it comes in.
+
+        Parameters:
+            data (str): The data just received from the server.
+
+        Yields:
+            str: Each complete frame, or the complete lines of a list reply in progress.
+        """
+        self.pending += data
+        *frames, self.pending = self.pending.split('END\n')
+        for frame in frames:
+            if frame:
+                yield frame
+        if self.pending.startswith("list"):
+            entries, sep, self.pending = self.pending.rpartition('\n')
+            if sep:
+                yield entries
 
     def show_commands(self, filter_type):
         """
@@ -297,15 +608,16 @@ class CanvasApp:
         Returns:
             None
         """
+        shape_map = self.commands.shape_map
         if filter_type == "all":
-            for shape_id in self.commands.shapes:
-                self.canvas.itemconfigure(shape_id, state='normal')
+            for item in shape_map.items.values():
+                self.canvas.itemconfigure(item, state='normal')
         elif filter_type == "mine":
-            for shape_id in self.commands.shapes:
+            for shape_id, item in shape_map.items.items():
                 if shape_id in self.user_commands:
-                    self.canvas.itemconfigure(shape_id, state='normal')
+                    self.canvas.itemconfigure(item, state='normal')
                 else:
-                    self.canvas.itemconfigure(shape_id, state='hidden')
+                    self.canvas.itemconfigure(item, state='hidden')
 
     def show_help(self):
         """
@@ -317,25 +629,56 @@ class CanvasApp:
         - tool {line | rectangle | circle | text}: Selects a tool for drawing.
         - colour {RGB}: Sets the drawing color using RGB values (e.g., "255 0 0" for red).
         - draw <x1> <y1> <x2> <y2>: Executes the drawing of the selected shape on the canvas.
-        - list {all | line | rectangle | circle | text} {all | mine}: Displays issued draw commands in the console.
+        - list {all | line | rectangle | circle | text} {all | mine} [limit] [cursor]: Displays a page of issued draw commands in the console.
+        - list more: Displays the next page of the last listing.
         - select {none | ID}: Selects an existing draw command to be modified.
         - delete {ID}: Deletes the draw command with the specified ID.
         - undo: Reverts the user's last action.
         - clear {all | mine}: Clears the canvas.
         - show {all | mine}: Controls what is displayed on the client's canvas.
+        - view {<x1> <y1> <x2> <y2> | all}: Receives only the updates in a region of the board, or all of them again.
+        - stats: Displays the connection statistics, including the round trip time to the server.
         - exit: Disconnects from the server and exits the application.
         """
         print(help_text)
 
-    def reinitialize_connection(self):
+    def connect(self, timeout):
         """
-        Reinitializes the connection with the server.
+        Connects to whichever of the endpoints answers first, or for a board to the first
+        one on the ring that can be reached, and sends the messages held until there was a
+        connection.
 
-        This method closes the old socket connection, creates a new socket, and reconnects to the server.
+        Parameters:
+            timeout (float): Seconds to wait for any endpoint to connect, or for each one for a board.
+
+        Returns:
+            None
 
         Raises:
-            socket.error: If there is an error reconnecting to the server.
+            OSError: If no endpoint could be connected to.
+        """
+        connect = connect_in_order if self.board else connect_first
+        client_socket, server_address = connect(self.endpoints, timeout, health=self.health)
+        client_socket.settimeout(0.1)  # Set a short timeout for non-blocking operations
+        with self.send_lock:
+            if self.unsent:
+                client_socket.sendall(b"".join(self.unsent))
+                self.unsent.clear()
+            self.client_socket, self.server_address = client_socket, server_address
+        self.connected.set()
 
+    def reinitialize_connection(self):
+        """
+        Reinitializes the connection with the server.
+
+        This method closes the old socket connection and reconnects to whichever endpoint answers first,
+        trying the endpoints that have been failing last, or for a board to the first one on the ring
+        that can be reached.
+        The connection attempt gives up after the time the heartbeat allows for missed beats, so a
+        server that is down does not hold up the next attempt.
+
+        Returns:
+            bool: True if the client reconnected, False otherwise.
         """
         try:
             self.client_socket.close()
@@ -343,10 +686,24 @@ class CanvasApp:
         except Exception as e:
             print(f"Failed to close old socket: {e}")
 
+        previous_address = self.server_address
         try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect(('127.0.0.1', 6001))
-            self.client_socket.settimeout(0.1)
-            print("Reconnected to the server.")
+            self.connect(max(1.0, (self.heartbeat_interval or 0) * self.missed_beats))
+            if self.server_address != previous_address:
+                # Another server has its own board and versions, which its snapshot will bring
+                self.root.after(0, self.commands.apply_operation, self.canvas, ("clear_all",))
+            self.pending = ""
+            with self.heartbeat_lock:
+                self.unanswered_beats = 0
+                self.ping_times.clear()
+            # Acks for requests sent on the old connection will never arrive
+            self.root.after(0, self.commands.abandon_requests)
+            self.stats["reconnects"] += 1
+            # The subscription belonged to the old connection. It is sent again like any other
+            # request, from the Tk thread once the old requests have been abandoned
+            self.root.after(0, self.resubscribe)
+            print(f"Reconnected to the server at {format_endpoint(self.server_address)}.")
+            return True
         except socket.error as e:
-            print(f"Failed to reconnect: {e}")
\ No newline at end of file
+            print(f"Failed to reconnect: {e}")
+            return False
\ No newline at end of file
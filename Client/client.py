@@ -1,7 +1,22 @@
+import argparse
 import tkinter as tk
 from canvas_app import CanvasApp
+from endpoints import parse_endpoints
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NetSketch client")
+    parser.add_argument("--server", default="127.0.0.1:6001",
+                        help="address of the server or relay to connect to, or a comma-separated list of them to try in parallel")
+    parser.add_argument("--board", help="name of the board to join, which picks one of the servers by consistent hashing")
+    parser.add_argument("--record", metavar="PATH", help="write the session's wire traffic to a recording file, overwriting it")
+    args, _ = parser.parse_known_args()
+    recorder = None
+    if args.record:
+        from recording import SessionRecorder
+        recorder = SessionRecorder(args.record)
+
     root = tk.Tk()
-    app = CanvasApp(root)
+    app = CanvasApp(root, parse_endpoints(args.server), recorder=recorder, board=args.board)
     root.mainloop()
+    if recorder is not None:
+        recorder.close()
@@ -1,168 +1,457 @@
+LEGACY_ACKS = {"Command processed successfully.": True, "Invalid command.": False}
+
+SHAPE_METHODS = {
+    "line": ("create_line", "fill"),
+    "rectangle": ("create_rectangle", "outline"),
+    "circle": ("create_oval", "outline"),
+    "text": ("create_text", "fill"),
+}
+
+
+def rgb_to_hex(r, g, b):
+    return '#{:02x}{:02x}{:02x}'.format(r, g, b)
+
+
+def parse_modifications(args):
+    """
+    Parses the arguments of a modify command into a list of modifications.
+
+    Parameters:
+        args (list): The arguments after the shape ID, e.g. ['colour', '255', '0', '0', 'draw', '1', '2', '3', '4'].
+
+    Returns:
+        list: ("colour", hex_colour), ("draw", coords) or ("invalid", message) tuples, in order.
+    """
+    modifications = []
+    current_mod = []
+
+    for arg in args:
+        if arg in ['colour', 'draw']:
+            if current_mod:
+                modifications.append(current_mod)
+            current_mod = [arg]
+        else:
+            current_mod.append(arg)
+
+    if current_mod:
+        modifications.append(current_mod)
+
+    parsed = []
+    for mod in modifications:
+        mod_type = mod[0]
+        try:
+            if mod_type == 'colour':
+                if len(mod) != 4:
+                    parsed.append(("invalid", f"Invalid colour modification: {mod}"))
+                    continue
+                parsed.append(("colour", rgb_to_hex(*map(int, mod[1:4]))))
+            elif mod_type == 'draw':
+                if len(mod) != 5:
+                    parsed.append(("invalid", f"Invalid draw modification: {mod}"))
+                    continue
+                parsed.append(("draw", tuple(map(int, mod[1:5]))))
+        except ValueError as e:
+            parsed.append(("invalid", f"Invalid modification: {mod} - ValueError: {e}"))
+    return parsed
+
+
+class ShapeMap:
+    """
+    Maps global shape ids to canvas items and back, both in O(1).
+
+    Both directions are dicts, so the map only ever holds the shapes that are on the canvas,
+    however far the item numbers move on as shapes are redrawn.
+    """
+
+    def __init__(self):
+        self.items = {}  # shape id -> canvas item
+        self.ids = {}  # canvas item -> shape id
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, shape_id):
+        return shape_id in self.items
+
+    def bind(self, shape_id, item):
+        """
+        Records that a shape is drawn as a canvas item, replacing any earlier item for it.
+        """
+        self.unbind(shape_id)
+        self.ids[item] = shape_id
+        self.items[shape_id] = item
+
+    def unbind(self, shape_id):
+        """
+        Forgets a shape.
+
+        Returns:
+            int: The canvas item the shape was drawn as, or None if it was not on the canvas.
+        """
+        item = self.items.pop(shape_id, None)
+        if item is not None:
+            self.ids.pop(item, None)
+        return item
+
+    def item(self, shape_id):
+        return self.items.get(shape_id)
+
+    def shape_id(self, item):
+        return self.ids.get(item)
+
+    def clear(self):
+        self.items.clear()
+        self.ids.clear()
+
+
+def parse_command(command):
+    """
+    Parses a frame received from the server into an operation that is ready to apply.
+
+    Parsing only looks at the text, never at the canvas or the Commands state, so it can run
+    on the network thread or in a worker process while the Tk thread only applies the result.
+
+    Parameters:
+        command (str): The frame received from the server.
+
+    Returns:
+        tuple: The operation, whose first element is its kind: "draw", "delete", "modify",
+            "clear_all", "clear_mine", "list", "ack", "stamped", "pong" or "invalid". None if there is
+            nothing to do. An "ack" is (kind, request_id, ok, version), with a request id of None
+            for the plain acks of messages sent without one. A "stamped" operation is
+            (kind, version, operation) for a frame prefixed with "ver <version>".
+    """
+    parts = command.strip().split()
+    if not parts:
+        return None
+    if command.strip() in LEGACY_ACKS:
+        return ("ack", None, LEGACY_ACKS[command.strip()], 0)
+    try:
+        if parts[0] == "ack":
+            ok = parts[2] == "ok"
+            return ("ack", parts[1], ok, int(parts[3]) if ok else 0)
+        if parts[0] == "pong":
+            return ("pong", parts[1] if len(parts) > 1 else None)
+        if parts[0] == "ver":
+            return ("stamped", int(parts[1]), parse_command(command.lstrip().split(None, 2)[2]))
+        if parts[0] == "list":
+            return ("list", command)
+        if parts[0] == "delete":
+            return ("delete", parts[1])
+        if parts[0] == "clear":
+            if len(parts) > 1 and parts[1] == "all":
+                return ("clear_all",)
+            if len(parts) > 1 and parts[1] == "mine":
+                return ("clear_mine", parts[2:])
+            return None
+        if parts[0] == "modify":
+            if len(parts) < 4:
+                return ("invalid", f"Invalid modify command: {parts[1:]}")
+            return ("modify", parts[1], parse_modifications(parts[2:]))
+    except (ValueError, IndexError) as e:
+        return ("invalid", f"Error parsing command: '{command}' - {type(e).__name__}: {e}")
+    if len(parts) < 7:
+        return ("invalid", f"Invalid command format or missing arguments: '{command}'")
+    shape = parts[1]
+    if shape not in SHAPE_METHODS:
+        return ("invalid", f"Unsupported shape type: '{shape}'")
+    method, colour_option = SHAPE_METHODS[shape]
+    try:
+        if shape == "text":
+            _, _, shape_id, x1, y1, text, r, g, b = parts
+            # Remove surrounding quotes from text
+            text = text.strip("'\"")
+            color = rgb_to_hex(int(r), int(g), int(b))
+            return ("draw", shape_id, method, (int(x1), int(y1)), {"text": text, "fill": color}, command)
+        x1, y1, x2, y2 = map(int, parts[3:7])
+        if len(parts) >= 10:  # Ensure we have enough parts for RGB values
+            r, g, b = map(int, parts[7:10])
+            color = rgb_to_hex(r, g, b)
+        else:
+            color = '#000000'  # Default to black if RGB values are not provided
+        return ("draw", parts[2], method, (x1, y1, x2, y2), {colour_option: color}, command)
+    except ValueError as e:
+        return ("invalid", f"Error parsing command: '{command}' - ValueError: {e}")
+
+
 class Commands:
+    """
+    Keeps the shapes on the board and applies commands to the canvas.
+
+    Shapes are identified by global ids, which the client that drew them makes unique by
+    prefixing its own random tag, so peers' delete and modify commands name the same shape
+    on every client. `shapes` holds each shape's draw command in board order and
+    `shape_map` the canvas item it is currently drawn as.
+
+    The client's own draw, modify and delete commands are applied straight away and sent
+    with a request id, without waiting for the server. The server stamps every change to a
+    shape with a version, higher than any before it, and the broadcasts carry the stamp.
+    Concurrent edits to a shape are settled by last writer wins: a stamped change is only
+    applied if it is newer than the version already applied to the shape. While the
+    client's own changes to a shape are in flight their versions are not known yet, so
+    stamped changes from peers are held in `deferred` until the acks arrive.
+    """
+
     def __init__(self):
-        self.shapes = {}
-        self.draw_commands = []
+        self.shapes = {}  # shape id -> draw command, in board order
+        self.shape_map = ShapeMap()
         self.command_id = 0
         self.selected_command_id = None
         self.user_commands = set()  
+        self.list_cursor = None
+        self.versions = {}  # shape id -> version of the last change applied, kept after a delete
+        self.requests = {}  # request id -> shape id (or None) of a request waiting for its ack
+        self.pending = {}  # shape id -> number of this client's changes to it in flight
+        self.deferred = {}  # shape id -> [(version, operation)] from peers, held until the acks arrive
+        self.next_request = 0
 
     def rgb_to_hex(self, r, g, b):
-        return '#{:02x}{:02x}{:02x}'.format(r, g, b)
+        return rgb_to_hex(r, g, b)
     
     def apply_draw_command(self, canvas, command, redraw=False):
         """
         Applies a draw command to the canvas.
 
+        The command is parsed with `parse_command` and applied with `apply_operation`.
+
         Parameters:
             canvas (Canvas): The canvas object to draw on.
             command (str): The draw command to apply.
             redraw (bool, optional): Indicates whether the command is being redrawn. Defaults to False.
 
         Returns:
-            int: The ID of the newly created shape.
+            int: The canvas item of the newly created shape.
+        """
+        return self.apply_operation(canvas, parse_command(command), redraw)
 
-        Raises:
-            ValueError: If there is an error parsing the command.
-            IndexError: If there is an index error with the command.
-            Exception: If there is an unexpected error processing the command.
+    def apply_operations(self, canvas, operations):
         """
-        parts = command.strip().split()
-        if parts[0] == "list":
-            list_commands = command.split("list")[1:]  # Split by "list" and remove the first empty part
-            for list_cmd in list_commands:
-                cmd_parts = list_cmd.strip().split('=>')
-                if len(cmd_parts) == 2:
-                    list_id = cmd_parts[0].strip()
-                    list_item = cmd_parts[1].strip()
-                    print(f"[{list_id}] => {list_item}")
-            return
-        if parts[0] == "delete":
-            shape_id = int(parts[1])
-            self.delete_command(canvas, shape_id)
-            return
-        if parts[0] == "clear":
-            if len(parts) > 1 and parts[1] == "all":
-                canvas.delete("all")
-                self.shapes.clear()
-                self.draw_commands.clear()
-                self.user_commands.clear()
-            elif len(parts) > 1 and parts[1] == "mine":
-                for shape_id in parts[2:]:
-                    canvas.delete(shape_id)
-                    if shape_id in self.shapes:
-                        del self.shapes[shape_id]
-                    self.draw_commands = [(id, cmd) for id, cmd in self.draw_commands if id not in self.user_commands]
-                self.user_commands.clear()
-            return
-        if parts[0] == "modify":
-            print (f"Modifying command: {command}")
-            self.selected_command_id = int(parts[1])
-            return self.modify_command(canvas, parts[2:])
-        if len(parts) < 7:
-            print(f"Invalid command format or missing arguments: '{command}'")
-            return
-        shape = parts[1]
-        try:
-            if shape == "text":
-                _, _, shape_id, x1, y1, text, r, g, b = parts
-                # Remove surrounding quotes from text
-                text = text.strip("'\"")
-                color = self.rgb_to_hex(int(r), int(g), int(b))
-                shape_id = canvas.create_text(int(x1), int(y1), text=text, fill=color)
-            else:
-                x1, y1, x2, y2 = map(int, parts[3:7])
-                if len(parts) >= 10:  # Ensure we have enough parts for RGB values
-                    r, g, b = map(int, parts[7:10])
-                    color = self.rgb_to_hex(r, g, b)
-                else:
-                    color = '#000000'  # Default to black if RGB values are not provided
-
-            print(f"Color: {color}")
-            if shape == "line":
-                shape_id = canvas.create_line(x1, y1, x2, y2, fill=color)
-            elif shape == "rectangle":
-                shape_id = canvas.create_rectangle(x1, y1, x2, y2, outline=color)
-            elif shape == "circle":
-                shape_id = canvas.create_oval(x1, y1, x2, y2, outline=color)
-            elif shape == "text":
-                shape_id = canvas.create_text(x1, y1, text=text, fill=color)
-            else:
-                print(f"Unsupported shape type: '{shape}'")   
-                return
+        Applies a batch of parsed operations to the canvas, in order.
 
+        Parameters:
+            canvas (Canvas): The canvas object to draw on.
+            operations (list): Operations returned by `parse_command`.
+
+        Returns:
+            None
+        """
+        for operation in operations:
+            self.apply_operation(canvas, operation)
+
+    def apply_operation(self, canvas, operation, redraw=False):
+        """
+        Applies one parsed operation to the canvas.
+
+        This is all that is left for the Tk thread to do once a frame has been parsed:
+        the canvas item calls and the bookkeeping that goes with them.
+
+        Parameters:
+            canvas (Canvas): The canvas object to draw on.
+            operation (tuple): An operation returned by `parse_command`.
+            redraw (bool, optional): Indicates whether the command is being redrawn. Defaults to False.
+
+        Returns:
+            int: The canvas item of the newly created shape, for draw operations.
+        """
+        if operation is None:
+            return
+        kind = operation[0]
+        if kind == "draw":
+            _, shape_id, method, coords, options, command = operation
+            old_item = self.shape_map.item(shape_id)
+            if old_item is not None:
+                canvas.delete(old_item)  # A shape drawn again replaces the earlier drawing
+            item = getattr(canvas, method)(*coords, **options)
+            self.shape_map.bind(shape_id, item)
             if not redraw:
-                print("Adding shape...")
-                self.draw_commands.append((shape_id, command))
                 self.shapes[shape_id] = command
                 self.command_id += 1
+            return item
+        if kind == "stamped":
+            return self.apply_stamped(canvas, operation[1], operation[2], redraw)
+        if kind == "ack":
+            self.acknowledge(canvas, operation[1], operation[2], operation[3])
+        elif kind == "delete":
+            self.delete_command(canvas, operation[1])
+        elif kind == "clear_all":
+            canvas.delete("all")
+            self.shapes.clear()
+            self.shape_map.clear()
+            self.user_commands.clear()
+            self.versions.clear()
+            self.deferred.clear()
+        elif kind == "clear_mine":
+            # The ids are the sender's shapes, so only those are removed
+            for shape_id in operation[1]:
+                self.delete_command(canvas, shape_id)
+        elif kind == "modify":
+            item = self.shape_map.item(operation[1])
+            if item is not None:
+                self.apply_modifications(canvas, item, operation[2])
+        elif kind == "list":
+            for list_id, list_item in self.iter_list_entries(operation[1]):
+                print(f"[{list_id}] => {list_item}")
+        elif kind == "invalid":
+            print(operation[1])
+
+    def operation_shape(self, operation):
+        """
+        Returns the shape id a draw, modify or delete operation changes, or None for other operations.
+        """
+        if operation is not None and operation[0] in ("draw", "modify", "delete"):
+            return operation[1]
+        return None
 
-            return shape_id  # Return the new shape_id
+    def apply_stamped(self, canvas, version, operation, redraw=False):
+        """
+        Applies a change stamped with its version by the server, if it is the newest change to its shape.
 
-        except ValueError as e:
-            print(f"Error parsing command: '{command}' - ValueError: {e}")
-        except IndexError as e:
-            print(f"Index error with command: '{command}' - IndexError: {e}")
-        except Exception as e:
-            print(f"Unexpected error processing command: '{command}' - Exception: {e}")
+        Parameters:
+            canvas (Canvas): The canvas object to draw on.
+            version (int): The version the server stamped on the change.
+            operation (tuple): The change, as returned by `parse_command`.
+            redraw (bool, optional): Indicates whether the command is being redrawn. Defaults to False.
 
-    def add_command(self, shape_id, command):
+        Returns:
+            int: The canvas item of the newly created shape, for draw operations that were applied.
+        """
+        shape_id = self.operation_shape(operation)
+        if shape_id is None:
+            return self.apply_operation(canvas, operation, redraw)
+        if self.pending.get(shape_id):
+            self.deferred.setdefault(shape_id, []).append((version, operation))
+            return None
+        if version <= self.versions.get(shape_id, 0):
+            return None  # A newer change to the shape has already been applied
+        self.versions[shape_id] = version
+        return self.apply_operation(canvas, operation, redraw)
+
+    def track_request(self, shape_id=None):
         """
-        Adds a command for a specific shape.
+        Allocates a request id for a message about to be sent.
 
         Parameters:
-            shape_id (int): The ID of the shape.
-            command (str): The command to be executed for the shape.
+            shape_id (str, optional): The shape the message changes, which was already changed locally.
 
         Returns:
-        None
+            str: The request id to send with the message.
         """
-        self.shapes[shape_id] = command
-        self.draw_commands.append((shape_id, command))
-        self.user_commands.add(shape_id)  # Add the shape_id to user_commands
-
-    def redraw(self, canvas, filter_user=None):
+        self.next_request += 1
+        request_id = str(self.next_request)
+        self.requests[request_id] = shape_id
+        if shape_id is not None:
+            self.pending[shape_id] = self.pending.get(shape_id, 0) + 1
+        return request_id
+
+    def acknowledge(self, canvas, request_id, ok, version):
         """
-        Redraws the canvas by applying the draw commands stored in the `draw_commands` array.
+        Settles a request once its ack arrives.
+
+        An accepted change records the version the server gave it. When the last change in
+        flight for a shape is settled, the peers' changes held back for it are applied if they
+        are newer. A rejected change is reported; the local canvas keeps it until a newer change
+        to the shape arrives.
 
         Parameters:
-            canvas (Canvas): The canvas object to redraw on.
-            filter_user (str, optional): If provided, only redraws shapes belonging to the specified user.
+            canvas (Canvas): The canvas object to draw on.
+            request_id (str): The request id the ack is for, or None for a plain ack.
+            ok (bool): Whether the server accepted the request.
+            version (int): The version the server stamped on the shape, or 0.
 
         Returns:
             None
         """
-        print("Shapes array:")
-        print(self.shapes)
-        print("Draw commands array:")
-        print(self.draw_commands)
-        canvas.delete("all")
-        new_shapes = {}
-        id_mapping = {}
-        for old_shape_id, command in self.draw_commands:
-            new_shape_id = self.apply_draw_command(canvas, command, redraw=True)
-            new_shapes[new_shape_id] = command
-            id_mapping[old_shape_id] = new_shape_id
+        if request_id not in self.requests:
+            return
+        shape_id = self.requests.pop(request_id)
+        if not ok:
+            print(f"Request {request_id} was rejected by the server")
+        if shape_id is None:
+            return
+        if ok and version > self.versions.get(shape_id, 0):
+            self.versions[shape_id] = version
+        self.pending[shape_id] -= 1
+        if self.pending[shape_id]:
+            return
+        del self.pending[shape_id]
+        for stamped_version, operation in sorted(self.deferred.pop(shape_id, []), key=lambda change: change[0]):
+            self.apply_stamped(canvas, stamped_version, operation)
 
-        self.shapes = new_shapes  # Update shapes with new IDs
-        self.update_draw_commands(id_mapping)
+    def abandon_requests(self):
+        """
+        Forgets every request in flight, whose acks will never arrive after a reconnect.
 
-    def update_draw_commands(self, id_mapping):
+        Returns:
+            None
         """
-        Updates the draw commands with new shape IDs based on the given ID mapping.
+        self.requests.clear()
+        self.pending.clear()
+        self.deferred.clear()
+
+    def iter_list_entries(self, reply):
+        """
+        Yields the entries of a list reply one at a time.
+
+        Each entry line has the form "list <id> => <item>". A "list next <cursor>" line means the
+        server has more entries than fit on the page; the cursor is stored in `list_cursor` so the
+        next page can be requested with "list more".
+
+        Parameters:
+            reply (str): The text of the list reply, or the part of it received so far.
+
+        Yields:
+            tuple: The (list_id, list_item) pair for each complete entry.
+        """
+        for line in reply.splitlines():
+            line = line.strip()
+            if not line.startswith("list"):
+                continue
+            line = line[len("list"):].strip()
+            if line.startswith("next "):
+                self.list_cursor = line.split()[1]
+                print("More entries available. Use 'list more' to see the next page.")
+                continue
+            list_id, sep, list_item = line.partition('=>')
+            if sep:
+                yield list_id.strip(), list_item.strip()
+
+    def add_command(self, shape_id, command, item=None):
+        """
+        Adds a shape drawn by this client.
 
         Parameters:
-            id_mapping (dict): A dictionary mapping old shape IDs to new shape IDs.
+            shape_id (str): The global ID of the shape.
+            command (str): The draw command for the shape.
+            item (int, optional): The canvas item the shape was drawn as.
 
         Returns:
-            None
+        None
+        """
+        self.shapes[shape_id] = command
+        if item is not None:
+            self.shape_map.bind(shape_id, item)
+        self.user_commands.add(shape_id)  # Add the shape_id to user_commands
+
+    def redraw(self, canvas, filter_user=None):
+        """
+        Redraws the canvas by applying the draw commands stored in `shapes`, in board order.
+
+        Each shape is rebound to its new canvas item as it is drawn, so its global ID stays
+        valid without remapping.
 
+        Parameters:
+            canvas (Canvas): The canvas object to redraw on.
+            filter_user (str, optional): If provided, only redraws shapes belonging to the specified user.
+
+        Returns:
+            None
         """
-        updated_draw_commands = []
-        for old_shape_id, command in self.draw_commands:
-            new_shape_id = id_mapping.get(old_shape_id)
-            if new_shape_id:
-                updated_draw_commands.append((new_shape_id, command))
-        self.draw_commands = updated_draw_commands
+        canvas.delete("all")
+        self.shape_map.clear()
+        for shape_id, command in self.shapes.items():
+            if filter_user == "mine" and shape_id not in self.user_commands:
+                continue
+            self.apply_draw_command(canvas, command, redraw=True)
 
     def list_commands(self, filter_tool=None, filter_user=None):
         """
@@ -177,7 +466,7 @@ class Commands:
         """
         print(f"Filtering commands by tool: {filter_tool} and user: {filter_user}")
         filtered_commands = []
-        for shape_id, command in self.draw_commands:
+        for shape_id, command in self.shapes.items():
             parts = command.split()
             if filter_tool != "all" and filter_tool not in parts:
                 continue
@@ -193,14 +482,17 @@ class Commands:
 
         Parameters:
             canvas (Canvas): The canvas object where the shape is located.
-            shape_id (int): The ID of the shape to be deleted.
+            shape_id (str): The global ID of the shape to be deleted.
 
         Returns:
             None
         """
         print(f"Deleting shape with ID: {shape_id}")
-        print(self.shapes)
-        canvas.delete(shape_id)
+        item = self.shape_map.unbind(shape_id)
+        if item is not None:
+            canvas.delete(item)
+        self.shapes.pop(shape_id, None)
+        self.user_commands.discard(shape_id)
     
     def undo_last(self, canvas):
         pass
@@ -221,6 +513,31 @@ class Commands:
 
         return self.handle_modify_command(canvas, [str(self.selected_command_id)] + args)
 
+    def apply_modifications(self, canvas, shape_id, modifications):
+        """
+        Applies parsed modifications to a shape on the canvas.
+
+        Parameters:
+            canvas (Canvas): The canvas object on which the shape is drawn.
+            shape_id (int): The canvas item of the shape to modify.
+            modifications (list): Modifications returned by `parse_modifications`.
+
+        Returns:
+            None
+        """
+        shape_type = canvas.type(shape_id)
+        for mod_type, value in modifications:
+            if mod_type == 'colour':
+                # Use 'fill' for lines and text, 'outline' for other shapes
+                if shape_type in ["line", "text"]:
+                    canvas.itemconfig(shape_id, fill=value)
+                else:
+                    canvas.itemconfig(shape_id, outline=value)
+            elif mod_type == 'draw':
+                canvas.coords(shape_id, *value)
+            else:
+                print(value)
+
     def handle_modify_command(self, canvas, args):
         """
         Modifies a shape on the canvas based on the given arguments.
@@ -232,54 +549,18 @@ class Commands:
         Returns:
             str: A message indicating the result of the modification.
 
-        Raises:
-            ValueError: If the shape ID is invalid.
-
         """
         if len(args) < 2:
             print(f"Invalid modify command: {args}")
             return "Invalid modify command"
 
-        try:
-            shape_id = self.selected_command_id
-        except ValueError:
+        shape_id = self.selected_command_id
+        item = self.shape_map.item(shape_id)
+        if item is None:
             print(f"Invalid shape ID: {args[0]}")
             return f"Invalid shape ID: {args[0]}"
 
-        shape_type = canvas.type(shape_id)
-        modifications = []
-        current_mod = []
-
-        for arg in args[1:]:
-            if arg in ['colour', 'draw']:
-                if current_mod:
-                    modifications.append(current_mod)
-                current_mod = [arg]
-            else:
-                current_mod.append(arg)
-        
-        if current_mod:
-            modifications.append(current_mod)
-
-        for mod in modifications:
-            mod_type = mod[0]
-            if mod_type == 'colour':
-                if len(mod) != 4:
-                    print(f"Invalid colour modification: {mod}")
-                    continue
-                r, g, b = map(int, mod[1:4])
-                color = f"#{r:02x}{g:02x}{b:02x}"
-                # Use 'fill' for lines and text, 'outline' for other shapes
-                if shape_type in ["line", "text"]:
-                    canvas.itemconfig(shape_id, fill=color)
-                else:
-                    canvas.itemconfig(shape_id, outline=color)
-            elif mod_type == 'draw':
-                if len(mod) != 5:
-                    print(f"Invalid draw modification: {mod}")
-                    continue
-                x1, y1, x2, y2 = map(int, mod[1:5])
-                canvas.coords(shape_id, x1, y1, x2, y2)
+        self.apply_modifications(canvas, item, parse_modifications(args[1:]))
 
         print(f"Modified shape with ID: {shape_id}")
         return f"Modified shape with ID: {shape_id}"
\ No newline at end of file
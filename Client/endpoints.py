@@ -0,0 +1,276 @@
+import bisect
+import errno
+import select
+import socket
+import time
+
+DEFAULT_PORT = 6001
+CONNECT_STAGGER = 0.25  # Seconds each connection attempt gets before the next one is started, as in RFC 8305
+RING_REPLICAS = 100  # Points each endpoint gets on the hash ring, to spread boards evenly
+RETRY_BACKOFF = 1.0  # Seconds a failed endpoint is ranked last for, doubling with each failure in a row
+MAX_RETRY_BACKOFF = 30.0
+
+
+def parse_endpoint(text):
+    """
+    Parses "host:port", "host" or ":port" into a (host, port) address.
+    """
+    host, separator, port = text.strip().rpartition(":")
+    if not separator:
+        host, port = port, ""
+    return (host or "127.0.0.1", int(port) if port else DEFAULT_PORT)
+
+
+def parse_endpoints(text):
+    """
+    Parses a comma-separated list of endpoints, e.g. "127.0.0.1:6001,127.0.0.1:6002".
+
+    Returns:
+        list: The (host, port) addresses, in the order given.
+    """
+    return [parse_endpoint(part) for part in text.split(",") if part.strip()]
+
+
+def format_endpoint(endpoint):
+    return f"{endpoint[0]}:{endpoint[1]}"
+
+
+class EndpointHealth:
+    """
+    Keeps track of how the connection attempts to each endpoint have gone.
+
+    An endpoint that failed is held back for a backoff that doubles with each failure in a
+    row, so `ranked` tries the endpoints that are working first without giving up on the
+    others for good.
+    """
+
+    def __init__(self, backoff=RETRY_BACKOFF, max_backoff=MAX_RETRY_BACKOFF):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.endpoints = {}  # endpoint -> its statistics
+
+    def get(self, endpoint):
+        return self.endpoints.setdefault(endpoint, {
+            "successes": 0, "failures": 0, "consecutive_failures": 0,
+            "connect_ms": None, "last_error": None, "retry_at": 0.0,
+        })
+
+    def record_success(self, endpoint, seconds):
+        entry = self.get(endpoint)
+        entry["successes"] += 1
+        entry["consecutive_failures"] = 0
+        entry["connect_ms"] = seconds * 1000
+        entry["retry_at"] = 0.0
+
+    def record_failure(self, endpoint, error):
+        entry = self.get(endpoint)
+        entry["failures"] += 1
+        entry["consecutive_failures"] += 1
+        entry["last_error"] = str(error)
+        delay = min(self.max_backoff, self.backoff * 2 ** (entry["consecutive_failures"] - 1))
+        entry["retry_at"] = time.monotonic() + delay
+
+    def is_healthy(self, endpoint):
+        return time.monotonic() >= self.get(endpoint)["retry_at"]
+
+    def ranked(self, endpoints):
+        """
+        Orders endpoints for a connection attempt: healthy ones first, then by failures in a row.
+
+        The order of the given list is kept between endpoints that rank the same, so a
+        preference order (such as a board's order on the hash ring) still holds.
+        """
+        return sorted(endpoints, key=lambda endpoint: (not self.is_healthy(endpoint), self.get(endpoint)["consecutive_failures"]))
+
+
+class HashRing:
+    """
+    Maps board names onto endpoints with consistent hashing.
+
+    Each endpoint is hashed onto the ring at `replicas` points, and a board belongs to the
+    endpoint at the first point after the board's own hash. Adding or removing a server only
+    moves the boards next to its points. The hashes are MD5 digests rather than `hash`, so
+    every client process agrees on where a board lives.
+    """
+
+    def __init__(self, endpoints, replicas=RING_REPLICAS):
+        self.points = []
+        self.owners = []
+        for point, endpoint in sorted((self.hash(f"{format_endpoint(endpoint)}#{i}"), endpoint)
+                                      for endpoint in set(endpoints) for i in range(replicas)):
+            self.points.append(point)
+            self.owners.append(endpoint)
+
+    @staticmethod
+    def hash(key):
+        import hashlib  # Only boards need it, so clients without one do not pay for loading it
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def preference(self, board):
+        """
+        Returns every endpoint in the order a board should try them.
+
+        The first is the board's owner. If it is down, the board moves to the next endpoint
+        along the ring, the same one for every client.
+
+        Parameters:
+            board (str): The name of the board.
+
+        Returns:
+            list: The endpoints, owner first.
+        """
+        start = bisect.bisect(self.points, self.hash(board))
+        order = []
+        for i in range(len(self.owners)):
+            endpoint = self.owners[(start + i) % len(self.owners)]
+            if endpoint not in order:
+                order.append(endpoint)
+        return order
+
+    def owner(self, board):
+        return self.preference(board)[0]
+
+
+def connect_endpoint(endpoint, timeout=5.0, health=None):
+    """
+    Connects to one endpoint with a blocking connect.
+
+    Parameters:
+        endpoint (tuple): The (host, port) address.
+        timeout (float, optional): Seconds to wait for the connection. Defaults to 5.
+        health (EndpointHealth, optional): Records the outcome of the attempt.
+
+    Returns:
+        socket.socket: The connected blocking socket.
+
+    Raises:
+        OSError: If the endpoint could not be connected to within the timeout.
+    """
+    sock = socket.socket(socket.AF_INET6 if ":" in endpoint[0] else socket.AF_INET, socket.SOCK_STREAM)
+    started = time.monotonic()
+    try:
+        sock.settimeout(timeout)
+        sock.connect(endpoint)
+        sock.settimeout(None)
+    except OSError as e:
+        sock.close()
+        if health is not None:
+            health.record_failure(endpoint, e)
+        raise
+    if health is not None:
+        health.record_success(endpoint, time.monotonic() - started)
+    return sock
+
+
+def connect_in_order(endpoints, timeout=5.0, health=None):
+    """
+    Connects to the first endpoint that can be reached, trying them one at a time in the given order.
+
+    Unlike `connect_first`, an endpoint is only passed over once its attempt has failed, by
+    being refused, unreachable or not connecting within the whole timeout. A slow but working
+    endpoint is never beaten by a later one, so every client of a board ends up on the same
+    server. The order is kept as given, whatever the health of the endpoints.
+
+    Parameters:
+        endpoints (list): The (host, port) addresses, most preferred first.
+        timeout (float, optional): Seconds each attempt gets to connect. Defaults to 5.
+        health (EndpointHealth, optional): Records the outcome of every attempt.
+
+    Returns:
+        tuple: The connected blocking socket and the endpoint it is connected to.
+
+    Raises:
+        OSError: If no endpoint could be connected to.
+    """
+    errors = []
+    for endpoint in endpoints:
+        try:
+            return connect_endpoint(endpoint, timeout, health), endpoint
+        except OSError as e:
+            errors.append(f"{format_endpoint(endpoint)}: {e}")
+    raise OSError(f"Could not connect to any endpoint ({'; '.join(errors) or 'no endpoints'})")
+
+
+def connect_first(endpoints, timeout=5.0, stagger=CONNECT_STAGGER, health=None):
+    """
+    Connects to whichever endpoint answers first, trying them in parallel (happy eyeballs).
+
+    Attempts are started in order, each one `stagger` seconds after the last or straight away
+    when one fails, so a preferred endpoint that answers quickly always wins while a dead one
+    only costs the stagger. The first attempt to connect is kept and the rest are closed. A
+    single endpoint is simply connected to, with a blocking connect.
+
+    Parameters:
+        endpoints (list): The (host, port) addresses, most preferred first.
+        timeout (float, optional): Seconds to wait for any attempt to connect. Defaults to 5.
+        stagger (float, optional): Seconds between starting attempts. Defaults to CONNECT_STAGGER.
+        health (EndpointHealth, optional): Records the outcome of every attempt, and ranks the endpoints.
+
+    Returns:
+        tuple: The connected blocking socket and the endpoint it is connected to.
+
+    Raises:
+        OSError: If no endpoint could be connected to within the timeout.
+    """
+    if health is not None:
+        endpoints = health.ranked(endpoints)
+    if len(endpoints) == 1:
+        return connect_endpoint(endpoints[0], timeout, health), endpoints[0]
+
+    waiting = list(endpoints)
+    attempts = {}  # socket -> (endpoint, time the attempt started)
+    errors = []
+    deadline = time.monotonic() + timeout
+    next_start = time.monotonic()
+
+    def fail(endpoint, error):
+        errors.append(f"{format_endpoint(endpoint)}: {error}")
+        if health is not None:
+            health.record_failure(endpoint, error)
+
+    try:
+        while waiting or attempts:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if waiting and (now >= next_start or not attempts):
+                endpoint = waiting.pop(0)
+                next_start = now + stagger
+                try:
+                    family, kind, proto, _, address = socket.getaddrinfo(*endpoint, type=socket.SOCK_STREAM)[0]
+                    sock = socket.socket(family, kind, proto)
+                except OSError as e:
+                    fail(endpoint, e)
+                    next_start = now
+                    continue
+                sock.setblocking(False)
+                error = sock.connect_ex(address)
+                if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    sock.close()
+                    fail(endpoint, OSError(error, errno.errorcode.get(error, str(error))))
+                    next_start = now
+                    continue
+                attempts[sock] = (endpoint, now)
+                continue
+
+            wait = (min(deadline, next_start) if waiting else deadline) - now
+            _, writable, _ = select.select([], list(attempts), [], max(0.0, wait))
+            for sock in writable:
+                endpoint, started = attempts.pop(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    sock.close()
+                    fail(endpoint, OSError(error, errno.errorcode.get(error, str(error))))
+                    next_start = time.monotonic()
+                    continue
+                sock.setblocking(True)
+                if health is not None:
+                    health.record_success(endpoint, time.monotonic() - started)
+                return sock, endpoint
+        for endpoint, _ in attempts.values():
+            fail(endpoint, "timed out")
+    finally:
+        # The attempts that lost the race, or that were still going at the deadline
+        for sock in attempts:
+            sock.close()
+    raise OSError(f"Could not connect to any endpoint ({'; '.join(errors) or 'timed out'})")
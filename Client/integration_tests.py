@@ -1,99 +1,101 @@
 import unittest
-import subprocess
-import time
+import asyncio
+import io
 import socket
-import threading
+import time
 import sys
 import os
-import signal
+import shutil
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock, patch
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-project_root = os.path.dirname(parent_dir)
-sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
 
-from commands import Commands
 from canvas_app import CanvasApp
+from backends import MemoryBackend
+from stand_in_server import StandInServer
+from recording import SENT, SessionRecorder, SessionReplayer, read_recording
+from commands import Commands
+from relay import Relay
+from endpoints import EndpointHealth, HashRing, connect_first, connect_endpoint, connect_in_order
+
+
+def wait_for(condition, timeout=2.0):
+    """
+    Polls a condition until it holds or the timeout expires.
+
+    Returns:
+        bool: True if the condition held before the timeout, False otherwise.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
 
 class IntegrationTestSetup:
-    def __init__(self, server_path, client_path):
-        self.server_path = "/Users/lenisesilvio/CPS2008-1/build/server"
-        self.client_path = "/Users/lenisesilvio/CPS2008-1/Client/client.py"
-        self.server_process = None
-
-    def start_server(self):
-        print(f"Attempting to start server at: {self.server_path}")
-        if not os.path.exists(self.server_path):
-            print(f"Error: Server executable not found at {self.server_path}")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Directory contents: {os.listdir(os.path.dirname(self.server_path))}")
-            raise FileNotFoundError(f"Server executable not found at {self.server_path}")
-        
-        try:
-            self.server_process = subprocess.Popen([self.server_path])
-            print(f"Server process started with PID: {self.server_process.pid}")
-            time.sleep(2)  
-        except Exception as e:
-            print(f"Error starting server: {str(e)}")
-            raise
-
-    def stop_server(self):
-        if self.server_process:
-            print(f"Stopping server process with PID: {self.server_process.pid}")
-            self.server_process.terminate()
-            try:
-                self.server_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print("Server didn't terminate gracefully, forcing...")
-                self.server_process.kill()
-            print("Server stopped")
-
-    def run_client(self, commands, timeout=10):
-        print(f"Running client with commands: {commands}")
-        print(f"Client path: {self.client_path}")
-        if not os.path.exists(self.client_path):
-            print(f"Error: Client script not found at {self.client_path}")
-            print(f"Directory contents: {os.listdir(os.path.dirname(self.client_path))}")
-            raise FileNotFoundError(f"Client script not found at {self.client_path}")
+    def __init__(self, server):
+        self.server = server
 
-        try:
-            client_process = subprocess.Popen(['python3', self.client_path, '--test'], 
-                                              stdin=subprocess.PIPE, 
-                                              stdout=subprocess.PIPE, 
-                                              stderr=subprocess.PIPE, 
-                                              text=True)
-            try:
-                stdout, stderr = client_process.communicate(input="\n".join(commands) + "\nexit\n", timeout=timeout)
-            except subprocess.TimeoutExpired:
-                print(f"Client process timed out after {timeout} seconds")
-                client_process.kill()
-                stdout, stderr = client_process.communicate()
-            print(f"Client stdout: {stdout}")
-            print(f"Client stderr: {stderr}")
-            return stdout, stderr
-        except Exception as e:
-            print(f"Error running client: {str(e)}")
-            raise
+    def start_client(self, recorder=None, client_tag=None, **options):
+        """
+        Starts a CanvasApp connected to the stand-in server, drawing on an in-memory backend.
+
+        Frames received from the server are applied straight away on the receive thread
+        instead of being scheduled on a Tk main loop. Other options are passed to CanvasApp.
+        """
+        root = MagicMock()
+        root.after.side_effect = lambda delay, func, *args: func(*args) if delay == 0 else None
+        return CanvasApp(root, self.server.address, MemoryBackend(), recorder, client_tag=client_tag, **options)
+
+    def run_client(self, commands, timeout=2.0, client_tag="test"):
+        """
+        Runs a client through a list of terminal commands and returns everything it printed.
+
+        The client's shapes are numbered "<client_tag>.1", "<client_tag>.2" and so on. It is
+        stopped once the server has acknowledged every message it sent.
+        """
+        output = io.StringIO()
+        with redirect_stdout(output):
+            app = self.start_client(client_tag=client_tag)
+            for command in commands:
+                app.execute_command(command)
+            wait_for(lambda: not app.commands.requests, timeout)
+            app.execute_command("exit")
+        return output.getvalue()
 
 class IntegrationTests(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.server_path = os.path.join(project_root, "build", "test")
-        cls.client_path = os.path.join(parent_dir, "client.py")
-        
-        print(f"Server path: {cls.server_path}")
-        print(f"Client path: {cls.client_path}")
-        
-        cls.test_setup = IntegrationTestSetup(cls.server_path, cls.client_path)
-        cls.test_setup.start_server()
+        cls.server = StandInServer()
+        cls.server.start()
+        cls.test_setup = IntegrationTestSetup(cls.server)
 
     @classmethod
     def tearDownClass(cls):
-        cls.test_setup.stop_server()
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
 
     def test_connection(self):
-        stdout, stderr = self.test_setup.run_client([""])
-        self.assertNotIn("Error", stdout + stderr)
+        self.test_setup.run_client(["tool line", "colour 255 0 0", "draw 10 10 100 100"])
+        app = self.test_setup.start_client()
+
+        self.assertTrue(wait_for(lambda: len(app.canvas) == 1))
+        self.assertEqual(app.canvas.type(1), "line")
+        self.assertEqual(app.canvas.coords(1), [10, 10, 100, 100])
+        self.assertEqual(app.canvas.itemcget(1, "fill"), "#ff0000")
+        app.execute_command("exit")
 
     def test_draw_command(self):
         commands = [
@@ -101,8 +103,9 @@ class IntegrationTests(unittest.TestCase):
             "colour 255 0 0",
             "draw 10 10 100 100"
         ]
-        stdout, stderr = self.test_setup.run_client(commands)
-        self.assertIn("Command processed successfully", stdout + stderr)
+        stdout = self.test_setup.run_client(commands)
+        self.assertNotIn("rejected", stdout)
+        self.assertEqual([cmd["id"] for cmd in self.server.commands.values()], ["test.1"])
 
     def test_list_command(self):
         commands = [
@@ -114,32 +117,39 @@ class IntegrationTests(unittest.TestCase):
             "draw 20 20 200 200",
             "list all all"
         ]
-        stdout, stderr = self.test_setup.run_client(commands)
-        self.assertIn("line", stdout + stderr)
-        self.assertIn("rectangle", stdout + stderr)
+        stdout = self.test_setup.run_client(commands)
+        self.assertIn("[test.1] => [line] [255 0 0] [10 10 100 100]", stdout)
+        self.assertIn("[test.2] => [rectangle] [0 255 0] [20 20 200 200]", stdout)
+
+    def test_list_command_pages(self):
+        commands = ["tool line", "colour 0 0 0"] + [f"draw {i} {i} 50 50" for i in range(5)] + ["list all all 2"]
+        stdout = self.test_setup.run_client(commands)
+        self.assertIn("[test.2] =>", stdout)
+        self.assertNotIn("[test.3] =>", stdout)
+        self.assertIn("list more", stdout)
 
     def test_modify_command(self):
         commands = [
             "tool line",
             "colour 255 0 0",
             "draw 10 10 100 100",
-            "select 1",
+            "select test.1",
             "modify colour 0 0 255",
             "list all all"
         ]
-        stdout, stderr = self.test_setup.run_client(commands)
-        self.assertIn("0 0 255", stdout + stderr)
+        stdout = self.test_setup.run_client(commands)
+        self.assertIn("[test.1] => [line] [0 0 255]", stdout)
 
     def test_delete_command(self):
         commands = [
             "tool line",
             "colour 255 0 0",
             "draw 10 10 100 100",
-            "delete 1",
+            "delete test.1",
             "list all all"
         ]
-        stdout, stderr = self.test_setup.run_client(commands)
-        self.assertNotIn("line 10 10 100 100 255 0 0", stdout + stderr)
+        stdout = self.test_setup.run_client(commands)
+        self.assertNotIn("[test.1] =>", stdout)
 
     def test_clear_all_command(self):
         commands = [
@@ -153,16 +163,489 @@ class IntegrationTests(unittest.TestCase):
             "clear all",
             "list all all"
         ]
-        stdout, stderr = self.test_setup.run_client(commands)
-        print("Full output:")
-        print(stdout)
-        print("Error output:")
-        print(stderr)
-        
-        self.assertIn("[1] =>", stdout)
-        self.assertIn("[2] =>", stdout)
-        
+        stdout = self.test_setup.run_client(commands)
+
+        self.assertEqual(stdout.count("[test.1] =>"), 1)
+        self.assertEqual(stdout.count("[test.2] =>"), 1)
         self.assertIn("All shapes cleared from the canvas", stdout, "The 'clear all' command was not processed correctly")
 
+    def test_peer_delete_and_modify_use_global_ids(self):
+        viewer = self.test_setup.start_client(client_tag="viewer")
+        with redirect_stdout(io.StringIO()):
+            viewer.execute_command("tool line")
+            viewer.execute_command("colour 0 0 0")
+            viewer.execute_command("draw 1 1 5 5")
+        self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 1 2 3 4", "draw 5 6 7 8",
+                                    "select test.2", "modify colour 255 0 0", "delete test.1"])
+
+        self.assertTrue(wait_for(lambda: list(viewer.commands.shapes) == ["viewer.1", "test.2"]))
+        item = viewer.commands.shape_map.item("test.2")
+        self.assertTrue(wait_for(lambda: viewer.canvas.itemcget(item, "fill") == "#ff0000"))
+        self.assertEqual(viewer.canvas.type(viewer.commands.shape_map.item("viewer.1")), "line")
+        viewer.execute_command("exit")
+
+    def test_concurrent_modifies_converge(self):
+        self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 1 2 3 4"])
+        clients = [self.test_setup.start_client(client_tag=tag) for tag in ("a", "b")]
+        self.assertTrue(wait_for(lambda: all(len(app.canvas) == 1 for app in clients)))
+        self.server.latency = 0.05
+
+        with redirect_stdout(io.StringIO()):
+            for app, colour in zip(clients, ("255 0 0", "0 0 255")):
+                app.execute_command("select test.1")
+                app.execute_command(f"modify colour {colour}")
+            self.assertTrue(wait_for(lambda: not any(app.commands.requests for app in clients)))
+            stored = next(iter(self.server.commands.values()))
+            expected = "#{:02x}{:02x}{:02x}".format(stored["r"], stored["g"], stored["b"])
+            self.assertTrue(wait_for(lambda: all(app.canvas.itemcget(1, "fill") == expected for app in clients)))
+            for app in clients:
+                app.execute_command("exit")
+
+    def test_broadcast_to_other_clients(self):
+        viewer = self.test_setup.start_client()
+        self.test_setup.run_client(["tool circle", "colour 0 0 255", "draw 1 2 3 4"])
+
+        self.assertTrue(wait_for(lambda: viewer.canvas.find("oval")))
+        self.assertEqual(viewer.canvas.coords(1), [1, 2, 3, 4])
+        self.assertEqual(viewer.canvas.itemcget(1, "outline"), "#0000ff")
+        viewer.execute_command("exit")
+
+    def test_heartbeat_measures_rtt(self):
+        self.server.latency = 0.02
+        with redirect_stdout(io.StringIO()):
+            app = self.test_setup.start_client(heartbeat_interval=0.01)
+            self.assertTrue(wait_for(lambda: app.stats["pongs"] >= 3))
+            app.execute_command("exit")
+        self.assertGreaterEqual(app.stats["rtt_ms"], 20)
+        self.assertGreaterEqual(app.stats["srtt_ms"], 20)
+
+    def test_dead_server_is_detected_and_reconnected(self):
+        self.server.answer_pings = False
+        with redirect_stdout(io.StringIO()) as output:
+            app = self.test_setup.start_client(heartbeat_interval=0.05, missed_beats=3)
+            start = time.monotonic()
+            self.assertTrue(wait_for(lambda: app.stats["reconnects"] >= 1, timeout=2.0))
+            self.server.answer_pings = True
+            app.execute_command("exit")
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertGreaterEqual(app.stats["dead_peers"], 1)
+        self.assertIn("No reply to 3 heartbeats", output.getvalue())
+
+    def test_subscribed_client_only_gets_its_region(self):
+        viewer = self.test_setup.start_client(client_tag="viewer")
+        with redirect_stdout(io.StringIO()):
+            viewer.subscribe(0, 0, 100, 100)
+            self.assertTrue(wait_for(lambda: not viewer.commands.requests))
+            self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 10 10 20 20", "draw 500 500 510 510"])
+            self.assertTrue(wait_for(lambda: "test.1" in viewer.commands.shapes))
+            self.assertNotIn("test.2", viewer.commands.shapes)
+
+            viewer.execute_command("view 450 450 550 550")
+            self.assertTrue(wait_for(lambda: "test.2" in viewer.commands.shapes))
+            viewer.execute_command("exit")
+        self.assertEqual(viewer.view, (450, 450, 550, 550))
+
+    def test_subscription_is_sent_again_after_reconnecting(self):
+        path = os.path.join(self.tmp_dir, "session.rec")
+        recorder = SessionRecorder(path)
+        with redirect_stdout(io.StringIO()):
+            viewer = self.test_setup.start_client(recorder, client_tag="viewer", heartbeat_interval=0.05, missed_beats=3)
+            viewer.subscribe(0, 0, 100, 100)
+            self.assertTrue(wait_for(lambda: not viewer.commands.requests))
+            self.server.answer_pings = False
+            self.assertTrue(wait_for(lambda: viewer.stats["reconnects"] >= 1, timeout=2.0))
+            self.server.answer_pings = True
+            self.assertTrue(wait_for(lambda: len(self.server.views) == 1 and not viewer.commands.requests))
+            viewer.execute_command("exit")
+        recorder.close()
+        views = [payload for _, direction, payload in read_recording(path) if direction == SENT and b" view " in payload]
+        self.assertEqual(views, [b"req 1 view 0 0 100 100\n", b"req 2 view 0 0 100 100\n"])
+        self.assertEqual(list(self.server.views.values()), [(0, 0, 100, 100)])
+
+    def test_injected_latency(self):
+        self.server.latency = 0.05
+        start = time.monotonic()
+        self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 1 2 3 4"])
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_injected_drops(self):
+        self.server.drop_filter = lambda frame: frame.startswith("ver ")
+        viewer = self.test_setup.start_client()
+        self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 1 2 3 4"])
+
+        self.assertFalse(wait_for(lambda: len(viewer.canvas) > 0, timeout=0.1))
+        viewer.execute_command("exit")
+
+    def test_record_and_replay(self):
+        path = os.path.join(self.tmp_dir, "session.rec")
+        self.test_setup.run_client(["tool line", "colour 0 0 0", "draw 1 2 3 4", "draw 5 6 7 8"])
+        recorder = SessionRecorder(path)
+        viewer = self.test_setup.start_client(recorder)
+        wait_for(lambda: len(viewer.canvas) == 2)
+        viewer.execute_command("tool circle")
+        viewer.execute_command("colour 255 0 0")
+        with redirect_stdout(io.StringIO()) as output:
+            viewer.execute_command("draw 10 10 20 20")
+            wait_for(lambda: not viewer.commands.requests)
+        viewer.execute_command("exit")
+        recorder.close()
+
+        canvas = MemoryBackend()
+        result = SessionReplayer(path).replay_into_commands(Commands(), canvas)
+        self.assertEqual(canvas.find("line"), [1, 2])
+        self.assertGreaterEqual(result["count"], 2)
+
+        self.server.reset()
+        result = SessionReplayer(path).replay_to_server(self.server.address)
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(len(self.server.commands), 1)
+
+    def test_recorder_flushes_and_overwrites(self):
+        path = os.path.join(self.tmp_dir, "session.rec")
+        with open(path, "wb") as f:
+            f.write(b"left over from an earlier session")
+        recorder = SessionRecorder(path)
+        recorder.record_sent(b"draw line 1 1 2 3 4 0 0 0\n")
+        recorder.record_received(b"")
+
+        records = list(read_recording(path))
+        recorder.close()
+        self.assertEqual([(direction, payload) for _, direction, payload in records], [(SENT, b"draw line 1 1 2 3 4 0 0 0\n")])
+
+class ServerFidelityTests(unittest.TestCase):
+    """
+    Checks the framing behaviour the stand-in shares with the C++ server.
+
+    Set NETSKETCH_SERVER to the host:port of a running C++ server to run the same checks against it.
+    """
+
+    def setUp(self):
+        address = os.environ.get("NETSKETCH_SERVER")
+        self.server = None
+        if address:
+            host, _, port = address.rpartition(":")
+            self.address = (host or "127.0.0.1", int(port))
+        else:
+            self.server = StandInServer()
+            self.address = self.server.start()
+        self.sock = socket.create_connection(self.address)
+        self.sock.settimeout(2.0)
+        self.pending = b""
+        self.send("clear all\n")
+        while self.frames(1) != ["Command processed successfully.\n"]:
+            pass  # Skip the snapshot of the shapes earlier tests left on a real server
+
+    def tearDown(self):
+        self.sock.close()
+        if self.server is not None:
+            self.server.stop()
+
+    def send(self, message):
+        self.sock.sendall(message.encode())
+
+    def frames(self, count):
+        """
+        Reads the next `count` END-delimited frames.
+        """
+        while self.pending.count(b"END\n") < count:
+            self.pending += self.sock.recv(65536)
+        *frames, self.pending = self.pending.split(b"END\n", count)
+        return [frame.decode() for frame in frames]
+
+    def test_pipelined_messages_are_each_handled(self):
+        self.send("".join(f"draw line {i} 1 2 3 4 0 0 0\n" for i in range(20)) + "list all all 50\n")
+        frames = self.frames(22)
+        self.assertEqual(frames[:20], ["Command processed successfully.\n"] * 20)
+        self.assertEqual(frames[20].count("=>"), 20)
+        self.assertEqual(frames[21], "Command processed successfully.\n")
+
+    def test_request_ids_are_acked_and_broadcasts_stamped(self):
+        with socket.create_connection(self.address) as peer:
+            peer.settimeout(2.0)
+            peer.sendall(b"req 1 draw line v.1 1 2 3 4 0 0 0\nreq 2 modify v.1 colour 255 0 0\nreq 3 bogus\n")
+            received = b""
+            while received.count(b"END\n") < 3:
+                received += peer.recv(65536)
+            first, second, invalid = received.decode().split("END\n")[:3]
+            self.assertRegex(first, r"^ack 1 ok \d+\n$")
+            self.assertRegex(second, r"^ack 2 ok \d+\n$")
+            self.assertEqual(invalid, "ack 3 invalid\n")
+            self.assertGreater(int(second.split()[3]), int(first.split()[3]))
+
+            self.assertEqual(self.frames(2), [f"ver {first.split()[3]} draw line v.1 1 2 3 4 0 0 0\n",
+                                              f"ver {second.split()[3]} modify v.1 colour 255 0 0\n"])
+
+    def test_view_limits_broadcasts_to_the_region(self):
+        self.send("draw line v.0 500 500 510 510 0 0 0\n")
+        self.assertEqual(self.frames(1), ["Command processed successfully.\n"])
+        with socket.create_connection(self.address) as peer:
+            peer.settimeout(2.0)
+            peer.sendall(b"req 1 view 400 400 600 600\n")
+            received = b""
+            while b"ack 1 " not in received:
+                received += peer.recv(65536)
+            frames = received.decode().split("END\n")
+            self.assertIn("draw line v.0 500 500 510 510 0 0 0\n", frames[-3])
+            self.assertEqual(frames[-2], "ack 1 ok 0\n")
+
+            peer.sendall(b"req 2 view 0 0 100 100\n")
+            self.send("draw line v.1 10 10 20 20 0 0 0\ndraw line v.2 500 500 600 600 0 0 0\n"
+                      "modify v.1 draw 300 300 310 310\nmodify v.1 colour 1 2 3\ndelete v.2\n")
+            self.frames(5)
+            received = b""
+            while received.count(b"END\n") < 4:
+                received += peer.recv(65536)
+            frames = [frame.split(" ", 2)[2] if frame.startswith("ver ") else frame
+                      for frame in received.decode().split("END\n")[:4]]
+            self.assertEqual(frames, ["ack 2 ok 0\n", "draw line v.1 10 10 20 20 0 0 0\n",
+                                      "draw line v.1 300 300 310 310 0 0 0\n", "delete v.2\n"])
+
+    def test_malformed_request_ids_are_invalid(self):
+        self.send("req 5\nreq \n")
+        self.assertEqual(self.frames(2), ["ack 5 invalid\n", "Invalid command.\n"])
+
+    def test_ping_gets_only_a_pong(self):
+        self.send("ping 42\nclear all\n")
+        self.assertEqual(self.frames(2), ["pong 42\n", "Command processed successfully.\n"])
+
+    def test_invalid_list_page_size(self):
+        for message in ("list all all 0\n", "list all all -1\n", "list all all abc\n", "list all\n"):
+            self.send(message)
+            self.assertEqual(self.frames(1), ["Invalid command.\n"], message)
+
+class RelayIntegrationTests(unittest.TestCase):
+    """
+    Runs the relay against a stand-in that handles one command per recv(), as the C++ server
+    did before it split its input on newlines.
+    """
+
+    def setUp(self):
+        self.server = StandInServer(one_command_per_recv=True)
+        self.server.start()
+        # The relay runs on its own event loop, so it outlives a server that is stopped
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.relay = Relay(*self.server.address, port=0)
+        self.run_on_relay(self.relay.start())
+
+    def tearDown(self):
+        self.run_on_relay(self.relay.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.server.stop()
+
+    def run_on_relay(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def test_pipelined_messages_are_lost_without_the_relay(self):
+        with socket.create_connection(self.server.address) as sock:
+            sock.sendall("".join(f"draw line {i} 1 2 3 4 0 0 0\n" for i in range(20)).encode())
+            self.assertTrue(wait_for(lambda: len(self.server.commands) > 0))
+            self.assertLess(len(self.server.commands), 20)
+
+    def test_relay_delivers_pipelined_messages(self):
+        with socket.create_connection(self.relay.address) as sock:
+            sock.sendall("".join(f"draw line {i} 1 2 3 4 0 0 0\n" for i in range(20)).encode())
+            self.assertTrue(wait_for(lambda: len(self.server.commands) == 20))
+
+    def test_clear_mine_without_shapes_is_acked(self):
+        with socket.create_connection(self.relay.address) as sock:
+            sock.sendall(b"clear mine\n")
+            sock.settimeout(2.0)
+            self.assertEqual(sock.recv(1024), b"Command processed successfully.\nEND\n")
+
+    def test_subscribed_viewers_only_get_updates_in_their_region(self):
+        with socket.create_connection(self.relay.address) as viewer, socket.create_connection(self.relay.address) as drawer:
+            viewer.settimeout(2.0)
+            drawer.settimeout(2.0)
+            viewer.sendall(b"req 1 view 0 0 100 100\n")
+            self.assertEqual(viewer.recv(1024), b"ack 1 ok 0\nEND\n")
+            # One at a time, as this stand-in only handles one command per recv()
+            drawer.sendall(b"req 1 draw line f.1 500 500 600 600 0 0 0\n")
+            self.assertEqual(drawer.recv(1024), b"ack 1 ok 1\nEND\n")
+            drawer.sendall(b"req 2 draw line n.1 10 10 20 20 0 0 0\n")
+            self.assertEqual(drawer.recv(1024), b"ack 2 ok 2\nEND\n")
+            self.assertEqual(viewer.recv(1024), b"ver 2 draw line n.1 10 10 20 20 0 0 0\nEND\n")
+
+    def test_requests_are_pipelined(self):
+        server = StandInServer(latency=0.05)
+        server.start()
+        relay = Relay(*server.address, port=0)
+        self.run_on_relay(relay.start())
+        try:
+            with socket.create_connection(relay.address) as sock:
+                start = time.monotonic()
+                sock.sendall("".join(f"req {i} draw line p.{i} 1 2 3 4 0 0 0\n" for i in range(20)).encode())
+                received = b""
+                sock.settimeout(2.0)
+                while received.count(b"END\n") < 20:
+                    received += sock.recv(65536)
+                elapsed = time.monotonic() - start
+            acks = sorted(int(frame.split()[1]) for frame in received.decode().split("END\n")[:20])
+            self.assertEqual(acks, list(range(20)))
+            self.assertLess(elapsed, 0.5)  # One at a time, the 20 round trips would take at least 1 s
+        finally:
+            self.run_on_relay(relay.stop())
+            server.stop()
+
+    def test_relay_heartbeats_the_server(self):
+        relay = Relay(*self.server.address, port=0, heartbeat_interval=0.02)
+        self.run_on_relay(relay.start())
+        try:
+            with socket.create_connection(relay.address) as sock:
+                for i in range(20):
+                    sock.sendall(f"draw line {i} 1 2 3 4 0 0 0\n".encode())
+                    time.sleep(0.005)
+                self.assertTrue(wait_for(lambda: len(self.server.commands) == 20))
+            self.assertTrue(wait_for(lambda: relay.stats["upstream_pings"] > 3))
+            self.assertEqual(relay.stats["upstream_reconnects"], 0)
+
+            self.server.answer_pings = False  # The server has gone away without closing the connection
+            self.assertTrue(wait_for(lambda: relay.stats["upstream_reconnects"] >= 1, timeout=3.0))
+        finally:
+            self.run_on_relay(relay.stop())
+
+    def test_relay_reconnects_after_losing_the_server(self):
+        with socket.create_connection(self.relay.address) as sock:
+            sock.sendall(b"draw line a.1 1 2 3 4 0 0 0\n")
+            self.assertTrue(wait_for(lambda: self.relay.board))
+
+            self.server.stop()
+            sock.settimeout(2.0)
+            self.assertEqual(sock.recv(1024), b"Command processed successfully.\nEND\n")
+            self.assertEqual(sock.recv(1024), b"")
+        self.assertTrue(wait_for(lambda: self.relay.upstream_writer is None))
+        with socket.create_connection(self.relay.address) as sock:
+            sock.settimeout(2.0)
+            self.assertEqual(sock.recv(1024), b"")  # Refused while the server is down
+
+        self.server = StandInServer(*self.server.address, one_command_per_recv=True)
+        self.server.start()
+        with socket.create_connection(self.server.address) as sock:
+            sock.sendall(b"draw line b.1 5 6 7 8 0 0 0\n")
+            self.assertTrue(wait_for(lambda: len(self.server.commands) == 1))
+        self.assertTrue(wait_for(lambda: self.relay.upstream_writer is not None, timeout=5.0))
+        self.assertTrue(wait_for(lambda: list(self.relay.board) == ["b.1"]))
+
+        with socket.create_connection(self.relay.address) as sock:
+            sock.settimeout(2.0)
+            self.assertIn(b"draw line b.1 5 6 7 8 0 0 0", sock.recv(1024))
+            sock.sendall(b"draw line c.1 1 1 2 2 0 0 0\n")
+            self.assertTrue(wait_for(lambda: len(self.server.commands) == 2))
+
+class MultiServerIntegrationTests(unittest.TestCase):
+    """
+    Runs clients against several stand-in servers, and an endpoint nothing is listening on.
+    """
+
+    def setUp(self):
+        self.servers = [StandInServer(), StandInServer()]
+        self.addresses = [server.start() for server in self.servers]
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.dead = sock.getsockname()[:2]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def start_client(self, endpoints, **options):
+        root = MagicMock()
+        root.after.side_effect = lambda delay, func, *args: func(*args) if delay == 0 else None
+        return CanvasApp(root, endpoints, MemoryBackend(), **options)
+
+    def board_on(self, address):
+        """
+        Returns the name of a board that the hash ring puts on the given server.
+        """
+        ring = HashRing(self.addresses)
+        return next(f"board-{i}" for i in range(1000) if ring.owner(f"board-{i}") == address)
+
+    def test_connect_skips_dead_endpoint(self):
+        start = time.monotonic()
+        sock, endpoint = connect_first([self.dead, self.addresses[1]], timeout=2.0)
+        sock.close()
+        self.assertEqual(endpoint, self.addresses[1])
+        self.assertLess(time.monotonic() - start, 0.2)  # The refusal starts the next attempt straight away
+
+        with redirect_stdout(io.StringIO()):
+            app = self.start_client([self.dead, self.addresses[0]])
+            self.assertTrue(app.connected.wait(2.0))  # The client connects in the background
+            app.execute_command("exit")
+        self.assertEqual(app.server_address, self.addresses[0])
+        self.assertEqual(app.health.get(self.dead)["failures"], 1)
+        self.assertFalse(app.health.is_healthy(self.dead))
+        self.assertEqual(app.health.ranked([self.dead, self.addresses[0]]), [self.addresses[0], self.dead])
+
+    def test_connect_in_order_keeps_the_ring_order(self):
+        health = EndpointHealth()
+        health.record_failure(self.addresses[0], "timed out")  # An earlier failure does not demote the owner
+        sock, endpoint = connect_in_order([self.addresses[0], self.addresses[1]], timeout=2.0, health=health)
+        sock.close()
+        self.assertEqual(endpoint, self.addresses[0])
+
+        sock, endpoint = connect_in_order([self.dead, self.addresses[1]], timeout=2.0, health=health)
+        sock.close()
+        self.assertEqual(endpoint, self.addresses[1])
+        self.assertEqual(health.get(self.dead)["failures"], 1)
+
+    def test_board_waits_for_a_slow_owner(self):
+        def slow_connect(endpoint, timeout, health):
+            time.sleep(0.4)  # Longer than the stagger of a parallel connect
+            return connect_endpoint(endpoint, timeout, health)
+
+        board = self.board_on(self.addresses[0])
+        with redirect_stdout(io.StringIO()), patch("endpoints.connect_endpoint", side_effect=slow_connect):
+            app = self.start_client(self.addresses, board=board)
+            self.assertTrue(app.connected.wait(2.0))
+            app.execute_command("exit")
+        self.assertEqual(app.server_address, self.addresses[0])
+
+    def test_client_starts_before_the_server(self):
+        with redirect_stdout(io.StringIO()):
+            start = time.monotonic()
+            app = self.start_client([self.dead], client_tag="early")
+            app.execute_command("tool line")
+            app.execute_command("colour 0 0 0")
+            app.execute_command("draw 1 2 3 4")
+            self.assertLess(time.monotonic() - start, 0.1)
+            self.assertIsNone(app.server_address)
+
+            server = StandInServer(*self.dead)
+            server.start()
+            self.servers.append(server)
+            self.assertTrue(wait_for(lambda: not app.commands.requests, timeout=3.0))
+            app.execute_command("exit")
+        self.assertEqual(list(server.keys), ["early.1"])
+
+    def test_boards_are_sharded_across_servers(self):
+        with redirect_stdout(io.StringIO()):
+            for index, address in enumerate(self.addresses):
+                app = self.start_client(self.addresses, board=self.board_on(address), client_tag=f"c{index}")
+                app.execute_command("tool line")
+                app.execute_command("colour 0 0 0")
+                app.execute_command("draw 1 2 3 4")
+                self.assertTrue(wait_for(lambda: not app.commands.requests))
+                app.execute_command("exit")
+                self.assertEqual(app.server_address, address)
+        self.assertEqual([list(server.keys) for server in self.servers], [["c0.1"], ["c1.1"]])
+
+    def test_board_fails_over_along_the_ring(self):
+        board = self.board_on(self.addresses[0])
+        with redirect_stdout(io.StringIO()):
+            app = self.start_client(self.addresses, board=board, heartbeat_interval=0.05)
+            app.execute_command("tool line")
+            app.execute_command("colour 0 0 0")
+            app.execute_command("draw 1 2 3 4")
+            self.assertTrue(wait_for(lambda: not app.commands.requests))
+
+            self.servers.pop(0).stop()
+            self.assertTrue(wait_for(lambda: app.server_address == self.addresses[1], timeout=3.0))
+            self.assertTrue(wait_for(lambda: not app.commands.shapes))  # The other server has its own board
+            app.execute_command("exit")
+        self.assertGreaterEqual(app.stats["reconnects"], 1)
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,243 @@
+import argparse
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for rendering boards offscreen, not by the client
+    np = None
+
+from backends import MemoryBackend, NAMED_COLOURS, SHAPE_TYPES
+from commands import parse_command
+
+CHAR_WIDTH = 7  # Approximate size of a character in Tk's default font, for text boxes
+CHAR_HEIGHT = 13
+BACKGROUND = (255, 255, 255)
+
+LINE, RECTANGLE, OVAL, TEXT = range(1, len(SHAPE_TYPES) + 1)  # MemoryBackend type codes
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Rendering boards offscreen needs NumPy (pip install numpy)")
+
+
+def _frombuffer(values):
+    """
+    Returns a NumPy view of a `bytearray` or `array.array` without copying it.
+    """
+    if isinstance(values, bytearray):
+        return np.frombuffer(values, np.uint8)
+    return np.frombuffer(values, np.dtype(values.typecode))
+
+
+def _segment_pixels(segments, order):
+    """
+    Samples every pixel along a batch of line segments.
+
+    Each segment is sampled once per pixel of its longer axis, so all segments are drawn with
+    one set of array operations however many there are.
+
+    Parameters:
+        segments (ndarray): An (n, 4) array of x1, y1, x2, y2.
+        order (ndarray): The board position of the shape each segment belongs to.
+
+    Returns:
+        tuple: The x, y and board position of every sampled pixel.
+    """
+    x1, y1, x2, y2 = segments.T
+    steps = np.ceil(np.maximum(np.abs(x2 - x1), np.abs(y2 - y1))).astype(np.int32)
+    counts = steps + 1
+    owner = np.repeat(np.arange(len(segments), dtype=np.int32), counts)
+    starts = np.cumsum(counts, dtype=np.int32) - counts
+    t = (np.arange(len(owner), dtype=np.int32) - starts[owner]).astype(np.float32)
+    t /= np.maximum(steps, 1).astype(np.float32)[owner]
+    xs = x1[owner] + t * (x2 - x1)[owner]
+    ys = y1[owner] + t * (y2 - y1)[owner]
+    return np.rint(xs).astype(np.int32), np.rint(ys).astype(np.int32), order[owner]
+
+
+def _oval_pixels(boxes, order):
+    """
+    Samples every pixel along the outlines of a batch of ovals.
+
+    Each oval gets 4 * (rx + ry) samples, more than its circumference, so neighbouring
+    samples are never more than a pixel apart.
+
+    Parameters:
+        boxes (ndarray): An (n, 4) array of the ovals' bounding boxes.
+        order (ndarray): The board position of each oval.
+
+    Returns:
+        tuple: The x, y and board position of every sampled pixel.
+    """
+    x1, y1, x2, y2 = boxes.T
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    rx, ry = np.abs(x2 - x1) / 2, np.abs(y2 - y1) / 2
+    counts = np.ceil(4 * (rx + ry)).astype(np.int32) + 4
+    owner = np.repeat(np.arange(len(boxes), dtype=np.int32), counts)
+    starts = np.cumsum(counts, dtype=np.int32) - counts
+    angles = (np.arange(len(owner), dtype=np.int32) - starts[owner]).astype(np.float32)
+    angles *= (np.float32(2 * np.pi) / counts.astype(np.float32))[owner]
+    xs = cx[owner] + rx[owner] * np.cos(angles)
+    ys = cy[owner] + ry[owner] * np.sin(angles)
+    return np.rint(xs).astype(np.int32), np.rint(ys).astype(np.int32), order[owner]
+
+
+def _box_segments(boxes):
+    """
+    Returns the four sides of each box as line segments, in an (4n, 4) array.
+    """
+    x1, y1, x2, y2 = boxes.T
+    sides = np.stack([
+        np.stack([x1, y1, x2, y1], axis=1),
+        np.stack([x2, y1, x2, y2], axis=1),
+        np.stack([x2, y2, x1, y2], axis=1),
+        np.stack([x1, y2, x1, y1], axis=1),
+    ], axis=1)
+    return sides.reshape(-1, 4)
+
+
+def _colours(backend):
+    """
+    Returns the colour of every item in a MemoryBackend as an (n, 3) array of RGB bytes.
+    """
+    colours = _frombuffer(backend.colours).astype(np.int64)
+    for item, name in backend.named_colours.items():
+        colours[item - backend.first_item] = NAMED_COLOURS.get(name, 0)
+    colours[colours < 0] = 0
+    return np.stack([colours >> 16, colours >> 8, colours], axis=1).astype(np.uint8)
+
+
+def rasterise(backend, width=800, height=600, scale=1.0, background=BACKGROUND):
+    """
+    Renders the items of a MemoryBackend into an RGB image, without a display.
+
+    Lines and the outlines of rectangles and ovals are drawn one pixel wide. Text is drawn
+    as the outline of the box it would take up, centred on its anchor like Tk's default.
+    The items are rendered a shape type at a time, but where shapes overlap the one drawn
+    last still wins, as on the Tk canvas. Hidden and deleted items are left out.
+
+    Parameters:
+        backend (MemoryBackend): The items to render.
+        width (int, optional): The width of the board. Defaults to 800.
+        height (int, optional): The height of the board. Defaults to 600.
+        scale (float, optional): The size of the image relative to the board, e.g. 0.25 for thumbnails. Defaults to 1.0.
+        background (tuple, optional): The (r, g, b) colour of the board. Defaults to white.
+
+    Returns:
+        ndarray: A (height * scale, width * scale, 3) array of RGB bytes.
+    """
+    _require_numpy()
+    image_width, image_height = max(1, round(width * scale)), max(1, round(height * scale))
+    image = np.empty((image_height, image_width, 3), np.uint8)
+    image[:, :] = background
+    if not len(backend.types):
+        return image
+
+    types = _frombuffer(backend.types)
+    visible = (types != 0) & (_frombuffer(backend.hidden) == 0)
+    coords = _frombuffer(backend.coordinates).reshape(-1, 4).astype(np.float32)
+
+    text_items = np.flatnonzero(visible & (types == TEXT))
+    lengths = np.array([len(str(backend.texts.get(backend.first_item + index, ""))) for index in text_items], np.float32)
+    anchors = coords[text_items, :2]
+    half_sizes = np.stack([lengths * (CHAR_WIDTH / 2), np.full(len(lengths), CHAR_HEIGHT / 2, np.float32)], axis=1)
+    text_boxes = np.concatenate([anchors - half_sizes, anchors + half_sizes], axis=1)
+
+    lines = np.flatnonzero(visible & (types == LINE))
+    boxes = np.flatnonzero(visible & (types == RECTANGLE))
+    ovals = np.flatnonzero(visible & (types == OVAL))
+    batches = [
+        _segment_pixels(coords[lines] * np.float32(scale), lines),
+        _segment_pixels(_box_segments(coords[boxes] * np.float32(scale)), np.repeat(boxes, 4)),
+        _segment_pixels(_box_segments(text_boxes * np.float32(scale)), np.repeat(text_items, 4)),
+        _oval_pixels(coords[ovals] * np.float32(scale), ovals),
+    ]
+    # Each pixel keeps the shape drawn last over it. Taking the maximum board position per
+    # pixel settles overlaps between batches without sorting the pixels
+    top = np.full(image_width * image_height, -1, np.int64)
+    for xs, ys, order in batches:
+        inside = (xs >= 0) & (xs < image_width) & (ys >= 0) & (ys < image_height)
+        np.maximum.at(top, ys[inside].astype(np.int64) * image_width + xs[inside], order[inside])
+    covered = np.flatnonzero(top >= 0)
+    image.reshape(-1, 3)[covered] = _colours(backend)[top[covered]]
+    return image
+
+
+def backend_from_commands(commands):
+    """
+    Draws the shapes kept in a Commands object onto a fresh MemoryBackend, in board order.
+
+    The Commands object is left untouched, so this can run on a copy of a live client's state.
+
+    Parameters:
+        commands (Commands): The board to draw.
+
+    Returns:
+        MemoryBackend: The drawn board.
+    """
+    backend = MemoryBackend()
+    for command in commands.shapes.values():
+        operation = parse_command(command)
+        if operation is not None and operation[0] == "draw":
+            _, _, method, coords, options, _ = operation
+            getattr(backend, method)(*coords, **options)
+    return backend
+
+
+def encode_ppm(image):
+    """
+    Encodes an RGB image as a binary PPM file.
+    """
+    height, width, _ = image.shape
+    return b"P6\n%d %d\n255\n" % (width, height) + np.ascontiguousarray(image, np.uint8).tobytes()
+
+
+def encode_png(image):
+    """
+    Encodes an RGB image as a PNG file, using only the standard library and NumPy.
+    """
+    height, width, _ = image.shape
+    rows = np.zeros((height, width * 3 + 1), np.uint8)  # Each row starts with filter type 0 (none)
+    rows[:, 1:] = image.reshape(height, -1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def write_image(image, path):
+    """
+    Writes an RGB image to a file, as PPM if the path ends in ".ppm" and as PNG otherwise.
+
+    Parameters:
+        image (ndarray): The image returned by `rasterise`.
+        path (str): The file to write.
+
+    Returns:
+        None
+    """
+    data = encode_ppm(image) if path.lower().endswith(".ppm") else encode_png(image)
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the board at the end of a recorded NetSketch session to an image")
+    parser.add_argument("recording", help="recording file written with client.py --record")
+    parser.add_argument("output", help="image to write, PNG or PPM (.ppm)")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--scale", type=float, default=1.0, help="size of the image relative to the board, e.g. 0.25 for a thumbnail")
+    args = parser.parse_args()
+
+    from commands import Commands
+    from recording import SessionReplayer
+    backend = MemoryBackend()
+    SessionReplayer(args.recording).replay_into_commands(Commands(), backend)
+    write_image(rasterise(backend, args.width, args.height, args.scale), args.output)
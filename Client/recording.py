@@ -0,0 +1,243 @@
+import argparse
+import contextlib
+import io
+import socket
+import struct
+import threading
+import time
+
+from commands import LEGACY_ACKS
+
+MAGIC = b"NSREC1\n"
+RECORD_HEADER = struct.Struct("<QBI")  # microseconds since start, direction, payload length
+RECEIVED = 0
+SENT = 1
+
+
+def expected_acks(payload):
+    """
+    Works out the acks the server sends for the messages of a sent payload.
+
+    Parameters:
+        payload (bytes): One or more newline-terminated messages.
+
+    Returns:
+        tuple: The set of request ids to be acked with "ack <id>", and the number of messages
+            sent without an id, which each get a plain ack.
+    """
+    request_ids = set()
+    plain_acks = 0
+    for line in payload.decode().splitlines():
+        request_id = line[4:].split(" ", 1)[0] if line.startswith("req ") else ""
+        if request_id:
+            request_ids.add(request_id)
+        elif line.strip():
+            plain_acks += 1
+    return request_ids, plain_acks
+
+
+class SessionRecorder:
+    """
+    Writes timestamped wire traffic to a recording file.
+
+    The file starts with a magic line and is followed by one record per recv() or send:
+    a 13-byte header holding the microseconds since the recording started, the direction
+    and the payload length, then the raw payload. An existing file is overwritten, since
+    timestamps restart with every recording. Each record is flushed as it is written, so
+    a recording cut short by a crash is still readable up to its last complete record.
+
+    The receive thread and the Tk thread both record, so writes are serialised with a lock.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.start = time.monotonic_ns()
+        self.lock = threading.Lock()
+
+    def record(self, direction, payload):
+        """
+        Writes one record. Empty payloads carry no traffic and are skipped.
+
+        Parameters:
+            direction (int): RECEIVED or SENT.
+            payload (bytes): The data as it went over the wire.
+
+        Returns:
+            None
+        """
+        if not payload:
+            return
+        timestamp = (time.monotonic_ns() - self.start) // 1000
+        with self.lock:
+            self.file.write(RECORD_HEADER.pack(timestamp, direction, len(payload)))
+            self.file.write(payload)
+            self.file.flush()
+
+    def record_received(self, payload):
+        self.record(RECEIVED, payload)
+
+    def record_sent(self, payload):
+        self.record(SENT, payload)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_recording(path):
+    """
+    Reads the records of a recording file in order.
+
+    Parameters:
+        path (str): The recording to read.
+
+    Yields:
+        tuple: The (timestamp in seconds, direction, payload) of each complete record.
+
+    Raises:
+        ValueError: If the file is not a recording.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a session recording: {path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, direction, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield timestamp / 1e6, direction, payload
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class SessionReplayer:
+    """
+    Feeds a recording back into the client's Commands or into a live server.
+
+    Replay runs either at the original pacing or as fast as possible. Both replays return
+    the same summary, so runs of the same recording can be compared with each other.
+    """
+
+    def __init__(self, path, realtime=False):
+        self.records = list(read_recording(path))
+        self.realtime = realtime
+
+    def wait_until(self, start, timestamp):
+        """
+        Sleeps until the recorded time of a record when replaying at the original pacing.
+        """
+        if self.realtime:
+            delay = start + timestamp - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def summary(self, count, elapsed, latencies):
+        return {
+            "count": count,
+            "seconds": elapsed,
+            "per_second": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+
+    def replay_into_commands(self, commands, canvas):
+        """
+        Applies the received traffic of a recording to Commands, as the client would.
+
+        Parameters:
+            commands (Commands): The commands object to apply the frames to.
+            canvas (CanvasBackend): The canvas to draw on.
+
+        Returns:
+            dict: The number of frames applied, the time taken, the frame rate and the p50/p99 time per frame.
+        """
+        latencies = []
+        pending = ""
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            start = time.perf_counter()
+            for timestamp, direction, payload in self.records:
+                if direction != RECEIVED:
+                    continue
+                self.wait_until(start, timestamp)
+                pending += payload.decode()
+                *frames, pending = pending.split("END\n")
+                for frame in frames:
+                    if not frame:
+                        continue
+                    frame_start = time.perf_counter()
+                    commands.apply_draw_command(canvas, frame)
+                    latencies.append(time.perf_counter() - frame_start)
+                output.seek(0)
+                output.truncate()
+            elapsed = time.perf_counter() - start
+        return self.summary(len(latencies), elapsed, latencies)
+
+    def replay_to_server(self, address):
+        """
+        Sends the sent traffic of a recording to a live server, one message at a time.
+
+        Each message waits for its ack before the next one is sent, so the latencies are
+        full round trips through the server. Messages keep the request ids they were recorded
+        with, and only the ack with the same id counts, so a late ack for an earlier message
+        is not taken for the current one. Messages recorded without an id wait for a plain ack.
+
+        Parameters:
+            address (tuple): The (host, port) of the server.
+
+        Returns:
+            dict: The number of messages sent, the time taken, the message rate and the p50/p99 round trip.
+        """
+        latencies = []
+        pending = ""
+        with socket.create_connection(address) as sock:
+            start = time.perf_counter()
+            for timestamp, direction, payload in self.records:
+                if direction != SENT:
+                    continue
+                self.wait_until(start, timestamp)
+                sent_at = time.perf_counter()
+                sock.sendall(payload)
+                request_ids, plain_acks = expected_acks(payload)
+                while request_ids or plain_acks > 0:
+                    data = sock.recv(65536)
+                    if not data:
+                        raise ConnectionError("Server closed the connection during replay")
+                    pending += data.decode()
+                    *frames, pending = pending.split("END\n")
+                    for frame in frames:
+                        parts = frame.split()
+                        if parts[:1] == ["ack"] and len(parts) > 1:
+                            request_ids.discard(parts[1])
+                        elif frame.strip() in LEGACY_ACKS:
+                            plain_acks -= 1
+                latencies.append(time.perf_counter() - sent_at)
+            elapsed = time.perf_counter() - start
+        return self.summary(len(latencies), elapsed, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded NetSketch session")
+    parser.add_argument("recording", help="recording file written with client.py --record")
+    parser.add_argument("--server", help="replay the sent traffic to this host:port instead of into Commands")
+    parser.add_argument("--realtime", action="store_true", help="keep the original pacing instead of replaying as fast as possible")
+    args = parser.parse_args()
+
+    replayer = SessionReplayer(args.recording, args.realtime)
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        result = replayer.replay_to_server((host or "127.0.0.1", int(port)))
+    else:
+        from backends import MemoryBackend
+        from commands import Commands
+        result = replayer.replay_into_commands(Commands(), MemoryBackend())
+    print(f"{result['count']} messages in {result['seconds']:.3f}s ({result['per_second']:.0f}/s), "
+          f"p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms")
@@ -0,0 +1,685 @@
+import argparse
+import asyncio
+from collections import deque
+
+ACK_FRAMES = ("Command processed successfully.", "Invalid command.")
+SUCCESS_ACK = "Command processed successfully.\n"
+MAX_WRITE_BUFFER = 1 << 20  # Drop viewers that fall this many bytes behind
+HEARTBEAT_INTERVAL = 1.0  # Seconds between the relay's pings to the server
+MISSED_BEATS = 3  # Pings in a row without any data back after which the server is treated as dead
+RECONNECT_BACKOFF = 0.5  # Seconds before reconnecting to a lost upstream, doubling with each failure in a row
+MAX_RECONNECT_BACKOFF = 10.0
+STAMPED_COMMANDS = ("draw", "modify", "delete")  # Broadcasts the server stamps with the shape's version
+
+
+def ack_version(frame):
+    """
+    Returns the version an "ack <id> ok <version>" frame stamped on a shape, or 0 for any other ack.
+    """
+    parts = frame.split()
+    if len(parts) == 4 and parts[0] == "ack" and parts[2] == "ok":
+        return int(parts[3])
+    return 0
+
+
+def strip_version(frame):
+    """
+    Removes the "ver <version> " prefix from a stamped frame.
+
+    Returns:
+        str: The frame as the client sent it.
+    """
+    if frame.startswith("ver "):
+        return frame.split(" ", 2)[2]
+    return frame
+
+
+def intersects(a, b):
+    """
+    Checks whether two (x1, y1, x2, y2) rectangles overlap.
+    """
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def shape_state(frames):
+    """
+    Folds the cached frames of a shape, a draw and the modifies after it, into one draw.
+
+    Parameters:
+        frames (list): The shape's frames in board order, each of which may be stamped with a version.
+
+    Returns:
+        tuple: The draw frame that recreates the shape, stamped with the latest version, and the
+            (x1, y1, x2, y2) area the shape covers, where text is anchored at a point. Both are
+            None if the draw cannot be parsed.
+    """
+    version = 0
+    try:
+        parts = frames[0].split()
+        if parts[0] == "ver":
+            version = int(parts[1])
+        draw = strip_version(frames[0])
+        parts = draw.split()
+        shape_type, shape_id = parts[1], parts[2]
+        if shape_type == "text":
+            rest = draw.split(None, 5)[5]
+            last_quote = rest.rfind("'")
+            text = rest[1:last_quote]
+            coords = [int(parts[3]), int(parts[4]), 0, 0]
+            colour = rest[last_quote + 1:].split()
+        else:
+            text = ""
+            coords = [int(c) for c in parts[3:7]]
+            colour = parts[7:10]
+        for frame in frames[1:]:
+            parts = frame.split()
+            if parts[0] == "ver":
+                version = int(parts[1])
+                parts = parts[2:]
+            i = 2
+            while i < len(parts):
+                if parts[i] == "colour":
+                    colour = parts[i + 1:i + 4]
+                    i += 4
+                elif parts[i] == "draw":
+                    coords = [int(c) for c in parts[i + 1:i + 5]]
+                    i += 5
+                else:
+                    i += 1
+    except (ValueError, IndexError):
+        return None, None
+    stamp = f"ver {version} " if version else ""
+    x1, y1, x2, y2 = coords
+    if shape_type == "text":
+        return stamp + f"draw text {shape_id} {x1} {y1} '{text}' {' '.join(colour)}\n", (x1, y1, x1, y1)
+    draw = stamp + f"draw {shape_type} {shape_id} {x1} {y1} {x2} {y2} {' '.join(colour)}\n"
+    return draw, (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+def is_list_reply(frame):
+    """
+    Checks whether an upstream frame is the reply to a list request.
+
+    A reply is either empty (no matches) or made of "list <id> => ..." entries and an
+    optional "list next <cursor>" line. A list request broadcast by another client
+    ("list all all") has neither, so it is not mistaken for a reply.
+
+    Parameters:
+        frame (str): The frame received from the server, without its END delimiter.
+
+    Returns:
+        bool: True if the frame is a list reply, False otherwise.
+    """
+    lines = frame.splitlines()
+    return all(line.startswith("list ") and ("=>" in line or line.startswith("list next ")) for line in lines)
+
+
+class Relay:
+    """
+    Fans one upstream server connection out to many downstream clients.
+
+    The relay speaks the same END-framed text protocol as the server, so a CanvasApp can
+    connect to it unchanged. Every message from a viewer is forwarded upstream and fanned
+    out to the other viewers; every broadcast from the server is fanned out to all viewers.
+    The relay keeps its own copy of the board so that late joiners are served a snapshot
+    locally instead of by the server.
+
+    Replies to a viewer's own requests (acks and list pages) are routed back to that viewer
+    only. Messages sent with a "req <id> " prefix are pipelined: each goes upstream straight
+    away under a request id of the relay's own, since ids chosen by different viewers can
+    clash, and its ack is routed back to the viewer by that id and given the viewer's id
+    again. Messages without a prefix can only be matched to their acks by order, and servers
+    that handle one command per recv() merge and lose messages written back to back, so
+    those go upstream one at a time: each waits for every earlier ack, and holds back the
+    messages after it until its own ack arrives. The server answers a connection's messages
+    in order, so a list page always belongs to the oldest message in flight.
+
+    If the upstream connection is lost, the relay closes its viewers and reconnects with a
+    backoff, rebuilding the cached board from the snapshot the server sends on connect.
+    Viewers are refused while the upstream is down, so none of them is served a stale board.
+    The relay answers its viewers' heartbeats itself and pings the server on its own, which
+    keeps an idle relay from being dropped for inactivity and finds a dead server.
+
+    The relay's own connection has to keep every update, so viewers' region subscriptions
+    are kept by the relay, which filters its fan-out the way the server filters its
+    broadcasts: a subscribed viewer only gets the draws and modifies that touch its region,
+    with a modify sent as a draw of the whole shape.
+
+    A viewer's message is applied to the cached board and fanned out when its ack arrives,
+    so the board sees the commands in the order the server stored them. Cached shapes are
+    keyed by their global shape ids, which are unique across clients.
+
+    The fanned out copy of a viewer's message drops the prefix and is stamped with the
+    version from the ack, as the server stamps its own broadcasts.
+    """
+
+    def __init__(self, upstream_host, upstream_port, host="127.0.0.1", port=6002, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.upstream_address = (upstream_host, upstream_port)
+        self.address = (host, port)
+        self.viewers = set()
+        self.views = {}  # writer -> (x1, y1, x2, y2) region the viewer subscribed to
+        self.board = {}  # shape id -> frames that recreate the shape, in board order
+        # Messages are [writer, message, expects_list, broadcast, request_id, pipelined] lists,
+        # where request_id is the viewer's and pipelined says whether the message goes upstream with an id
+        self.upstream_queue = deque()  # Messages waiting to be sent upstream
+        self.in_flight = deque()  # Messages sent upstream and not yet acked, oldest first
+        self.requests = {}  # relay request id -> message in flight
+        self.next_request_id = 1
+        self.heartbeat_interval = heartbeat_interval
+        self.unanswered_beats = 0  # Pings sent since data last arrived from the server
+        self.pong_pending = False  # Whether the last ping is still waiting for its pong
+        self.upstream_reader = None
+        self.upstream_writer = None
+        self.upstream_task = None
+        self.heartbeat_task = None
+        self.server = None
+        self.stats = {"upstream_frames": 0, "downstream_messages": 0, "frames_sent": 0, "viewers_dropped": 0,
+                      "viewers_refused": 0, "upstream_reconnects": 0, "upstream_pings": 0}
+
+    async def start(self):
+        """
+        Connects to the upstream server and starts accepting viewers.
+
+        Returns:
+            asyncio.Server: The listening server, whose sockets give the bound address.
+        """
+        await self.connect_upstream()
+        self.upstream_task = asyncio.ensure_future(self.maintain_upstream())
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+        self.server = await asyncio.start_server(self.handle_viewer, *self.address)
+        self.address = self.server.sockets[0].getsockname()[:2]
+        print(f"Relay listening on {self.address[0]}:{self.address[1]}, upstream {self.upstream_address[0]}:{self.upstream_address[1]}")
+        return self.server
+
+    async def stop(self):
+        """
+        Stops accepting viewers and closes every connection.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.viewers):
+            writer.close()
+        self.viewers.clear()
+        for task in (self.upstream_task, self.heartbeat_task):
+            if task is not None:
+                task.cancel()
+        if self.upstream_writer is not None:
+            self.upstream_writer.close()
+
+    async def connect_upstream(self):
+        """
+        Opens the upstream connection.
+
+        Raises:
+            OSError: If the server cannot be connected to.
+        """
+        self.upstream_reader, self.upstream_writer = await asyncio.open_connection(*self.upstream_address)
+
+    async def maintain_upstream(self):
+        """
+        Reads from the upstream connection, and reconnects whenever it is lost.
+
+        The first attempt is made RECONNECT_BACKOFF seconds after the connection is lost, and
+        the wait doubles with each failed attempt up to MAX_RECONNECT_BACKOFF. It only goes
+        back to the start once a connection has lasted longer than the longest wait, so a
+        server that accepts and then closes straight away is not reconnected to in a loop.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        backoff = RECONNECT_BACKOFF
+        while True:
+            connected_at = loop.time()
+            await self.read_upstream(self.upstream_reader)
+            self.upstream_lost()
+            if loop.time() - connected_at > MAX_RECONNECT_BACKOFF:
+                backoff = RECONNECT_BACKOFF
+            while True:
+                await asyncio.sleep(backoff)
+                backoff = min(MAX_RECONNECT_BACKOFF, backoff * 2)
+                try:
+                    await self.connect_upstream()
+                    break
+                except OSError as e:
+                    print(f"Could not reconnect upstream: {e}")
+            self.stats["upstream_reconnects"] += 1
+            print(f"Reconnected upstream to {self.upstream_address[0]}:{self.upstream_address[1]}")
+
+    async def heartbeat(self):
+        """
+        Pings the server every heartbeat interval while the upstream is connected.
+
+        Once the server has seen a ping it holds the relay to its heartbeat timeout instead of
+        the inactivity timeout, so the pings keep an idle relay connected. If MISSED_BEATS pings
+        in a row get no data back, the connection is closed as dead and maintain_upstream
+        reconnects. No ping is sent while a message without a request id is in flight, and such
+        messages wait for the pong, since a server that handles one command per recv() would
+        merge the two.
+
+        Returns:
+            None
+        """
+        token = 0
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.upstream_writer is None:
+                continue
+            if self.unanswered_beats >= MISSED_BEATS:
+                print(f"No reply to {self.unanswered_beats} heartbeats, reconnecting upstream...")
+                self.unanswered_beats = 0
+                self.upstream_writer.close()
+                continue
+            if self.in_flight and not self.in_flight[-1][5]:
+                continue
+            token += 1
+            self.unanswered_beats += 1
+            self.pong_pending = True
+            self.stats["upstream_pings"] += 1
+            self.upstream_writer.write(f"ping {token}\n".encode())
+
+    def upstream_lost(self):
+        """
+        Closes every viewer and forgets the state of the lost upstream connection.
+
+        The viewers reconnect and are served the board from the new connection's snapshot.
+        Their messages that were not yet acked are dropped with them.
+
+        Returns:
+            None
+        """
+        print("Upstream connection closed")
+        self.upstream_writer.close()
+        self.upstream_reader = self.upstream_writer = None
+        for writer in list(self.viewers):
+            writer.close()
+        self.viewers.clear()
+        self.views.clear()
+        self.unanswered_beats = 0
+        self.pong_pending = False
+        self.upstream_queue.clear()
+        self.in_flight.clear()
+        self.requests.clear()
+        self.board.clear()
+
+    def snapshot(self):
+        """
+        Builds the snapshot sent to a viewer when it joins.
+
+        Returns:
+            str: Every cached frame, END-delimited, in board order.
+        """
+        return "".join(frame + "END\n" for frames in self.board.values() for frame in frames)
+
+    def update_board(self, frame):
+        """
+        Applies a state-changing frame to the cached board.
+
+        Parameters:
+            frame (str): A draw, modify, delete or clear frame, which may be stamped with a version.
+
+        Returns:
+            None
+        """
+        parts = strip_version(frame).split()
+        if not parts:
+            return
+        if parts[0] == "draw" and len(parts) > 2:
+            self.board[parts[2]] = [frame]
+        elif parts[0] == "modify" and len(parts) > 1:
+            if parts[1] in self.board:
+                self.board[parts[1]].append(frame)
+        elif parts[0] == "delete" and len(parts) > 1:
+            self.board.pop(parts[1], None)
+        elif parts[0] == "clear" and len(parts) > 1:
+            if parts[1] == "all":
+                self.board.clear()
+            elif parts[1] == "mine":
+                for shape_id in parts[2:]:
+                    self.board.pop(shape_id, None)
+
+    def send(self, writer, data):
+        """
+        Queues data for a viewer, dropping the viewer if it has fallen too far behind.
+
+        A dropped viewer reconnects and catches up from the snapshot, which is cheaper than
+        buffering an unbounded backlog for it.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The viewer's stream.
+            data (str): The framed data to send.
+
+        Returns:
+            None
+        """
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            print("Viewer fell too far behind, dropping it")
+            self.stats["viewers_dropped"] += 1
+            self.viewers.discard(writer)
+            writer.close()
+            return
+        writer.write(data.encode())
+        self.stats["frames_sent"] += 1
+
+    def fan_out(self, frame, sender=None, area=None, region_update=None):
+        """
+        Sends a frame to every viewer except the sender, skipping the subscribed viewers it does not concern.
+
+        Parameters:
+            frame (str): The frame to send, without its END delimiter.
+            sender (asyncio.StreamWriter, optional): The viewer the frame came from.
+            area (tuple, optional): The (x1, y1, x2, y2) area the frame touches, or None if it concerns every viewer.
+            region_update (str, optional): The frame to send subscribed viewers instead.
+
+        Returns:
+            None
+        """
+        data = frame + "END\n"
+        for writer in list(self.viewers):
+            if writer is sender:
+                continue
+            view = self.views.get(writer)
+            if view is not None and area is not None:
+                if intersects(view, area):
+                    self.send(writer, region_update + "END\n" if region_update else data)
+            else:
+                self.send(writer, data)
+
+    def publish(self, frame, sender=None):
+        """
+        Applies a frame to the cached board and fans it out.
+
+        While any viewer is subscribed to a region, the area a draw or modify touches is worked
+        out from the shape before and after it, as the server does.
+
+        Parameters:
+            frame (str): A frame that may change the board, without its END delimiter.
+            sender (asyncio.StreamWriter, optional): The viewer the frame came from.
+
+        Returns:
+            None
+        """
+        if not self.views:
+            self.update_board(frame)
+            self.fan_out(frame, sender)
+            return
+        parts = strip_version(frame).split()
+        shape_id = parts[1] if parts[:1] == ["modify"] and len(parts) > 1 else parts[2] if parts[:1] == ["draw"] and len(parts) > 2 else None
+        before = shape_state(self.board[shape_id])[1] if shape_id in self.board else None
+        self.update_board(frame)
+        area = region_update = None
+        if shape_id in self.board:
+            draw, area = shape_state(self.board[shape_id])
+            if area is not None and before is not None:
+                area = (min(before[0], area[0]), min(before[1], area[1]), max(before[2], area[2]), max(before[3], area[3]))
+            if parts[0] == "modify":
+                region_update = draw
+        self.fan_out(frame, sender, area, region_update)
+
+    def subscribe_viewer(self, writer, params):
+        """
+        Subscribes a viewer to a region and sends it the shapes in it, or unsubscribes it with "all".
+
+        Parameters:
+            writer (asyncio.StreamWriter): The viewer.
+            params (list): The parameters of the view message.
+
+        Returns:
+            bool: True if the parameters were "all" or four coordinates, False otherwise.
+        """
+        if params == ["all"]:
+            self.views.pop(writer, None)
+            return True
+        try:
+            x1, y1, x2, y2 = map(int, params)
+        except ValueError:
+            return False
+        view = self.views[writer] = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        for frames in self.board.values():
+            draw, area = shape_state(frames)
+            if area is not None and intersects(view, area):
+                self.send(writer, draw + "END\n")
+        return True
+
+    async def read_upstream(self, reader):
+        """
+        Reads frames from the server and routes them to the viewers, until the connection is closed.
+
+        Parameters:
+            reader (asyncio.StreamReader): The upstream stream.
+
+        Returns:
+            None
+        """
+        pending = ""
+        while True:
+            try:
+                data = await reader.read(65536)
+            except ConnectionError:
+                break
+            if not data:
+                break
+            self.unanswered_beats = 0
+            pending += data.decode()
+            *frames, pending = pending.split("END\n")
+            for frame in frames:
+                self.stats["upstream_frames"] += 1
+                self.route_upstream_frame(frame)
+
+    def route_upstream_frame(self, frame):
+        """
+        Routes one frame from the server to the viewers.
+
+        Parameters:
+            frame (str): The frame received from the server, without its END delimiter.
+
+        Returns:
+            None
+        """
+        if frame.startswith("pong"):
+            self.pong_pending = False
+            self.send_next_upstream()
+            return
+        if self.in_flight:
+            oldest = self.in_flight[0]
+            if oldest[2] and is_list_reply(frame):
+                if oldest[0] is not None:
+                    self.send(oldest[0], frame + "END\n")
+                return
+            parts = frame.split(" ", 2)
+            if parts[0] == "ack" and len(parts) == 3 and parts[1] in self.requests:
+                message = self.requests.pop(parts[1])
+                self.in_flight.remove(message)
+                self.acked(message, frame)
+                return
+            if frame.strip() in ACK_FRAMES and not oldest[5]:
+                self.acked(self.in_flight.popleft(), frame)
+                return
+        if not frame:
+            return
+        self.publish(frame)
+
+    def acked(self, message, frame):
+        """
+        Passes the ack of a message back to its viewer and fans the message out.
+
+        Parameters:
+            message (list): The message that was acked.
+            frame (str): The ack, with the relay's request id for a pipelined message.
+
+        Returns:
+            None
+        """
+        writer, _, _, broadcast, request_id, pipelined = message
+        if writer is not None:
+            if pipelined:
+                frame = f"ack {request_id} {frame.split(' ', 2)[2]}"
+            self.send(writer, frame + "END\n")
+        version = ack_version(frame)
+        if broadcast is not None and version and broadcast.split()[0] in STAMPED_COMMANDS:
+            broadcast = f"ver {version} {broadcast}"
+        if broadcast is not None:
+            self.publish(broadcast, sender=writer)
+        self.send_next_upstream()
+
+    def send_next_upstream(self):
+        """
+        Sends the queued messages upstream that are not held back by a message without an id.
+
+        Messages that need no round trip, such as "clear mine" with no shapes, are
+        acknowledged locally when they reach the front of the queue, so their acks stay in
+        order with the viewer's other replies.
+
+        Returns:
+            None
+        """
+        while self.upstream_queue:
+            message = self.upstream_queue[0]
+            writer, text, _, broadcast, request_id, pipelined = message
+            if self.in_flight and not (pipelined and self.in_flight[-1][5]):
+                break
+            if self.pong_pending and not pipelined:
+                break
+            self.upstream_queue.popleft()
+            if text is None:
+                if writer is not None:
+                    ack = f"ack {request_id} ok 0\n" if request_id is not None else SUCCESS_ACK
+                    self.send(writer, ack + "END\n")
+                if broadcast is not None:
+                    self.publish(broadcast, sender=writer)
+                continue
+            if pipelined:
+                upstream_id = str(self.next_request_id)
+                self.next_request_id += 1
+                self.requests[upstream_id] = message
+                text = f"req {upstream_id} {text}"
+            self.in_flight.append(message)
+            self.upstream_writer.write((text + "\n").encode())
+
+    async def handle_viewer(self, reader, writer):
+        """
+        Serves one downstream viewer until it disconnects.
+
+        A viewer that connects while the upstream is down is closed straight away.
+
+        Parameters:
+            reader (asyncio.StreamReader): The viewer's input stream.
+            writer (asyncio.StreamWriter): The viewer's output stream.
+
+        Returns:
+            None
+        """
+        if self.upstream_writer is None:
+            self.stats["viewers_refused"] += 1
+            writer.close()
+            return
+        self.send(writer, self.snapshot())
+        self.viewers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.handle_viewer_message(writer, line.decode().strip())
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            print(f"Viewer connection error: {e}")
+        finally:
+            self.viewers.discard(writer)
+            self.views.pop(writer, None)
+            self.forget_viewer(writer)
+            writer.close()
+
+    def forget_viewer(self, writer):
+        """
+        Stops routing replies to a viewer that has gone, while still sending its queued messages.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The viewer's stream.
+
+        Returns:
+            None
+        """
+        for message in self.upstream_queue + self.in_flight:
+            if message[0] is writer:
+                message[0] = None
+
+    def handle_viewer_message(self, writer, message):
+        """
+        Queues a viewer's message for the server, to be fanned out to the other viewers once acked.
+
+        The server scopes "clear mine" to the connection that sent it, which for the relay
+        would be every viewer at once. It is therefore sent upstream as one delete per shape,
+        and only the last of those acks is passed back to the viewer. With no shapes to
+        delete, it is acknowledged by the relay itself.
+
+        A message sent with a "req <id> " prefix, and every delete of such a "clear mine", is
+        pipelined, and the prefix is left out of the broadcast. Heartbeat pings and region
+        subscriptions are handled by the relay, and a malformed subscription is sent upstream
+        for the server to reject.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The viewer the message came from.
+            message (str): The message, without its trailing newline.
+
+        Returns:
+            None
+        """
+        request_id = None
+        if message.startswith("req "):
+            _, request_id, message = (message.split(" ", 2) + [""])[:3]
+        parts = message.split()
+        if not parts:
+            return
+        if parts[0] == "ping":
+            # Heartbeats measure the path to the relay, so they are answered here
+            self.send(writer, f"pong{message[4:]}\nEND\n")
+            return
+        if parts[0] == "view" and self.subscribe_viewer(writer, parts[1:]):
+            self.upstream_queue.append([writer, None, False, None, request_id, request_id is not None])
+            self.send_next_upstream()
+            return
+        self.stats["downstream_messages"] += 1
+        broadcast = message + "\n" if parts[0] not in ("list", "view") else None
+        if parts[0] == "clear" and parts[1:2] == ["mine"]:
+            upstream = [f"delete {shape_id}" for shape_id in parts[2:]] or [None]
+        else:
+            upstream = [message]
+        for i, upstream_message in enumerate(upstream):
+            last = i == len(upstream) - 1
+            self.upstream_queue.append([writer if last else None, upstream_message, parts[0] == "list",
+                                        broadcast if last else None, request_id if last else None,
+                                        request_id is not None])
+        self.send_next_upstream()
+
+
+def parse_address(address):
+    """
+    Parses a "host:port" string.
+
+    Parameters:
+        address (str): The address to parse.
+
+    Returns:
+        tuple: The (host, port) pair.
+    """
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def main(args):
+    upstream_host, upstream_port = parse_address(args.upstream)
+    host, port = parse_address(args.listen)
+    relay = Relay(upstream_host, upstream_port, host, port)
+    server = await relay.start()
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan one server connection out to many NetSketch clients.")
+    parser.add_argument("--upstream", default="127.0.0.1:6001", help="address of the NetSketch server")
+    parser.add_argument("--listen", default="127.0.0.1:6002", help="address to accept clients on")
+    asyncio.run(main(parser.parse_args()))
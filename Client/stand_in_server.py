@@ -0,0 +1,444 @@
+import asyncio
+import random
+import threading
+
+LIST_PAGE_SIZE = 100  # Matches LIST_PAGE_SIZE in Server/Canvas.h
+MAX_LIST_PAGE_SIZE = 1000  # Matches MAX_LIST_PAGE_SIZE in Server/Canvas.h
+
+
+def format_draw(cmd):
+    """
+    Formats a stored command the way the server sends it in a snapshot, stamped with its version.
+
+    Parameters:
+        cmd (dict): The stored command.
+
+    Returns:
+        str: The draw line, terminated by a newline.
+    """
+    stamp = f"ver {cmd['version']} "
+    if cmd["type"] == "text":
+        return stamp + f"draw text {cmd['id']} {cmd['x1']} {cmd['y1']} '{cmd['text']}' {cmd['r']} {cmd['g']} {cmd['b']}\n"
+    return stamp + f"draw {cmd['type']} {cmd['id']} {cmd['x1']} {cmd['y1']} {cmd['x2']} {cmd['y2']} {cmd['r']} {cmd['g']} {cmd['b']}\n"
+
+
+def command_bounds(cmd):
+    """
+    Returns the (x1, y1, x2, y2) area a stored command covers; text is anchored at a point.
+    """
+    if cmd["type"] == "text":
+        return (cmd["x1"], cmd["y1"], cmd["x1"], cmd["y1"])
+    return (min(cmd["x1"], cmd["x2"]), min(cmd["y1"], cmd["y2"]), max(cmd["x1"], cmd["x2"]), max(cmd["y1"], cmd["y2"]))
+
+
+def intersects(a, b):
+    """
+    Checks whether two (x1, y1, x2, y2) rectangles overlap.
+    """
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def split_request_id(message):
+    """
+    Splits the "req <id> " prefix off a message the way the server does.
+
+    The id runs to the first space after "req ", or to the end of the line. A message with an
+    empty id is answered with the plain acks, and one with nothing after the id is invalid.
+
+    Parameters:
+        message (str): The message, ending in a newline.
+
+    Returns:
+        tuple: The request id, or None if there is none, and the message without the prefix.
+    """
+    if not message.startswith("req "):
+        return None, message
+    id_end = message.find(" ", 4)
+    if id_end == -1:
+        id_end = len(message) - 1
+    return message[4:id_end] or None, message[min(id_end + 1, len(message) - 1):]
+
+
+def format_list_entry(cmd):
+    """
+    Formats a stored command as one line of a list reply.
+
+    Parameters:
+        cmd (dict): The stored command.
+
+    Returns:
+        str: The list line, terminated by a newline.
+    """
+    entry = f"list {cmd['id']} => [{cmd['type']}] [{cmd['r']} {cmd['g']} {cmd['b']}] "
+    if cmd["type"] == "text":
+        return entry + f"[{cmd['x1']} {cmd['y1']}] *\"{cmd['text']}\"*\n"
+    return entry + f"[{cmd['x1']} {cmd['y1']} {cmd['x2']} {cmd['y2']}]\n"
+
+
+class StandInServer:
+    """
+    An in-process stand-in for the C++ server.
+
+    It speaks the same protocol: a snapshot of END-framed draw commands on connect, an
+    END-framed ack for every message, and every message broadcast to the other clients.
+    The draw, modify, delete, clear and list commands behave as they do on the server:
+    stored commands are kept in arrival order and found by their global shape id, and a
+    draw for an id that is already stored replaces it in place.
+    Like the server, it splits its input on newlines and handles every message of a read,
+    so pipelined messages are each processed, acked and broadcast in order. A malformed
+    command, including a list with a page size of zero or less, gets "Invalid command."
+    and nothing else. A message sent with a "req <id> " prefix is acked with
+    "ack <id> ok <version>" or "ack <id> invalid" instead, and every change to a shape is
+    stamped with a version that is broadcast as a "ver <version> " prefix. A "ping <token>"
+    heartbeat is answered with "pong <token>" only. A client that sends "view <x1> <y1> <x2> <y2>"
+    gets the shapes in that region and from then on only the draws and modifies that touch it,
+    with a modify sent as a draw of the whole shape, until it sends "view all".
+
+    The server binds an ephemeral port by default and starts in milliseconds. It runs on
+    its own event loop thread, so it can be used from synchronous tests and by CanvasApp.
+
+    Hooks:
+        latency (float): Seconds to wait before every frame is sent.
+        drop_rate (float): Probability that a frame is silently dropped.
+        drop_filter (callable): Called with each outgoing frame; the frame is dropped if it returns True.
+        answer_pings (bool): Answer heartbeats. Set it to False, with no other traffic, to stand in
+            for a server that has gone away without closing the connection.
+        one_command_per_recv (bool): Handle only the first command of each 1024-byte read and
+            broadcast the read as it is, as the C++ server did before it split its input on
+            newlines. Messages written back to back are then merged and all but the first lost.
+
+    Drops are drawn from a seeded random generator, so a run is repeatable.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, drop_rate=0.0, seed=0, one_command_per_recv=False):
+        self.address = (host, port)
+        self.one_command_per_recv = one_command_per_recv
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.drop_filter = None
+        self.answer_pings = True
+        self.random = random.Random(seed)
+        self.commands = {}  # key -> stored command, in arrival order
+        self.keys = {}  # shape id -> key
+        self.next_key = 1
+        self.next_version = 1
+        self.clients = {}  # writer -> connection number, standing in for the socket fd
+        self.views = {}  # writer -> (x1, y1, x2, y2) region the client subscribed to
+        self.next_connection = 1
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Starts the server on a background event loop thread.
+
+        Returns:
+            tuple: The (host, port) address the server is listening on.
+        """
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.serve())
+            ready.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.address
+
+    def stop(self):
+        """
+        Closes every connection and stops the background event loop.
+        """
+        async def shutdown():
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def reset(self):
+        """
+        Clears the board and the injected faults, so that tests do not affect each other.
+        """
+        async def clear():
+            self.commands.clear()
+            self.keys.clear()
+            self.next_key = 1
+            self.latency = 0.0
+            self.drop_rate = 0.0
+            self.drop_filter = None
+            self.answer_pings = True
+
+        asyncio.run_coroutine_threadsafe(clear(), self.loop).result()
+
+    async def serve(self):
+        """
+        Starts listening on the current event loop.
+
+        Returns:
+            asyncio.Server: The listening server.
+        """
+        self.server = await asyncio.start_server(self.handle_client, *self.address)
+        self.address = self.server.sockets[0].getsockname()[:2]
+        return self.server
+
+    def send(self, writer, frame):
+        """
+        Sends one END-framed frame to a client, applying the injected latency and drops.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The client's stream.
+            frame (str): The frame, without its END delimiter.
+
+        Returns:
+            None
+        """
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            return
+        if self.drop_filter is not None and self.drop_filter(frame):
+            return
+        data = (frame + "END\n").encode()
+        if self.latency:
+            # Timers with equal deadlines run in the order they were scheduled, so frames stay in order
+            asyncio.get_running_loop().call_later(self.latency, self.write, writer, data)
+        else:
+            self.write(writer, data)
+
+    def write(self, writer, data):
+        if not writer.is_closing():
+            writer.write(data)
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves one client until it disconnects.
+
+        Parameters:
+            reader (asyncio.StreamReader): The client's input stream.
+            writer (asyncio.StreamWriter): The client's output stream.
+
+        Returns:
+            None
+        """
+        self.clients[writer] = self.next_connection
+        self.next_connection += 1
+        for cmd in self.commands.values():
+            self.send(writer, format_draw(cmd))
+        try:
+            while True:
+                data = await (reader.read(1024) if self.one_command_per_recv else reader.readline())
+                if not data:
+                    break
+                message = data.decode()
+                request_id, message = split_request_id(message)
+                command = message.split("\n", 1)[0] if self.one_command_per_recv else message
+                if command.startswith("ping"):
+                    if self.answer_pings:
+                        self.send(writer, "pong" + command[4:])
+                    continue
+                parts = command.split()
+                changed = parts[1] if parts[:1] == ["modify"] else parts[2] if parts[:1] == ["draw"] and len(parts) > 2 else None
+                before = self.shape_bounds(changed)
+                success, version = self.process(writer, command)
+                if request_id is None:
+                    self.send(writer, "Command processed successfully.\n" if success else "Invalid command.\n")
+                else:
+                    self.send(writer, f"ack {request_id} ok {version}\n" if success else f"ack {request_id} invalid\n")
+                if parts[:1] == ["view"]:
+                    continue
+                bounds = region_update = None
+                if changed is not None and version:
+                    after = self.shape_bounds(changed)
+                    bounds = (min(before[0], after[0]), min(before[1], after[1]), max(before[2], after[2]), max(before[3], after[3])) if before else after
+                    if parts[0] == "modify":
+                        region_update = format_draw(self.commands[self.keys[changed]])
+                if version:
+                    message = f"ver {version} {message}"
+                for other in list(self.clients):
+                    if other is writer:
+                        continue
+                    view = self.views.get(other)
+                    if view is not None and bounds is not None:
+                        if not intersects(view, bounds):
+                            continue
+                        self.send(other, region_update or message)
+                    else:
+                        self.send(other, message)
+        except ConnectionError:
+            pass
+        finally:
+            del self.clients[writer]
+            self.views.pop(writer, None)
+            writer.close()
+
+    def process(self, writer, message):
+        """
+        Applies one message to the board.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The client that sent the message.
+            message (str): The message received from the client.
+
+        Returns:
+            tuple: (success, version), where success is True if the command was processed
+                successfully and version is the version stamped on the shape it changed, or 0.
+        """
+        parts = message.split()
+        if not parts:
+            return False, 0
+        version = 0
+        try:
+            if parts[0] == "draw":
+                version = self.draw(writer, message, parts)
+            elif parts[0] == "modify":
+                version = self.modify(writer, parts)
+            elif parts[0] == "delete":
+                key = self.keys.pop(parts[1], None)
+                if self.commands.pop(key, None) is not None:
+                    version = self.stamp()
+            elif parts[0] == "clear":
+                if parts[1:2] == ["all"]:
+                    self.commands.clear()
+                    self.keys.clear()
+                    self.next_key = 1
+                elif parts[1:2] == ["mine"]:
+                    owner = self.clients[writer]
+                    self.commands = {key: cmd for key, cmd in self.commands.items() if cmd["fd"] != owner}
+                    self.keys = {cmd["id"]: key for key, cmd in self.commands.items()}
+            elif parts[0] == "list":
+                self.list_commands(writer, parts[1:])
+            elif parts[0] == "view":
+                self.view(writer, parts[1:])
+            elif parts[0] not in ("select", "undo", "show"):
+                return False, 0
+        except (ValueError, IndexError):
+            return False, 0
+        return True, version
+
+    def stamp(self):
+        """
+        Returns the next version, which is higher than every version stamped before it.
+        """
+        self.next_version += 1
+        return self.next_version - 1
+
+    def draw(self, writer, message, parts):
+        """
+        Stores a draw command under the next arrival key, or in place of the stored command with the same shape id.
+
+        Returns the version stamped on the shape.
+        """
+        cmd = {"type": parts[1], "id": parts[2], "x1": int(parts[3]), "y1": int(parts[4]),
+               "x2": 0, "y2": 0, "text": "", "r": 0, "g": 0, "b": 0, "fd": self.clients[writer]}
+        if cmd["type"] == "text":
+            rest = message.split(None, 5)[5]
+            last_quote = rest.rfind("'")
+            cmd["text"] = rest[1:last_quote]
+            colour = rest[last_quote + 1:].split()
+        else:
+            cmd["x2"], cmd["y2"] = int(parts[5]), int(parts[6])
+            colour = parts[7:10]
+        if len(colour) == 3 and all(c.isdigit() for c in colour):
+            cmd["r"], cmd["g"], cmd["b"] = map(int, colour)
+        key = self.keys.get(cmd["id"])
+        if key is None:
+            key = self.keys[cmd["id"]] = self.next_key
+            self.next_key += 1
+        cmd["version"] = self.stamp()
+        self.commands[key] = cmd
+        return cmd["version"]
+
+    def modify(self, writer, parts):
+        """
+        Applies the colour and draw modifications of a modify command, which also takes over ownership.
+
+        Returns the version stamped on the shape, or 0 if there is no such shape.
+        """
+        cmd = self.commands.get(self.keys.get(parts[1]))
+        if cmd is None:
+            return 0
+        cmd["fd"] = self.clients[writer]
+        i = 2
+        while i < len(parts):
+            if parts[i] == "colour":
+                cmd["r"], cmd["g"], cmd["b"] = map(int, parts[i + 1:i + 4])
+                i += 4
+            elif parts[i] == "draw":
+                cmd["x1"], cmd["y1"], cmd["x2"], cmd["y2"] = map(int, parts[i + 1:i + 5])
+                i += 5
+            else:
+                i += 1
+        cmd["version"] = self.stamp()
+        return cmd["version"]
+
+    def shape_bounds(self, shape_id):
+        """
+        Returns the area the stored shape covers, or None if there is no such shape.
+        """
+        cmd = self.commands.get(self.keys.get(shape_id))
+        return command_bounds(cmd) if cmd is not None else None
+
+    def view(self, writer, params):
+        """
+        Subscribes a client to a region and sends the shapes in it, or unsubscribes it with "all".
+
+        Raises:
+            ValueError: If the parameters are neither "all" nor four coordinates.
+        """
+        if params == ["all"]:
+            self.views.pop(writer, None)
+            return
+        if len(params) != 4:
+            raise ValueError(f"Invalid view: {params}")
+        x1, y1, x2, y2 = map(int, params)
+        view = self.views[writer] = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        for cmd in self.commands.values():
+            if intersects(view, command_bounds(cmd)):
+                self.send(writer, format_draw(cmd))
+
+    def list_commands(self, writer, params):
+        """
+        Sends a page of filtered commands, followed by a "list next" cursor if more matches remain.
+
+        Raises:
+            ValueError: If the page size is not a positive number, in which case nothing is sent.
+        """
+        tool, user = params[0], params[1]
+        limit = int(params[2]) if len(params) > 2 else LIST_PAGE_SIZE
+        if limit <= 0:
+            raise ValueError(f"Invalid list page size: {limit}")
+        limit = min(limit, MAX_LIST_PAGE_SIZE)
+        after = int(params[3]) if len(params) > 3 else 0
+        owner = self.clients[writer]
+        reply = ""
+        count = 0
+        last_key = after
+        for key, cmd in self.commands.items():
+            if key <= after:
+                continue
+            if tool != "all" and cmd["type"] != tool:
+                continue
+            if user != "all" and not (user == "mine" and cmd["fd"] == owner):
+                continue
+            if count == limit:
+                reply += f"list next {last_key}\n"
+                break
+            reply += format_list_entry(cmd)
+            count += 1
+            last_key = key
+        self.send(writer, reply)
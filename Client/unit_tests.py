@@ -1,12 +1,25 @@
+import io
+import os
+import tempfile
 import unittest
+import zlib
+from contextlib import redirect_stdout
 from unittest.mock import MagicMock, patch
-from commands import Commands
+from commands import Commands, ShapeMap, parse_command
 from canvas_app import CanvasApp
+from relay import Relay, is_list_reply
+from backends import CanvasBackend, MemoryBackend, NullBackend
+import raster
+from endpoints import EndpointHealth, HashRing, parse_endpoints
+from recording import SessionRecorder, SessionReplayer, expected_acks
+from benchmarks import MICROBENCHMARKS, bench_suite, compare_to_baseline, run_suite
 
 class TestCommands(unittest.TestCase):
     def setUp(self):
         self.commands = Commands()
         self.mock_canvas = MagicMock()
+        for method in ("create_line", "create_rectangle", "create_oval", "create_text"):
+            getattr(self.mock_canvas, method).return_value = 1
 
     def test_rgb_to_hex(self):
         self.assertEqual(self.commands.rgb_to_hex(255, 0, 0), '#ff0000')
@@ -31,100 +44,204 @@ class TestCommands(unittest.TestCase):
     def test_apply_draw_command_text(self):
         command = "draw text 1 10 20 'Hello' 255 255 255"
         self.commands.apply_draw_command(self.mock_canvas, command)
-        self.mock_canvas.create_text.assert_called_with('10', '20', text='Hello', fill='#ffffff')
-        self.assertEqual(self.mock_canvas.create_text.call_count, 2)
+        self.mock_canvas.create_text.assert_called_once_with(10, 20, text='Hello', fill='#ffffff')
 
     def test_delete_command(self):
-        self.commands.delete_command(self.mock_canvas, 1)
+        self.commands.apply_draw_command(self.mock_canvas, "draw line a.1 10 20 30 40 255 0 0")
+        self.commands.delete_command(self.mock_canvas, "a.1")
         self.mock_canvas.delete.assert_called_once_with(1)
+        self.assertEqual(self.commands.shapes, {})
+        self.assertNotIn("a.1", self.commands.shape_map)
 
     def test_modify_command(self):
-        self.commands.selected_command_id = 1
+        self.commands.apply_draw_command(self.mock_canvas, "draw line a.1 10 20 30 40 255 0 0")
+        self.commands.selected_command_id = "a.1"
         self.mock_canvas.type.return_value = "line"  
         args = ['colour', '255', '0', '0']
         self.commands.modify_command(self.mock_canvas, args)
         self.mock_canvas.itemconfig.assert_called_once_with(1, fill='#ff0000')
 
     def test_clear_all(self):
-        self.commands.shapes = {1: "shape1", 2: "shape2", 3: "shape3"}
-        self.commands.draw_commands = [(1, "cmd1"), (2, "cmd2"), (3, "cmd3")]
-        self.commands.user_commands = {1, 2}
+        self.commands.shapes = {"a.1": "shape1", "a.2": "shape2", "b.1": "shape3"}
+        self.commands.user_commands = {"a.1", "a.2"}
 
         self.commands.apply_draw_command(self.mock_canvas, "clear all")
 
         self.mock_canvas.delete.assert_called_once_with("all")
         self.assertEqual(self.commands.shapes, {})
-        self.assertEqual(self.commands.draw_commands, [])
+        self.assertEqual(len(self.commands.shape_map), 0)
         self.assertEqual(self.commands.user_commands, set())
 
     def test_clear_mine(self):
-        self.commands.shapes = {1: "shape1", 2: "shape2", 3: "shape3"}
-        self.commands.draw_commands = [(1, "cmd1"), (2, "cmd2"), (3, "cmd3")]
-        self.commands.user_commands = {1, 2}
+        for shape_id in ("a.1", "a.2", "b.1"):
+            self.commands.apply_draw_command(self.mock_canvas, f"draw line {shape_id} 10 20 30 40 255 0 0")
+        self.commands.user_commands = {"a.1", "a.2"}
 
         self.commands.apply_draw_command(self.mock_canvas, "clear mine")
+        self.assertEqual(list(self.commands.shapes), ["a.1", "a.2", "b.1"])
 
-        self.assertEqual(self.commands.user_commands, set())
-        
-        self.assertEqual(self.commands.draw_commands, [(1, "cmd1"), (2, "cmd2"), (3, "cmd3")])
-        
-        self.assertEqual(self.commands.shapes, {1: "shape1", 2: "shape2", 3: "shape3"})
+        # A peer's clear mine names the peer's shapes, which are the only ones removed
+        self.commands.apply_draw_command(self.mock_canvas, "clear mine b.1")
+        self.assertEqual(list(self.commands.shapes), ["a.1", "a.2"])
+        self.assertEqual(self.commands.user_commands, {"a.1", "a.2"})
 
+    @patch('threading.Thread')
     @patch('socket.socket')
-    def test_execute_command_clear_mine(self, mock_socket):
+    def test_execute_command_clear_mine(self, mock_socket, mock_thread):
         app = CanvasApp(MagicMock())
+        app.connect(1.0)
         app.canvas = MagicMock()
-        app.user_commands = {1, 2, 3}
+        for item, shape_id in enumerate(("a.1", "a.2", "a.3"), start=1):
+            app.commands.add_command(shape_id, f"draw line {shape_id} 1 2 3 4 0 0 0", item)
+        app.user_commands = {"a.1", "a.2", "a.3"}
         
         app.execute_command("clear mine")
         
-        for shape_id in {1, 2, 3}:
-            app.canvas.delete.assert_any_call(shape_id)
+        for item in (1, 2, 3):
+            app.canvas.delete.assert_any_call(item)
         self.assertEqual(app.user_commands, set())
+        self.assertEqual(app.commands.shapes, {})
         app.client_socket.sendall.assert_called_once()  
 
     def test_list_commands_all(self):
-        self.commands.draw_commands = [
-            (1, "draw line 1 10 20 30 40 255 0 0"),
-            (2, "draw rectangle 2 50 60 70 80 0 255 0"),
-            (3, "draw circle 3 90 100 110 120 0 0 255")
-        ]
-        self.commands.user_commands = {1, 2, 3}
+        self.commands.shapes = {
+            "a.1": "draw line a.1 10 20 30 40 255 0 0",
+            "a.2": "draw rectangle a.2 50 60 70 80 0 255 0",
+            "b.1": "draw circle b.1 90 100 110 120 0 0 255"
+        }
+        self.commands.user_commands = {"a.1", "a.2", "b.1"}
 
         result = self.commands.list_commands(filter_tool="all", filter_user="all")
         self.assertEqual(len(result), 3)
-        self.assertIn((1, "draw line 1 10 20 30 40 255 0 0"), result)
-        self.assertIn((2, "draw rectangle 2 50 60 70 80 0 255 0"), result)
-        self.assertIn((3, "draw circle 3 90 100 110 120 0 0 255"), result)
+        self.assertIn(("a.1", "draw line a.1 10 20 30 40 255 0 0"), result)
+        self.assertIn(("a.2", "draw rectangle a.2 50 60 70 80 0 255 0"), result)
+        self.assertIn(("b.1", "draw circle b.1 90 100 110 120 0 0 255"), result)
 
     def test_list_commands_filter_tool(self):
-        self.commands.draw_commands = [
-            (1, "draw line 1 10 20 30 40 255 0 0"),
-            (2, "draw rectangle 2 50 60 70 80 0 255 0"),
-            (3, "draw circle 3 90 100 110 120 0 0 255")
-        ]
-        self.commands.user_commands = {1, 2, 3}
+        self.commands.shapes = {
+            "a.1": "draw line a.1 10 20 30 40 255 0 0",
+            "a.2": "draw rectangle a.2 50 60 70 80 0 255 0",
+            "b.1": "draw circle b.1 90 100 110 120 0 0 255"
+        }
+        self.commands.user_commands = {"a.1", "a.2", "b.1"}
 
         result = self.commands.list_commands(filter_tool="line", filter_user="all")
         self.assertEqual(len(result), 1)
-        self.assertIn((1, "draw line 1 10 20 30 40 255 0 0"), result)
+        self.assertIn(("a.1", "draw line a.1 10 20 30 40 255 0 0"), result)
 
     def test_list_commands_filter_user(self):
-        self.commands.draw_commands = [
-            (1, "draw line 1 10 20 30 40 255 0 0"),
-            (2, "draw rectangle 2 50 60 70 80 0 255 0"),
-            (3, "draw circle 3 90 100 110 120 0 0 255")
-        ]
-        self.commands.user_commands = {1, 2}
+        self.commands.shapes = {
+            "a.1": "draw line a.1 10 20 30 40 255 0 0",
+            "a.2": "draw rectangle a.2 50 60 70 80 0 255 0",
+            "b.1": "draw circle b.1 90 100 110 120 0 0 255"
+        }
+        self.commands.user_commands = {"a.1", "a.2"}
 
         result = self.commands.list_commands(filter_tool="all", filter_user="mine")
         self.assertEqual(len(result), 2)
-        self.assertIn((1, "draw line 1 10 20 30 40 255 0 0"), result)
-        self.assertIn((2, "draw rectangle 2 50 60 70 80 0 255 0"), result)
+        self.assertIn(("a.1", "draw line a.1 10 20 30 40 255 0 0"), result)
+        self.assertIn(("a.2", "draw rectangle a.2 50 60 70 80 0 255 0"), result)
+
+    def test_parse_command(self):
+        self.assertEqual(parse_command("draw circle a.1 10 20 30 40 0 0 255"),
+                         ("draw", "a.1", "create_oval", (10, 20, 30, 40), {"outline": "#0000ff"}, "draw circle a.1 10 20 30 40 0 0 255"))
+        self.assertEqual(parse_command("modify a.3 colour 255 0 0 draw 1 2 3 4"),
+                         ("modify", "a.3", [("colour", "#ff0000"), ("draw", (1, 2, 3, 4))]))
+        self.assertEqual(parse_command("delete a.2"), ("delete", "a.2"))
+        self.assertEqual(parse_command("clear mine 1 2"), ("clear_mine", ["1", "2"]))
+        self.assertEqual(parse_command("draw hexagon 1 10 20 30 40 0 0 0")[0], "invalid")
+        self.assertEqual(parse_command("Command processed successfully."), ("ack", None, True, 0))
+        self.assertEqual(parse_command("ack 3 ok 7\n"), ("ack", "3", True, 7))
+        self.assertEqual(parse_command("ack 4 invalid\n"), ("ack", "4", False, 0))
+        self.assertEqual(parse_command("ver 7 delete a.2\n"), ("stamped", 7, ("delete", "a.2")))
+        self.assertEqual(parse_command("pong 5\n"), ("pong", "5"))
+
+    def test_apply_operations(self):
+        operations = [parse_command("draw line a.1 10 20 30 40 255 0 0"), parse_command("modify a.1 draw 1 2 3 4")]
+        self.mock_canvas.type.return_value = "line"
+
+        self.commands.apply_operations(self.mock_canvas, operations)
+
+        self.mock_canvas.create_line.assert_called_once_with(10, 20, 30, 40, fill='#ff0000')
+        self.mock_canvas.coords.assert_called_once_with(1, 1, 2, 3, 4)
+        self.assertEqual(self.commands.shapes, {"a.1": "draw line a.1 10 20 30 40 255 0 0"})
+
+    def test_shape_map(self):
+        shape_map = ShapeMap()
+        shape_map.bind("a.1", 5)
+        shape_map.bind("b.1", 7)
+        shape_map.bind("a.2", 3)
+
+        self.assertEqual(shape_map.item("b.1"), 7)
+        self.assertEqual(shape_map.shape_id(3), "a.2")
+        self.assertEqual(shape_map.shape_id(5), "a.1")
+        self.assertIsNone(shape_map.shape_id(6))
+
+        shape_map.bind("a.1", 8)
+        self.assertIsNone(shape_map.shape_id(5))
+        self.assertEqual(shape_map.unbind("a.1"), 8)
+        self.assertIsNone(shape_map.item("a.1"))
+
+        # Redrawing moves the shapes to ever higher items without keeping the old ones
+        for item in range(100, 10000, 2):
+            shape_map.bind("b.1", item)
+        self.assertEqual(shape_map.ids, {3: "a.2", 9998: "b.1"})
+
+    def test_redraw_keeps_global_ids(self):
+        canvas = MemoryBackend()
+        self.commands.apply_draw_command(canvas, "draw line a.1 10 20 30 40 255 0 0")
+        self.commands.apply_draw_command(canvas, "draw circle b.1 1 2 3 4 0 0 255")
+
+        self.commands.redraw(canvas)
+        self.commands.apply_draw_command(canvas, "modify b.1 colour 0 255 0")
+        self.commands.apply_draw_command(canvas, "delete a.1")
+
+        self.assertEqual(canvas.find(), [4])
+        self.assertEqual(canvas.itemcget(4, "outline"), "#00ff00")
+        self.assertEqual(self.commands.shape_map.shape_id(4), "b.1")
+
+    def test_stamped_changes_last_writer_wins(self):
+        canvas = MemoryBackend()
+        self.commands.apply_draw_command(canvas, "ver 2 draw line a.1 10 20 30 40 255 0 0")
+        self.commands.apply_draw_command(canvas, "ver 4 modify a.1 colour 0 255 0")
+        self.commands.apply_draw_command(canvas, "ver 3 modify a.1 colour 0 0 255")
+
+        self.assertEqual(canvas.itemcget(1, "fill"), "#00ff00")
+        self.assertEqual(self.commands.versions, {"a.1": 4})
+
+        self.commands.apply_draw_command(canvas, "ver 5 delete a.1")
+        self.commands.apply_draw_command(canvas, "ver 4 draw line a.1 1 2 3 4 0 0 0")
+        self.assertEqual(canvas.find(), [])
+
+    def test_peer_changes_wait_for_own_ack(self):
+        canvas = MemoryBackend()
+        self.commands.apply_draw_command(canvas, "ver 1 draw line a.1 10 20 30 40 255 0 0")
+        first = self.commands.track_request("a.1")
+        self.commands.apply_draw_command(canvas, "modify a.1 colour 0 255 0")  # Applied optimistically
+        self.commands.apply_draw_command(canvas, "ver 2 modify a.1 colour 0 0 255")
+        self.assertEqual(canvas.itemcget(1, "fill"), "#00ff00")
+
+        self.commands.apply_draw_command(canvas, f"ack {first} ok 3")
+        self.assertEqual(canvas.itemcget(1, "fill"), "#00ff00")
+        self.assertEqual(self.commands.versions, {"a.1": 3})
+
+        second = self.commands.track_request("a.1")
+        self.commands.apply_draw_command(canvas, "ver 5 modify a.1 colour 0 0 255")
+        self.commands.apply_draw_command(canvas, f"ack {second} ok 4")
+        self.assertEqual(canvas.itemcget(1, "fill"), "#0000ff")
+        self.assertEqual(self.commands.requests, {})
+        self.assertEqual(self.commands.pending, {})
+
+    def test_iter_list_entries(self):
+        reply = "list 1 => [line] [255 0 0] [10 20 30 40]\nlist 2 => [circle] [0 0 255] [1 2 3 4]\nlist next 2\n"
+        entries = list(self.commands.iter_list_entries(reply))
+        self.assertEqual(entries, [("1", "[line] [255 0 0] [10 20 30 40]"), ("2", "[circle] [0 0 255] [1 2 3 4]")])
+        self.assertEqual(self.commands.list_cursor, "2")
 
 class TestCanvasApp(unittest.TestCase):
+    @patch('threading.Thread')
     @patch('socket.socket')
-    def setUp(self, mock_socket):
+    def setUp(self, mock_socket, mock_thread):
         self.root = MagicMock()
         self.app = CanvasApp(self.root)
         self.app.client_socket = mock_socket
@@ -146,44 +263,602 @@ class TestCanvasApp(unittest.TestCase):
 
     def test_execute_command_list(self):
         self.app.execute_command("list all all")
-        self.app.client_socket.sendall.assert_called_once_with(b"list all all\n")
+        self.app.client_socket.sendall.assert_called_once_with(b"req 1 list all all\n")
 
     def test_execute_command_delete(self):
         self.app.execute_command("delete 1")
-        self.app.client_socket.sendall.assert_called_once_with(b"delete 1\n")
+        self.app.client_socket.sendall.assert_called_once_with(b"req 1 delete 1\n")
+
+    def test_subscribe_and_unsubscribe(self):
+        self.app.subscribe(0, 0, 800, 600)
+        self.app.client_socket.sendall.assert_called_with(b"req 1 view 0 0 800 600\n")
+        self.assertEqual(self.app.view, (0, 0, 800, 600))
 
+        self.app.execute_command("view all")
+        self.app.client_socket.sendall.assert_called_with(b"req 2 view all\n")
+        self.assertIsNone(self.app.view)
+
+    def test_draw_is_sent_with_request_id(self):
+        self.app.client_tag = "a"
+        self.app.canvas = MemoryBackend()
+        self.app.draw_shape("line", 1, 2, 3, 4, "0 0 0")
+        self.app.draw_shape("line", 5, 6, 7, 8, "0 0 0")
+
+        self.app.client_socket.sendall.assert_called_with(b"req 2 draw line a.2 5 6 7 8 0 0 0\n")
+        self.assertEqual(self.app.commands.requests, {"1": "a.1", "2": "a.2"})
+        self.assertEqual(self.app.commands.pending, {"a.1": 1, "a.2": 1})
+
+    @patch('threading.Thread')
     @patch('socket.socket')
-    def test_execute_command_clear_all(self, mock_socket):
+    def test_execute_command_list_page(self, mock_socket, mock_thread):
         app = CanvasApp(MagicMock())
+        app.connect(1.0)
+
+        app.execute_command("list line mine 10")
+
+        app.client_socket.sendall.assert_called_once_with(b"req 1 list line mine 10\n")
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_execute_command_list_more(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+        app.connect(1.0)
+        app.execute_command("list all all 10")
+        app.commands.list_cursor = "10"
+
+        app.execute_command("list more")
+
+        app.client_socket.sendall.assert_called_with(b"req 2 list all all 10 10\n")
+        self.assertIsNone(app.commands.list_cursor)
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_receive_data_treats_empty_read_as_disconnect(self, mock_socket, mock_thread):
+        recorder = MagicMock()
+        app = CanvasApp(MagicMock(), recorder=recorder)
+        app.connect(1.0)
+        app.client_socket.recv.return_value = b""
+
+        with patch.object(app, 'reinitialize_connection') as mock_reconnect:
+            # Stop after the first reconnect, since the receive thread carries on until the app closes
+            mock_reconnect.side_effect = lambda: setattr(app, "closing", True)
+            app.receive_data()
+
+        recorder.record_received.assert_not_called()
+        mock_reconnect.assert_called_once()
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_commands_before_connecting_are_held(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock(), backend=MemoryBackend(), client_tag="a")
+        mock_socket.assert_not_called()  # The receive thread connects, not the constructor
+        app.execute_command("tool line")
+        app.execute_command("colour 0 0 0")
+        app.execute_command("draw 1 2 3 4")
+        self.assertEqual(len(app.canvas), 1)
+
+        app.connect(1.0)
+
+        app.client_socket.sendall.assert_called_once_with(b"req 1 draw line a.1 1 2 3 4 0 0 0\n")
+        self.assertEqual(app.unsent, [])
+        self.assertTrue(app.connected.is_set())
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_record_pong(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+        app.ping_times = {"1": 10.0, "2": 10.5, "3": 11.0}
+
+        with patch('time.perf_counter', return_value=10.6):
+            app.record_pong("2")
+        self.assertAlmostEqual(app.stats["rtt_ms"], 100)
+        self.assertEqual(list(app.ping_times), ["3"])
+
+        app.ping_times["4"] = 11.5
+        with patch('time.perf_counter', return_value=11.9):
+            app.record_pong("4")
+        self.assertAlmostEqual(app.stats["rtt_ms"], 400)
+        self.assertAlmostEqual(app.stats["srtt_ms"], 100 + 0.125 * 300)
+        self.assertEqual(app.stats["pongs"], 2)
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_parse_frames_with_worker_pool(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+        # Stands in for the process pool, which cannot start its workers while threading.Thread is patched
+        app.parse_workers = 2
+        app.parse_pool = MagicMock()
+        app.parse_pool.map.side_effect = lambda func, items, chunksize: map(func, items)
+        frames = [f"draw line {i} 1 2 3 4 0 0 0" for i in range(10)]
+
+        with patch('canvas_app.PARALLEL_PARSE_THRESHOLD', 5):
+            operations = app.parse_frames(frames)
+
+        app.parse_pool.map.assert_called_once()
+        self.assertEqual(operations, [parse_command(frame) for frame in frames])
+        self.assertEqual(app.parse_frames(frames[:4]), [parse_command(frame) for frame in frames[:4]])
+        app.parse_pool.map.assert_called_once()
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_read_frames_buffers_partial_frame(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+
+        frames = list(app.read_frames("draw line 1 1 2 3 4 0 0 0\nEND\ndraw li"))
+        self.assertEqual(frames, ["draw line 1 1 2 3 4 0 0 0\n"])
+        frames = list(app.read_frames("ne 2 5 6 7 8 0 0 0\nEND\n"))
+        self.assertEqual(frames, ["draw line 2 5 6 7 8 0 0 0\n"])
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_read_frames_streams_list_reply(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+
+        frames = list(app.read_frames("list 1 => [line] [0 0 0] [1 2 3 4]\nlist 2 => [li"))
+        self.assertEqual(frames, ["list 1 => [line] [0 0 0] [1 2 3 4]"])
+        frames = list(app.read_frames("ne] [0 0 0] [5 6 7 8]\nEND\n"))
+        self.assertEqual(frames, ["list 2 => [line] [0 0 0] [5 6 7 8]\n"])
+
+    @patch('threading.Thread')
+    @patch('socket.socket')
+    def test_execute_command_clear_all(self, mock_socket, mock_thread):
+        app = CanvasApp(MagicMock())
+        app.connect(1.0)
         app.canvas = MagicMock()
-        app.user_commands = {1, 2, 3}
+        app.user_commands = {"a.1", "a.2", "a.3"}
         
         app.execute_command("clear all")
         
         app.canvas.delete.assert_called_once_with("all")
         self.assertEqual(app.user_commands, set())
-        app.client_socket.sendall.assert_called_once_with(b"clear all\n")
+        app.client_socket.sendall.assert_called_once_with(b"req 1 clear all\n")
 
+    @patch('threading.Thread')
     @patch('socket.socket')
-    def test_execute_command_clear_mine(self, mock_socket):
+    def test_execute_command_clear_mine(self, mock_socket, mock_thread):
         app = CanvasApp(MagicMock())
+        app.connect(1.0)
         app.canvas = MagicMock()
-        app.user_commands = {1, 2, 3}
+        for item, shape_id in enumerate(("a.1", "a.2", "a.3"), start=1):
+            app.commands.add_command(shape_id, f"draw line {shape_id} 1 2 3 4 0 0 0", item)
+        app.user_commands = {"a.1", "a.2", "a.3"}
         
         app.execute_command("clear mine")
         
-        for shape_id in {1, 2, 3}:
-            app.canvas.delete.assert_any_call(shape_id)
+        for item in (1, 2, 3):
+            app.canvas.delete.assert_any_call(item)
         self.assertEqual(app.user_commands, set())
+        self.assertEqual(app.commands.shapes, {})
         app.client_socket.sendall.assert_called_once()  
 
+    @patch('threading.Thread')
     @patch('socket.socket')
-    def test_execute_command_list(self, mock_socket):
+    def test_execute_command_list(self, mock_socket, mock_thread):
         app = CanvasApp(MagicMock())
+        app.connect(1.0)
         
         app.execute_command("list all all")
         
-        app.client_socket.sendall.assert_called_once_with(b"list all all\n")
+        app.client_socket.sendall.assert_called_once_with(b"req 1 list all all\n")
+
+class TestMemoryBackend(unittest.TestCase):
+    def setUp(self):
+        self.commands = Commands()
+        self.canvas = MemoryBackend()
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class LinesOnly(CanvasBackend):
+            def create_line(self, x1, y1, x2, y2, **options):
+                return 1
+
+        with self.assertRaises(TypeError):
+            LinesOnly()
+
+    def test_apply_draw_commands(self):
+        self.commands.apply_draw_command(self.canvas, "draw line 1 10 20 30 40 255 0 0")
+        self.commands.apply_draw_command(self.canvas, "draw circle 2 50 60 70 80 0 0 255")
+
+        self.assertEqual(len(self.canvas), 2)
+        self.assertEqual(self.canvas.type(1), "line")
+        self.assertEqual(self.canvas.coords(2), [50, 60, 70, 80])
+        self.assertEqual(self.canvas.itemcget(2, "outline"), "#0000ff")
+        self.assertEqual(self.canvas.find("oval"), [2])
+        self.assertEqual(self.canvas.find(bbox=(0, 0, 35, 35)), [1])
+
+    def test_modify_and_delete(self):
+        self.commands.apply_draw_command(self.canvas, "draw line 1 10 20 30 40 255 0 0")
+        self.commands.apply_draw_command(self.canvas, "modify 1 colour 0 255 0 draw 1 2 3 4")
+        self.assertEqual(self.canvas.itemcget(1, "fill"), "#00ff00")
+        self.assertEqual(self.canvas.coords(1), [1, 2, 3, 4])
+
+        self.commands.apply_draw_command(self.canvas, "delete 1")
+        self.assertEqual(len(self.canvas), 0)
+        self.assertIsNone(self.canvas.type(1))
+
+    def test_clear_all(self):
+        self.commands.apply_draw_command(self.canvas, "draw rectangle 1 10 20 30 40 255 0 0")
+        self.commands.apply_draw_command(self.canvas, "clear all")
+        self.assertEqual(self.canvas.find(), [])
+        self.assertEqual(self.canvas.create_line(0, 0, 1, 1), 2)
+
+    def test_deleted_items_do_not_pile_up(self):
+        for _ in range(10):
+            items = [self.canvas.create_line(i, i, i + 1, i + 1, fill="red") for i in range(100)]
+            self.canvas.delete("all")
+        self.assertEqual(len(self.canvas.types), 0)
+
+        items = [self.canvas.create_text(i, i, text=str(i), fill="orange") for i in range(100)]
+        self.assertEqual(items[0], 1001)
+        for item in items[:90]:
+            self.canvas.delete(item)
+        self.assertLessEqual(len(self.canvas.types), 2 * 10)
+        self.assertEqual(self.canvas.find(), items[90:])
+        self.assertEqual(self.canvas.coords(items[95]), [95.0, 95.0])
+        self.assertEqual(self.canvas.itemcget(items[95], "text"), "95")
+        self.assertEqual(self.canvas.itemcget(items[95], "fill"), "orange")
+        self.assertIsNone(self.canvas.type(items[0]))
+
+    def test_null_backend_assigns_ids(self):
+        canvas = NullBackend()
+        self.assertEqual(self.commands.apply_draw_command(canvas, "draw line 1 10 20 30 40 255 0 0"), 1)
+        self.assertEqual(self.commands.apply_draw_command(canvas, "draw line 2 10 20 30 40 255 0 0"), 2)
+
+class TestRaster(unittest.TestCase):
+    def setUp(self):
+        self.canvas = MemoryBackend()
+
+    def pixel(self, image, x, y):
+        return tuple(int(c) for c in image[y, x])
+
+    @unittest.skipIf(raster.np is None, "NumPy is not installed")
+    def test_shapes_are_drawn_as_outlines(self):
+        self.canvas.create_line(0, 5, 19, 5, fill="#ff0000")
+        self.canvas.create_rectangle(2, 8, 10, 14, outline="#00ff00")
+        self.canvas.create_oval(10, 0, 18, 8, outline="#0000ff")
+        image = raster.rasterise(self.canvas, 20, 16)
+
+        self.assertEqual(image.shape, (16, 20, 3))
+        self.assertEqual(self.pixel(image, 0, 5), (255, 0, 0))
+        self.assertEqual(self.pixel(image, 19, 5), (255, 0, 0))
+        self.assertEqual(self.pixel(image, 2, 11), (0, 255, 0))
+        self.assertEqual(self.pixel(image, 6, 14), (0, 255, 0))
+        self.assertEqual(self.pixel(image, 6, 11), (255, 255, 255))  # Outlines only
+        self.assertEqual(self.pixel(image, 18, 4), (0, 0, 255))
+        self.assertEqual(self.pixel(image, 14, 0), (0, 0, 255))
+        self.assertEqual(self.pixel(image, 14, 2), (255, 255, 255))
+
+    @unittest.skipIf(raster.np is None, "NumPy is not installed")
+    def test_later_shapes_cover_earlier_ones_across_types(self):
+        self.canvas.create_rectangle(0, 0, 10, 10, outline="#00ff00")
+        self.canvas.create_line(0, 0, 10, 0, fill="#ff0000")
+        self.canvas.create_rectangle(0, 0, 0, 10, outline="#0000ff")
+        image = raster.rasterise(self.canvas, 12, 12)
+
+        self.assertEqual(self.pixel(image, 5, 0), (255, 0, 0))
+        self.assertEqual(self.pixel(image, 0, 0), (0, 0, 255))
+        self.assertEqual(self.pixel(image, 10, 5), (0, 255, 0))
+
+    @unittest.skipIf(raster.np is None, "NumPy is not installed")
+    def test_text_is_drawn_as_a_box_and_hidden_items_are_skipped(self):
+        self.canvas.create_text(20, 10, text="ab", fill="black")
+        hidden = self.canvas.create_line(0, 0, 39, 0, fill="#ff0000")
+        self.canvas.itemconfig(hidden, state="hidden")
+        deleted = self.canvas.create_line(0, 19, 39, 19, fill="#ff0000")
+        self.canvas.delete(deleted)
+        image = raster.rasterise(self.canvas, 40, 20)
+
+        half_width = raster.CHAR_WIDTH  # Two characters
+        self.assertEqual(self.pixel(image, 20 - half_width, 10), (0, 0, 0))
+        self.assertEqual(self.pixel(image, 20 + half_width, 10), (0, 0, 0))
+        self.assertEqual(self.pixel(image, 20, 10), (255, 255, 255))
+        self.assertEqual(self.pixel(image, 5, 0), (255, 255, 255))
+        self.assertEqual(self.pixel(image, 5, 19), (255, 255, 255))
+
+    @unittest.skipIf(raster.np is None, "NumPy is not installed")
+    def test_thumbnail_from_commands(self):
+        commands = Commands()
+        commands.shapes["a.1"] = "draw line a.1 0 100 399 100 255 0 0"
+        commands.shapes["a.2"] = "draw line a.2 200 0 200 199 0 0 255"
+        image = raster.rasterise(raster.backend_from_commands(commands), 400, 200, scale=0.25)
+
+        self.assertEqual(image.shape, (50, 100, 3))
+        self.assertEqual(self.pixel(image, 10, 25), (255, 0, 0))
+        self.assertEqual(self.pixel(image, 50, 10), (0, 0, 255))
+        self.assertEqual(self.pixel(image, 50, 25), (0, 0, 255))
+
+    @unittest.skipIf(raster.np is None, "NumPy is not installed")
+    def test_image_encodings(self):
+        self.canvas.create_line(0, 0, 2, 0, fill="#ff0000")
+        image = raster.rasterise(self.canvas, 3, 2)
+
+        ppm = raster.encode_ppm(image)
+        self.assertEqual(ppm[:11], b"P6\n3 2\n255\n")
+        self.assertEqual(ppm[11:], bytes([255, 0, 0] * 3 + [255, 255, 255] * 3))
+
+        png = raster.encode_png(image)
+        self.assertEqual(png[:8], b"\x89PNG\r\n\x1a\n")
+        self.assertEqual(png[12:16], b"IHDR")
+        self.assertEqual(int.from_bytes(png[16:20], "big"), 3)
+        self.assertEqual(int.from_bytes(png[20:24], "big"), 2)
+        idat = png.index(b"IDAT")
+        length = int.from_bytes(png[idat - 4:idat], "big")
+        rows = zlib.decompress(png[idat + 4:idat + 4 + length])
+        self.assertEqual(rows, b"\x00" + ppm[11:20] + b"\x00" + ppm[20:])
+
+class TestEndpoints(unittest.TestCase):
+    def test_parse_endpoints(self):
+        self.assertEqual(parse_endpoints("10.0.0.1:7000, localhost,:6002"),
+                         [("10.0.0.1", 7000), ("localhost", 6001), ("127.0.0.1", 6002)])
+
+    def test_hash_ring_is_stable_and_moves_few_boards(self):
+        servers = [("127.0.0.1", port) for port in (6001, 6002, 6003)]
+        ring = HashRing(servers)
+        boards = [f"board-{i}" for i in range(1000)]
+        owners = {board: ring.owner(board) for board in boards}
+
+        self.assertEqual(owners, {board: HashRing(list(reversed(servers))).owner(board) for board in boards})
+        self.assertEqual(sorted(ring.preference("board-0")), sorted(servers))
+        for server in servers:
+            self.assertGreater(list(owners.values()).count(server), 200)
+
+        added = ("127.0.0.1", 6004)
+        grown = HashRing(servers + [added])
+        moved = [board for board in boards if grown.owner(board) != owners[board]]
+        self.assertTrue(all(grown.owner(board) == added for board in moved))
+        self.assertLess(len(moved), 400)
+
+        # When a board's owner is removed, it moves to the next server on the ring
+        board = boards[0]
+        shrunk = HashRing([server for server in servers if server != owners[board]])
+        self.assertEqual(shrunk.owner(board), ring.preference(board)[1])
+
+    @patch('time.monotonic')
+    def test_failed_endpoints_back_off(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        health = EndpointHealth(backoff=1.0, max_backoff=4.0)
+        a, b = ("127.0.0.1", 6001), ("127.0.0.1", 6002)
+
+        health.record_failure(a, "refused")
+        self.assertEqual(health.ranked([a, b]), [b, a])
+        mock_monotonic.return_value = 101.0
+        self.assertTrue(health.is_healthy(a))
+        self.assertEqual(health.ranked([a, b]), [b, a])  # Still ranked by its failures in a row
+
+        health.record_failure(a, "refused")
+        health.record_failure(a, "refused")
+        health.record_failure(a, "refused")
+        self.assertEqual(health.get(a)["retry_at"], 105.0)
+        health.record_success(a, 0.002)
+        self.assertEqual(health.ranked([a, b]), [a, b])
+        self.assertEqual(health.get(a)["connect_ms"], 2.0)
+        self.assertEqual(health.get(a)["failures"], 4)
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_regressions_beyond_the_threshold_fail(self):
+        baseline = [{"benchmark": "redraw", "size": 1000, "score": 1.0},
+                    {"benchmark": "redraw", "size": 10000, "score": 1.0}]
+        results = [{"benchmark": "redraw", "size": 1000, "score": 1.4},
+                   {"benchmark": "redraw", "size": 10000, "score": 1.6},
+                   {"benchmark": "list_commands", "size": 1000, "score": 9.0}]
+
+        comparisons = compare_to_baseline(results, baseline, threshold=0.5)
+
+        self.assertEqual([(c["size"], c["regressed"], c["missing"]) for c in comparisons],
+                         [(1000, False, False), (10000, True, False), (1000, False, True)])
+        self.assertAlmostEqual(comparisons[1]["ratio"], 1.6)
+        self.assertIsNone(comparisons[2]["ratio"])
+
+    def test_missing_baselines_fail(self):
+        results = [{"benchmark": "redraw", "size": 10, "score": 1.0, "ns_per_op": 100.0}]
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()), \
+                patch("benchmarks.run_suite", return_value=results):
+            path = os.path.join(tmp_dir, "baseline.json")
+            self.assertFalse(bench_suite([10], None, 1, path, 0.5))
+            self.assertTrue(bench_suite([10], None, 1, path, 0.5, update_baseline=True))
+            self.assertTrue(bench_suite([10], None, 1, path, 0.5))
+
+            results.append({"benchmark": "redraw", "size": 100, "score": 1.0, "ns_per_op": 100.0})
+            self.assertFalse(bench_suite([10, 100], None, 1, path, 0.5))
+
+    def test_every_benchmark_runs(self):
+        with patch("benchmarks.MIN_SUITE_OPERATIONS", 10):
+            results = run_suite([10], repeat=1)
+        self.assertEqual([result["benchmark"] for result in results], list(MICROBENCHMARKS))
+        for result in results:
+            self.assertGreater(result["score"], 0)
+            self.assertEqual(result["size"], 10)
+
+class TestSessionReplayer(unittest.TestCase):
+    def test_replay_waits_for_the_matching_ack(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "session.rec")
+            recorder = SessionRecorder(path)
+            recorder.record_sent(b"req 1 draw line a.1 1 2 3 4 0 0 0\n")
+            recorder.record_sent(b"draw line a.2 1 2 3 4 0 0 0\n")
+            recorder.close()
+
+            sock = MagicMock()
+            sock.__enter__.return_value = sock
+            sock.recv.side_effect = [b"ack 0 ok 1\nEND\n", b"ver 2 delete b.1\nEND\nack 1 ok 3\nEND\n",
+                                     b"Command processed successfully.\nEND\n"]
+            with patch("socket.create_connection", return_value=sock):
+                result = SessionReplayer(path).replay_to_server(("127.0.0.1", 6001))
+
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(sock.recv.call_count, 3)
+
+    def test_expected_acks(self):
+        self.assertEqual(expected_acks(b"req 4 draw line a.1 1 2 3 4 0 0 0\nreq 5\nclear mine\n"), ({"4", "5"}, 1))
+
+class TestRelay(unittest.TestCase):
+    def setUp(self):
+        self.relay = Relay("127.0.0.1", 6001)
+
+    def test_update_board_and_snapshot(self):
+        self.relay.update_board("draw line a.1 10 20 30 40 255 0 0\n")
+        self.relay.update_board("draw circle b.1 1 2 3 4 0 0 255\n")
+        self.relay.update_board("modify a.1 colour 0 255 0\n")
+        self.relay.update_board("delete b.1")
+
+        self.assertEqual(self.relay.snapshot(), "draw line a.1 10 20 30 40 255 0 0\nEND\nmodify a.1 colour 0 255 0\nEND\n")
+
+        self.relay.update_board("clear all")
+        self.assertEqual(self.relay.snapshot(), "")
+
+    def test_is_list_reply(self):
+        self.assertTrue(is_list_reply(""))
+        self.assertTrue(is_list_reply("list 1 => [line] [0 0 0] [1 2 3 4]\nlist next 1\n"))
+        self.assertFalse(is_list_reply("list all all\n"))
+        self.assertFalse(is_list_reply("draw line 1 1 2 3 4 0 0 0\n"))
+
+    def viewer(self):
+        writer = MagicMock()
+        writer.is_closing.return_value = False
+        writer.transport.get_write_buffer_size.return_value = 0
+        return writer
+
+    def test_route_reply_to_requesting_viewer(self):
+        requester, other = self.viewer(), self.viewer()
+        self.relay.viewers = {requester, other}
+        self.relay.upstream_writer = MagicMock()
+        self.relay.handle_viewer_message(requester, "list all all")
+
+        self.relay.route_upstream_frame("list 1 => [line] [0 0 0] [1 2 3 4]\n")
+        self.relay.route_upstream_frame("Command processed successfully.\n")
+        self.relay.route_upstream_frame("draw line 2 1 2 3 4 0 0 0\n")
+
+        self.assertEqual(requester.write.call_count, 3)
+        other.write.assert_called_once_with(b"draw line 2 1 2 3 4 0 0 0\nEND\n")
+        self.assertFalse(self.relay.in_flight)
+
+    def test_requests_are_pipelined_and_acked_by_id(self):
+        first, second = self.viewer(), self.viewer()
+        self.relay.viewers = {first, second}
+        self.relay.upstream_writer = MagicMock()
+
+        # Both viewers pick request id 1, so the relay sends them with ids of its own
+        self.relay.handle_viewer_message(first, "req 1 draw line a.1 1 2 3 4 0 0 0")
+        self.relay.handle_viewer_message(second, "req 1 draw line b.1 5 6 7 8 0 0 0")
+        self.relay.handle_viewer_message(first, "req 2 list all all")
+        self.assertEqual([call.args[0] for call in self.relay.upstream_writer.write.call_args_list],
+                         [b"req 1 draw line a.1 1 2 3 4 0 0 0\n", b"req 2 draw line b.1 5 6 7 8 0 0 0\n",
+                          b"req 3 list all all\n"])
+
+        self.relay.route_upstream_frame("ack 1 ok 10\n")
+        self.relay.route_upstream_frame("ack 2 invalid\n")
+        self.relay.route_upstream_frame("list a.1 => [line] [0 0 0] [1 2 3 4]\n")
+        self.relay.route_upstream_frame("ack 3 ok 0\n")
+
+        self.assertEqual([call.args[0] for call in first.write.call_args_list],
+                         [b"ack 1 ok 10\nEND\n", b"draw line b.1 5 6 7 8 0 0 0\nEND\n",
+                          b"list a.1 => [line] [0 0 0] [1 2 3 4]\nEND\n", b"ack 2 ok 0\nEND\n"])
+        self.assertEqual([call.args[0] for call in second.write.call_args_list],
+                         [b"ver 10 draw line a.1 1 2 3 4 0 0 0\nEND\n", b"ack 1 invalid\nEND\n"])
+        self.assertFalse(self.relay.requests)
+
+    def test_messages_without_ids_wait_for_earlier_acks(self):
+        sender = self.viewer()
+        self.relay.viewers = {sender}
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "req 1 draw line a.1 1 2 3 4 0 0 0")
+        self.relay.handle_viewer_message(sender, "draw line a.2 1 2 3 4 0 0 0")
+        self.relay.handle_viewer_message(sender, "req 2 draw line a.3 1 2 3 4 0 0 0")
+        self.relay.upstream_writer.write.assert_called_once_with(b"req 1 draw line a.1 1 2 3 4 0 0 0\n")
+
+        self.relay.route_upstream_frame("ack 1 ok 1\n")
+        self.relay.upstream_writer.write.assert_called_with(b"draw line a.2 1 2 3 4 0 0 0\n")
+        self.relay.route_upstream_frame("Command processed successfully.\n")
+        self.relay.upstream_writer.write.assert_called_with(b"req 2 draw line a.3 1 2 3 4 0 0 0\n")
+
+    def test_one_message_upstream_at_a_time(self):
+        sender, other = self.viewer(), self.viewer()
+        self.relay.viewers = {sender, other}
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "draw line 1 1 2 3 4 0 0 0")
+        self.relay.handle_viewer_message(sender, "draw line 2 5 6 7 8 0 0 0")
+        self.relay.upstream_writer.write.assert_called_once_with(b"draw line 1 1 2 3 4 0 0 0\n")
+        other.write.assert_not_called()
+
+        self.relay.route_upstream_frame("Command processed successfully.\n")
+        self.relay.upstream_writer.write.assert_called_with(b"draw line 2 5 6 7 8 0 0 0\n")
+        other.write.assert_called_once_with(b"draw line 1 1 2 3 4 0 0 0\nEND\n")
+
+    def test_acked_broadcast_is_stamped(self):
+        sender, other = self.viewer(), self.viewer()
+        self.relay.viewers = {sender, other}
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "req 7 draw line a.1 1 2 3 4 0 0 0")
+        self.relay.upstream_writer.write.assert_called_once_with(b"req 1 draw line a.1 1 2 3 4 0 0 0\n")
+        self.relay.route_upstream_frame("ack 1 ok 12\n")
+
+        sender.write.assert_called_once_with(b"ack 7 ok 12\nEND\n")
+        other.write.assert_called_once_with(b"ver 12 draw line a.1 1 2 3 4 0 0 0\nEND\n")
+        self.assertEqual(self.relay.snapshot(), "ver 12 draw line a.1 1 2 3 4 0 0 0\nEND\n")
+
+    def test_ping_is_answered_by_the_relay(self):
+        sender = self.viewer()
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "ping 9")
+
+        self.relay.upstream_writer.write.assert_not_called()
+        sender.write.assert_called_once_with(b"pong 9\nEND\n")
+
+    def test_view_is_acked_by_the_relay(self):
+        sender = self.viewer()
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "req 4 view 0 0 10 10")
+
+        self.relay.upstream_writer.write.assert_not_called()
+        sender.write.assert_called_once_with(b"ack 4 ok 0\nEND\n")
+
+    def test_view_filters_the_fan_out(self):
+        subscriber, other = self.viewer(), self.viewer()
+        self.relay.viewers = {subscriber, other}
+        self.relay.upstream_writer = MagicMock()
+        self.relay.update_board("ver 1 draw line a.1 10 10 20 20 0 0 0\n")
+        self.relay.update_board("ver 2 draw text b.1 500 500 'far away' 0 0 0\n")
+
+        self.relay.handle_viewer_message(subscriber, "req 1 view 0 0 100 100")
+        self.assertEqual([c.args[0] for c in subscriber.write.call_args_list],
+                         [b"ver 1 draw line a.1 10 10 20 20 0 0 0\nEND\n", b"ack 1 ok 0\nEND\n"])
+        subscriber.write.reset_mock()
+
+        self.relay.route_upstream_frame("ver 3 draw line c.1 300 300 400 400 0 0 0\n")
+        self.relay.route_upstream_frame("ver 4 modify b.1 draw 50 50 0 0\n")
+        self.relay.route_upstream_frame("ver 5 delete c.1\n")
+
+        self.assertEqual([c.args[0] for c in subscriber.write.call_args_list],
+                         [b"ver 4 draw text b.1 50 50 'far away' 0 0 0\nEND\n", b"ver 5 delete c.1\nEND\n"])
+        self.assertEqual(other.write.call_count, 3)
+
+        self.relay.handle_viewer_message(subscriber, "req 2 view all")
+        self.relay.route_upstream_frame("ver 6 draw line d.1 300 300 400 400 0 0 0\n")
+        self.assertEqual(subscriber.write.call_args.args[0], b"ver 6 draw line d.1 300 300 400 400 0 0 0\nEND\n")
+
+    def test_malformed_view_is_sent_to_the_server(self):
+        sender = self.viewer()
+        self.relay.viewers = {sender}
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "req 4 view 0 0 ten 10")
+
+        self.relay.upstream_writer.write.assert_called_once()
+        self.assertEqual(self.relay.views, {})
+
+    def test_clear_mine_without_shapes_is_acked(self):
+        sender = self.viewer()
+        self.relay.viewers = {sender}
+        self.relay.upstream_writer = MagicMock()
+
+        self.relay.handle_viewer_message(sender, "clear mine")
+
+        self.relay.upstream_writer.write.assert_not_called()
+        sender.write.assert_called_once_with(b"Command processed successfully.\nEND\n")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
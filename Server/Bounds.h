@@ -0,0 +1,43 @@
+#ifndef BOUNDS_H
+#define BOUNDS_H
+
+#include <algorithm>
+
+/**
+ * @struct Bounds
+ * @brief An axis-aligned rectangle on the canvas.
+ *
+ * Used for the region a client has subscribed to and for the area an update touches. A default
+ * constructed Bounds is empty and intersects nothing; including a rectangle grows it to cover it.
+ */
+struct Bounds {
+    bool empty = true;
+    int x1 = 0, y1 = 0, x2 = 0, y2 = 0;
+
+    Bounds() {}
+    Bounds(int ax1, int ay1, int ax2, int ay2) { include(ax1, ay1, ax2, ay2); }
+
+    void include(int ax1, int ay1, int ax2, int ay2) {
+        int left = std::min(ax1, ax2), right = std::max(ax1, ax2);
+        int top = std::min(ay1, ay2), bottom = std::max(ay1, ay2);
+        if (empty) {
+            x1 = left; y1 = top; x2 = right; y2 = bottom;
+            empty = false;
+        } else {
+            x1 = std::min(x1, left); y1 = std::min(y1, top);
+            x2 = std::max(x2, right); y2 = std::max(y2, bottom);
+        }
+    }
+
+    void include(const Bounds& other) {
+        if (!other.empty) {
+            include(other.x1, other.y1, other.x2, other.y2);
+        }
+    }
+
+    bool intersects(const Bounds& other) const {
+        return !empty && !other.empty && x1 <= other.x2 && other.x1 <= x2 && y1 <= other.y2 && other.y1 <= y2;
+    }
+};
+
+#endif // BOUNDS_H
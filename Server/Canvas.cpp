@@ -1,29 +1,88 @@
 #include "Canvas.h"
 
+/**
+ * @brief Adds a command key to the type, client and shape id indexes.
+ *
+ * @param key The key of the command in the `commands` map.
+ * @param cmd The command being indexed.
+ */
+void Canvas::indexCommand(int key, const DrawCommand& cmd) {
+    type_index[cmd.type].insert(key);
+    fd_index[cmd.fd].insert(key);
+    id_keys[cmd.id] = key;
+}
+
+/**
+ * @brief Removes a command key from the type, client and shape id indexes.
+ *
+ * Empty index entries are erased so that the indexes do not grow with every client that ever connected.
+ *
+ * @param key The key of the command in the `commands` map.
+ * @param cmd The command being removed from the indexes.
+ */
+void Canvas::unindexCommand(int key, const DrawCommand& cmd) {
+    auto type_it = type_index.find(cmd.type);
+    if (type_it != type_index.end()) {
+        type_it->second.erase(key);
+        if (type_it->second.empty()) {
+            type_index.erase(type_it);
+        }
+    }
+    auto fd_it = fd_index.find(cmd.fd);
+    if (fd_it != fd_index.end()) {
+        fd_it->second.erase(key);
+        if (fd_it->second.empty()) {
+            fd_index.erase(fd_it);
+        }
+    }
+    id_keys.erase(cmd.id);
+}
+
 /**
  * @brief Adds a draw command to the canvas.
  *
  * This function adds a draw command to the canvas. The draw command is stored in the `commands` map
- * with a unique ID. The ID is incremented after each command is added.
+ * under the next key, which keeps commands in the order they arrived. A command whose shape id is
+ * already on the canvas replaces the existing one in place.
  *
  * @param cmd The draw command to be added.
+ * @return The version stamped on the shape.
  */
-void Canvas::addCommand(const DrawCommand& cmd) {
+long Canvas::addCommand(const DrawCommand& cmd) {
     lock_guard<mutex> lock(mtx);
-    commands[next_id++] = cmd;
+    auto existing = id_keys.find(cmd.id);
+    int key;
+    if (existing != id_keys.end()) {
+        key = existing->second;
+        unindexCommand(key, commands[key]);
+    } else {
+        key = next_id++;
+    }
+    commands[key] = cmd;
+    commands[key].version = next_version++;
+    indexCommand(key, cmd);
+    return commands[key].version;
 }
 
 /**
  * @brief Removes a command from the canvas.
  * 
- * This function removes a command with the specified ID from the canvas.
+ * This function removes the command with the specified shape id from the canvas.
  * The command is erased from the `commands` container.
  * 
- * @param id The ID of the command to be removed.
+ * @param id The shape id of the command to be removed.
+ * @return The version stamped on the removal, or 0 if there was no such shape.
  */
-void Canvas::removeCommand(int id) {
+long Canvas::removeCommand(const string& id) {
     lock_guard<mutex> lock(mtx);
-    commands.erase(id);
+    auto key = id_keys.find(id);
+    if (key == id_keys.end()) {
+        return 0;
+    }
+    auto it = commands.find(key->second);
+    unindexCommand(it->first, it->second);
+    commands.erase(it);
+    return next_version++;
 }
 
 /**
@@ -32,25 +91,49 @@ void Canvas::removeCommand(int id) {
  * This function modifies a draw command in the canvas by replacing it with a new command.
  * The original type and ID of the command are preserved in the updated command.
  * 
- * @param id The ID of the command to be modified.
+ * @param id The shape id of the command to be modified.
  * @param newCmd The new draw command to replace the existing command.
+ * @return The version stamped on the shape, or 0 if there was no such shape.
  */
-void Canvas::modifyCommand(int id, const DrawCommand& newCmd) {
+long Canvas::modifyCommand(const string& id, const DrawCommand& newCmd) {
     lock_guard<mutex> lock(mtx);
-    auto it = commands.find(id);
-    if (it != commands.end()) {
+    auto key = id_keys.find(id);
+    if (key != id_keys.end()) {
+        auto it = commands.find(key->second);
         // Preserve the original type and ID
         DrawCommand updatedCmd = newCmd;
         updatedCmd.type = it->second.type;
         updatedCmd.id = id;
+        updatedCmd.version = next_version++;
         
-        // Update the command
+        // Update the command, re-indexing it in case its owner changed
+        int commandKey = it->first;
+        unindexCommand(commandKey, it->second);
         it->second = updatedCmd;
+        indexCommand(commandKey, updatedCmd);
         
         cout << "Command with ID " << id << " has been modified." << endl;
-    } else {
-        cout << "Command with ID " << id << " not found." << endl;
+        return updatedCmd.version;
     }
+    cout << "Command with ID " << id << " not found." << endl;
+    return 0;
+}
+
+/**
+ * Copies the stored command for a shape.
+ *
+ * @param id The shape id of the command.
+ * @param cmd Receives a copy of the command.
+ * @return true if the shape is on the canvas, false otherwise.
+ */
+bool Canvas::getCommand(const string& id, DrawCommand& cmd) const {
+    lock_guard<mutex> lock(mtx);
+    auto key = id_keys.find(id);
+    if (key == id_keys.end()) {
+        return false;
+    }
+    cmd = commands.at(key->second);
+    return true;
 }
 
 /**
@@ -79,84 +162,194 @@ void Canvas::printCommands() const {
 }
 
 /**
- * Sends the current commands to the specified file descriptor.
- * 
- * This function iterates over the commands stored in the Canvas object and sends them to the specified file descriptor.
- * Each command is formatted as a string and sent using the send() function.
- * The format of the command string depends on the type of command.
+ * Formats a command as the END-framed draw command that recreates it.
+ *
  * If the command type is "text", the string includes the command type, ID, coordinates, text, and color information.
  * If the command type is not "text", the string includes the command type, ID, coordinates, and color information.
- * The command string is terminated with the "END" delimiter.
+ * The command string is prefixed with "ver <version>", the shape's version stamp, and terminated with the "END" delimiter.
+ *
+ * @param cmd The command to be formatted.
+ * @return The framed draw command.
+ */
+string Canvas::formatDraw(const DrawCommand& cmd) {
+    string response = "ver " + to_string(cmd.version) + " draw ";
+    if (cmd.type == "text") {
+        response += cmd.type + " " + 
+                    cmd.id + " " + 
+                    to_string(cmd.x1) + " " + 
+                    to_string(cmd.y1) + " '" + 
+                    cmd.text + "' " + 
+                    to_string(cmd.r) + " " + 
+                    to_string(cmd.g) + " " + 
+                    to_string(cmd.b) + "\n";
+    } else {
+        response += cmd.type + " " + 
+                    cmd.id + " " + 
+                    to_string(cmd.x1) + " " + 
+                    to_string(cmd.y1) + " " + 
+                    to_string(cmd.x2) + " " + 
+                    to_string(cmd.y2) + " " + 
+                    to_string(cmd.r) + " " + 
+                    to_string(cmd.g) + " " + 
+                    to_string(cmd.b) + "\n";
+    }
+    response += "END\n";  // Add delimiter
+    return response;
+}
+
+/**
+ * Returns the area of the canvas a command covers.
+ *
+ * Text is anchored at a single point, so its bounds are that point.
+ *
+ * @param cmd The command.
+ * @return The bounds of the command.
+ */
+Bounds Canvas::commandBounds(const DrawCommand& cmd) {
+    if (cmd.type == "text") {
+        return Bounds(cmd.x1, cmd.y1, cmd.x1, cmd.y1);
+    }
+    return Bounds(cmd.x1, cmd.y1, cmd.x2, cmd.y2);
+}
+
+/**
+ * Formats the current commands as a snapshot for a newly connected client.
+ * 
+ * This function iterates over the commands stored in the Canvas object and formats each of them with `formatDraw`.
+ * 
+ * The commands are formatted while holding the canvas mutex, and the caller queues the snapshot on the
+ * client's output buffer, so a slow client does not block every other client from updating the canvas.
  * 
- * @param fd The file descriptor to send the commands to.
+ * @return The snapshot, one END-framed draw command per stored command.
  */
-void Canvas::sendCurrentCommands(int fd) const {
-    lock_guard<std::mutex> lock(mtx);
-    for (const auto& [id, cmd] : commands) {
-        string response = "draw ";
-        if (cmd.type == "text") {
-            response += cmd.type + " " + 
-                        to_string(cmd.id) + " " + 
-                        to_string(cmd.x1) + " " + 
-                        to_string(cmd.y1) + " '" + 
-                        cmd.text + "' " + 
-                        to_string(cmd.r) + " " + 
-                        to_string(cmd.g) + " " + 
-                        to_string(cmd.b) + "\n";
-        } else {
-            response += cmd.type + " " + 
-                        to_string(cmd.id) + " " + 
-                        to_string(cmd.x1) + " " + 
-                        to_string(cmd.y1) + " " + 
-                        to_string(cmd.x2) + " " + 
-                        to_string(cmd.y2) + " " + 
-                        to_string(cmd.r) + " " + 
-                        to_string(cmd.g) + " " + 
-                        to_string(cmd.b) + "\n";
+string Canvas::snapshotCommands() const {
+    string snapshot;
+    {
+        lock_guard<std::mutex> lock(mtx);
+        for (const auto& [id, cmd] : commands) {
+            snapshot += formatDraw(cmd);
         }
-        response += "END\n";  // Add delimiter
-        send(fd, response.c_str(), response.size(), 0);
     }
+    return snapshot;
+}
+
+/**
+ * Formats the commands that intersect a region, for a client that has just subscribed to it.
+ *
+ * @param region The region the client subscribed to.
+ * @return One END-framed draw command per stored command that intersects the region.
+ */
+string Canvas::snapshotRegion(const Bounds& region) const {
+    string snapshot;
+    {
+        lock_guard<std::mutex> lock(mtx);
+        for (const auto& [id, cmd] : commands) {
+            if (commandBounds(cmd).intersects(region)) {
+                snapshot += formatDraw(cmd);
+            }
+        }
+    }
+    return snapshot;
+}
+
+/**
+ * Formats a command as a single line of a list reply.
+ *
+ * @param cmd The command to be formatted.
+ * @return The list line for the command, terminated by a newline.
+ */
+string Canvas::formatListEntry(const DrawCommand& cmd) {
+    ostringstream oss;
+    oss << "list " << cmd.id << " => [" << cmd.type << "] [" << cmd.r << " " << cmd.g << " " << cmd.b << "] ";
+    if (cmd.type == "text") {
+        oss << "[" << cmd.x1 << " " << cmd.y1 << "] *\"" << cmd.text << "\"*\n";
+    } else {
+        oss << "[" << cmd.x1 << " " << cmd.y1 << " " << cmd.x2 << " " << cmd.y2 << "]\n";
+    }
+    return oss.str();
 }
 
 /**
- * Sends filtered commands to a specified file descriptor.
+ * Formats a page of filtered commands for a specified client.
  *
- * This function sends filtered commands from the `commands` container to the specified file descriptor `fd`.
+ * This function formats filtered commands from the `commands` container for the client with the file descriptor `fd`.
  * The commands are filtered based on the tool and user filters provided as arguments.
  * If the tool filter is set to "all", all commands will be considered.
  * If the user filter is set to "all", all users' commands will be considered.
  * If the user filter is set to "mine", only the commands from the user associated with the specified file descriptor `fd` will be considered.
  *
- * @param fd The file descriptor to send the filtered commands to.
+ * Matches are looked up through the type and client indexes rather than a scan of every command, starting
+ * after the `after` cursor. At most `limit` entries are included; if more matches remain, a "list next <cursor>"
+ * line is added so the client can ask for the following page. The reply is built under the canvas mutex
+ * and queued by the caller once the lock has been released.
+ *
+ * @param fd The file descriptor of the client asking for the list.
  * @param toolFilter The tool filter to apply. Set to "all" to consider all tools.
  * @param userFilter The user filter to apply. Set to "all" to consider all users' commands, or "mine" to consider only the commands from the user associated with the specified file descriptor `fd`.
+ * @param limit The maximum number of entries to include.
+ * @param after The cursor of the previous page. Only commands with a greater key are included.
+ * @return The list reply, terminated by the END marker.
  */
-void Canvas::sendFilteredCommands(int fd, const string& toolFilter, const string& userFilter) const {
-    lock_guard<std::mutex> lock(mtx);
+string Canvas::listFilteredCommands(int fd, const string& toolFilter, const string& userFilter, size_t limit, int after) const {
+    static const set<int> no_matches;
+    string response;
+    {
+        lock_guard<std::mutex> lock(mtx);
 
-    int matchCount = 0;
-    for (const auto& [id, cmd] : commands) {
-        
-        bool toolMatch = (toolFilter == "all" || cmd.type == toolFilter);
-        bool userMatch = (userFilter == "all" || (userFilter == "mine" && cmd.fd == fd));
+        bool filterTool = toolFilter != "all";
+        bool filterUser = userFilter != "all";
 
-        if (toolMatch && userMatch) {
+        // Pick the smallest index that covers every match
+        const set<int>* candidates = nullptr;
+        if (filterTool) {
+            auto it = type_index.find(toolFilter);
+            candidates = it != type_index.end() ? &it->second : &no_matches;
+        }
+        if (filterUser) {
+            auto it = fd_index.find(fd);
+            const set<int>* owned = (userFilter == "mine" && it != fd_index.end()) ? &it->second : &no_matches;
+            if (candidates == nullptr || owned->size() < candidates->size()) {
+                candidates = owned;
+            }
+        }
+
+        size_t matchCount = 0;
+        int lastKey = after;
+        auto visit = [&](int key, const DrawCommand& cmd) {
+            bool toolMatch = (!filterTool || cmd.type == toolFilter);
+            bool userMatch = (!filterUser || cmd.fd == fd);
+            if (!toolMatch || !userMatch) {
+                return true;
+            }
+            if (matchCount == limit) {
+                // There is at least one more match, so point the client at the next page
+                response += "list next " + to_string(lastKey) + "\n";
+                return false;
+            }
             matchCount++;
-            ostringstream oss;
-            oss << "list " << cmd.id << " => [" << cmd.type << "] [" << cmd.r << " " << cmd.g << " " << cmd.b << "] ";
-            if (cmd.type == "text") {
-                oss << "[" << cmd.x1 << " " << cmd.y1 << "] *\"" << cmd.text << "\"*\n";
-            } else {
-                oss << "[" << cmd.x1 << " " << cmd.y1 << " " << cmd.x2 << " " << cmd.y2 << "]\n";
+            lastKey = key;
+            response += formatListEntry(cmd);
+            return true;
+        };
+
+        if (candidates == nullptr) {
+            for (auto it = commands.upper_bound(after); it != commands.end(); ++it) {
+                if (!visit(it->first, it->second)) {
+                    break;
+                }
+            }
+        } else {
+            for (auto it = candidates->upper_bound(after); it != candidates->end(); ++it) {
+                if (!visit(*it, commands.at(*it))) {
+                    break;
+                }
             }
-            string response = oss.str();
-            ssize_t sent = send(fd, response.c_str(), response.size(), 0);
         }
     }
 
-    // Send END marker
-    ssize_t sent = send(fd, "END\n", 4, 0);
+    // Add END marker
+    response += "END\n";
+    return response;
 }
 
 /**
@@ -165,6 +358,9 @@ void Canvas::sendFilteredCommands(int fd, const string& toolFilter, const string
 void Canvas::clearAll() {
     lock_guard<mutex> lock(mtx);
     commands.clear();
+    type_index.clear();
+    fd_index.clear();
+    id_keys.clear();
     next_id = 1;  // Reset the next_id to 1
     cout << "All commands cleared from the canvas" << endl;
 }
@@ -178,12 +374,18 @@ void Canvas::clearAll() {
  */
 void Canvas::clearClientCommands(int fd) {
     lock_guard<mutex> lock(mtx);
-    for (auto it = commands.begin(); it != commands.end();) {
-        if (it->second.fd == fd) {
-            it = commands.erase(it);
-        } else {
-            ++it;
+    auto owned = fd_index.find(fd);
+    if (owned != fd_index.end()) {
+        for (int key : owned->second) {
+            auto it = commands.find(key);
+            type_index[it->second.type].erase(key);
+            if (type_index[it->second.type].empty()) {
+                type_index.erase(it->second.type);
+            }
+            id_keys.erase(it->second.id);
+            commands.erase(it);
         }
+        fd_index.erase(owned);
     }
     cout << "Client commands cleared from the canvas" << endl;
 }
@@ -10,8 +10,14 @@
 #include <cstring>
 #include <chrono>
 #include <map>
+#include <set>
+#include <unordered_map>
 #include <vector>
 #include <mutex>
+#include "Bounds.h"
+
+#define LIST_PAGE_SIZE 100
+#define MAX_LIST_PAGE_SIZE 1000
 
 using namespace std;
 
@@ -22,30 +28,43 @@ using namespace std;
  * This struct contains information about a drawing command, including its unique identifier, type, coordinates, text (if applicable), color, and the file descriptor of the client that sent the command.
  */
 struct DrawCommand {
-    int id; // Unique identifier for the command
+    string id; // Globally unique shape id chosen by the client that drew it
     string type; // Type of command 
     int x1, y1, x2, y2; // Coordinates for the command
     string text; // Text for the command (if applicable)
     int r, g, b; // Color for the command
     int fd; // File descriptor of the client that sent the command
+    long version = 0; // Stamp of the last change to the shape; later changes have higher stamps
 };
 
 class Canvas {
 public:
-    void addCommand(const DrawCommand& cmd);
-    void removeCommand(int id);
-    void modifyCommand(int id, const DrawCommand& newCmd);
+    long addCommand(const DrawCommand& cmd);
+    long removeCommand(const string& id);
+    long modifyCommand(const string& id, const DrawCommand& newCmd);
+    bool getCommand(const string& id, DrawCommand& cmd) const;
     vector<DrawCommand> getCommands() const;
     void printCommands() const;
-    void sendCurrentCommands(int fd) const;
-    void sendFilteredCommands(int fd, const string& toolFilter, const string& userFilter) const;
+    string snapshotCommands() const;
+    string snapshotRegion(const Bounds& region) const;
+    static string formatDraw(const DrawCommand& cmd);
+    static Bounds commandBounds(const DrawCommand& cmd);
+    string listFilteredCommands(int fd, const string& toolFilter, const string& userFilter, size_t limit = LIST_PAGE_SIZE, int after = 0) const;
     void clearAll();
     void clearClientCommands(int fd);
 
 private:
     map<int, DrawCommand> commands;
+    map<string, set<int>> type_index; // Command keys grouped by shape type
+    map<int, set<int>> fd_index; // Command keys grouped by owning client
+    unordered_map<string, int> id_keys; // Shape id -> command key
     mutable mutex mtx;
     int next_id = 1;
+    long next_version = 1;
+
+    void indexCommand(int key, const DrawCommand& cmd);
+    void unindexCommand(int key, const DrawCommand& cmd);
+    static string formatListEntry(const DrawCommand& cmd);
 };
 
 extern Canvas canvas; // Global canvas object
@@ -1,10 +1,48 @@
 #include "Client.h"
 #include <cstring>
 #include <ctime>
+#include <cerrno>
+#include <sys/socket.h>
 
 Client::Client(int socket, struct sockaddr_in addr, socklen_t len, const std::string& name)
-    : fd(socket), client_addr(addr), client_addr_len(len), last_activity(time(nullptr)) {
+    : fd(socket), client_addr(addr), client_addr_len(len), last_activity(time(nullptr)), heartbeat(false), subscribed(false) {
     strncpy(nickname, name.c_str(), sizeof(nickname));
     nickname[sizeof(nickname) - 1] = '\0';
 }
 
+
+/**
+ * @brief Queues data for the client and sends as much of it as the socket accepts right away.
+ *
+ * Whatever the socket does not accept stays in the output buffer and is sent by `flush_output`
+ * once select() reports the socket writable, so a slow client never blocks the server loop.
+ *
+ * @param data The data to be sent.
+ * @return false if the client has fallen more than MAX_OUTPUT_BUFFER bytes behind or the send failed, true otherwise.
+ */
+bool Client::queue_output(const std::string& data) {
+    if (output_buffer.size() > MAX_OUTPUT_BUFFER) {
+        return false;
+    }
+    output_buffer += data;
+    return flush_output();
+}
+
+/**
+ * @brief Sends queued data until the buffer is empty or the socket would block.
+ *
+ * @return false if the send failed, true otherwise.
+ */
+bool Client::flush_output() {
+    while (!output_buffer.empty()) {
+        ssize_t sent = send(fd, output_buffer.data(), output_buffer.size(), MSG_NOSIGNAL);
+        if (sent < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return errno == EAGAIN || errno == EWOULDBLOCK;
+        }
+        output_buffer.erase(0, sent);
+    }
+    return true;
+}
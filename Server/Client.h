@@ -5,6 +5,10 @@
 #include <ctime>
 #include <netinet/in.h>
 #include <string>
+#include "Bounds.h"
+
+#define MAX_OUTPUT_BUFFER (64 * 1024 * 1024) // Backlog at which a client is considered too slow to keep
+#define MAX_INPUT_LINE 65536 // Longest message a client may send without a newline
 
 class Client {
 public:
@@ -13,13 +17,21 @@ public:
     char nickname[20];
     socklen_t client_addr_len;
     time_t last_activity;
+    bool heartbeat; // Whether the client sends pings, which holds it to HEARTBEAT_TIMEOUT
+    bool subscribed; // Whether the client only wants the updates that touch `view`
+    Bounds view; // Region of the canvas the client has subscribed to
     std::vector<std::string> draw_commands;
+    std::string input_buffer; // Received bytes that do not yet make up a whole line
+    std::string output_buffer; // Bytes queued for the client that the socket has not accepted yet
 
-    Client() : fd(-1), client_addr_len(0), last_activity(0) {
+    Client() : fd(-1), client_addr_len(0), last_activity(0), heartbeat(false), subscribed(false) {
         nickname[0] = '\0';
     }
 
     Client(int socket, struct sockaddr_in addr, socklen_t len, const std::string& name);
+    bool queue_output(const std::string& data);
+    bool flush_output();
+    bool has_pending_output() const { return !output_buffer.empty(); }
 };
 
 #endif // CLIENT_H
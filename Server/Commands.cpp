@@ -1,5 +1,6 @@
 #include "Commands.h"
 #include <iostream>
+#include <algorithm>
 
 extern Canvas canvas; // Use the global canvas object
 
@@ -21,6 +22,7 @@ CommandType Commands::get_command_type(const std::string& command_str) {
     if (command_str == "show") return SHOW;
     if (command_str == "modify") return MODIFY;
     if (command_str == "exit") return EXIT;
+    if (command_str == "view") return VIEW;
     return INVALID;
 }
 
@@ -55,7 +57,9 @@ Commands Commands::parse_command(const std::string& input) {
  * This function takes a Client object, a buffer containing the command, the number of bytes received,
  * and the client file descriptor as parameters. It parses the command, determines its type, and performs
  * the corresponding action based on the command type. The function returns true if the command was processed
- * successfully, and false otherwise.
+ * successfully, and false otherwise. A draw, modify or delete also records the version stamped on the
+ * shape, which can be read back with get_version(). A draw or modify also records the area of the canvas it
+ * touched, which can be read back with get_bounds().
  * 
  * @param client The client object representing the connected client.
  * @param buffer The buffer containing the command received from the client.
@@ -69,11 +73,10 @@ bool Commands::process(Client& client, const char* buffer, ssize_t bytes_receive
 
     switch (command.type) {
         case DRAW:
-            apply_draw_command(buffer, client_fd);
+            version = apply_draw_command(buffer, client_fd);
             break;
         case LIST:
-            list_commands(client, command.parameters, canvas);
-            break;
+            return list_commands(client, command.parameters, canvas);
         case SELECT:
             select_command(client, command.parameters);
             break;
@@ -90,8 +93,10 @@ bool Commands::process(Client& client, const char* buffer, ssize_t bytes_receive
             show_commands(client, command.parameters, canvas);
             break;
         case MODIFY:
-            apply_modify_command(buffer, client_fd);
+            version = apply_modify_command(buffer, client_fd);
             break;
+        case VIEW:
+            return view_command(client, command.parameters, canvas);
         case EXIT:
             return false;
         default:
@@ -103,18 +108,73 @@ bool Commands::process(Client& client, const char* buffer, ssize_t bytes_receive
 }
 
 /**
- * Sends filtered commands to the client.
+ * Queues a page of filtered commands for the client.
  * 
  * @param client The client to send the commands to.
  * @param params The parameters for filtering the commands.
  *               The first parameter is the tool filter and the second parameter is the user filter.
+ *               The optional third parameter is the page size, which must be positive and is capped at
+ *               MAX_LIST_PAGE_SIZE, and the optional fourth parameter is the cursor returned with the previous page.
  * @param canvas The canvas containing the commands.
+ * @return true if the parameters were valid and the reply was queued, false otherwise.
  */
-void Commands::list_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas) {
+bool Commands::list_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas) {
+    if (params.size() < 2) {
+        std::cerr << "Invalid list command: expected tool and user filters" << std::endl;
+        return false;
+    }
     string toolFilter = params[0];
     string userFilter = params[1];
+    long limit = LIST_PAGE_SIZE;
+    int after = 0;
+    try {
+        if (params.size() > 2) {
+            limit = std::stol(params[2]);
+        }
+        if (params.size() > 3) {
+            after = std::stoi(params[3]);
+        }
+    } catch (const std::exception& e) {
+        std::cerr << "Invalid list page parameters: " << e.what() << std::endl;
+        return false;
+    }
+    if (limit <= 0) {
+        std::cerr << "Invalid list page size: " << limit << std::endl;
+        return false;
+    }
+    limit = std::min(limit, static_cast<long>(MAX_LIST_PAGE_SIZE));
+
+    return client.queue_output(canvas.listFilteredCommands(client.fd, toolFilter, userFilter, limit, after));
+}
 
-    canvas.sendFilteredCommands(client.fd, toolFilter, userFilter);
+/**
+ * Subscribes the client to the updates that touch a region of the canvas.
+ *
+ * "view <x1> <y1> <x2> <y2>" subscribes to a rectangle and queues the shapes inside it, which the
+ * client may have missed while it was looking elsewhere. "view all" goes back to every update.
+ *
+ * @param client The client subscribing.
+ * @param params Either "all" or the four corner coordinates of the region.
+ * @param canvas The canvas containing the commands.
+ * @return true if the parameters were valid and any reply was queued, false otherwise.
+ */
+bool Commands::view_command(Client& client, const std::vector<std::string>& params, Canvas& canvas) {
+    if (params.size() == 1 && params[0] == "all") {
+        client.subscribed = false;
+        return true;
+    }
+    if (params.size() != 4) {
+        std::cerr << "Invalid view command: expected all or four coordinates" << std::endl;
+        return false;
+    }
+    try {
+        client.view = Bounds(std::stoi(params[0]), std::stoi(params[1]), std::stoi(params[2]), std::stoi(params[3]));
+    } catch (const std::exception& e) {
+        std::cerr << "Invalid view coordinates: " << e.what() << std::endl;
+        return false;
+    }
+    client.subscribed = true;
+    return client.queue_output(canvas.snapshotRegion(client.view));
 }
 
 void Commands::select_command(Client& client, const std::vector<std::string>& params) {
@@ -130,8 +190,10 @@ void Commands::select_command(Client& client, const std::vector<std::string>& pa
  * @param canvas The canvas object.
  */
 void Commands::delete_command(Client& client, const std::vector<std::string>& params, Canvas& canvas) {
-    int id = std::stoi(params[0]);
-    canvas.removeCommand(id);
+    if (params.empty()) {
+        return;
+    }
+    version = canvas.removeCommand(params[0]);
 }
 
 void Commands::undo_command(Client& client) {
@@ -170,8 +232,9 @@ void Commands::show_commands(Client& client, const std::vector<std::string>& par
  *
  * @param command The command string to apply.
  * @param client_fd The file descriptor of the client.
+ * @return The version stamped on the shape, or 0 if no shape was changed.
  */
-void Commands::apply_draw_command(const std::string& command, int client_fd) {
+long Commands::apply_draw_command(const std::string& command, int client_fd) {
     std::istringstream iss(command);
     std::string cmdType;
     iss >> cmdType;
@@ -184,7 +247,11 @@ void Commands::apply_draw_command(const std::string& command, int client_fd) {
         std::cout << "Drawing command\n";
         iss >> drawCmd.type;
         iss >> drawCmd.id;
-        printf("ID: %d\n", drawCmd.id);
+        std::cout << "ID: " << drawCmd.id << "\n";
+        DrawCommand previous;
+        if (canvas.getCommand(drawCmd.id, previous)) {
+            bounds.include(Canvas::commandBounds(previous));
+        }
         if (drawCmd.type == "text") {
             std::cout << "Text command\n";
             iss >> drawCmd.x1 >> drawCmd.y1;
@@ -208,34 +275,49 @@ void Commands::apply_draw_command(const std::string& command, int client_fd) {
         } else {
             iss >> drawCmd.x1 >> drawCmd.y1 >> drawCmd.x2 >> drawCmd.y2 >> drawCmd.r >> drawCmd.g >> drawCmd.b;
         }
-        canvas.addCommand(drawCmd);
+        bounds.include(Canvas::commandBounds(drawCmd));
+        return canvas.addCommand(drawCmd);
     } else if (cmdType == "delete") { // Delete command
-        int id;
+        std::string id;
         iss >> id;
-        canvas.removeCommand(id); 
+        return canvas.removeCommand(id);
     } else if (cmdType == "modify") { // Modify command
         iss >> drawCmd.id >> drawCmd.type >> drawCmd.x1 >> drawCmd.y1 >> drawCmd.x2 >> drawCmd.y2 >> drawCmd.r >> drawCmd.g >> drawCmd.b;
-        canvas.modifyCommand(drawCmd.id, drawCmd); 
+        DrawCommand previous;
+        if (canvas.getCommand(drawCmd.id, previous)) {
+            bounds.include(Canvas::commandBounds(previous));
+            bounds.include(Canvas::commandBounds(drawCmd));
+        }
+        return canvas.modifyCommand(drawCmd.id, drawCmd);
     }
+    return 0;
 }
 
 /**
  * Modifies a command based on the given command string and applies the changes to the canvas.
  *
+ * The changes are applied to a copy of the stored command, so any field the modify does not
+ * mention keeps its current value.
+ *
  * @param command The command string to modify.
  * @param client_fd The file descriptor of the client.
+ * @return The version stamped on the shape, or 0 if there is no such shape.
  */
-void Commands::apply_modify_command(const std::string& command, int client_fd) {
+long Commands::apply_modify_command(const std::string& command, int client_fd) {
     std::istringstream iss(command);
     std::string cmdType;
     iss >> cmdType;
 
+    std::string id;
+    iss >> id;
+
     DrawCommand drawCmd;
+    if (!canvas.getCommand(id, drawCmd)) {
+        std::cout << "Command with ID " << id << " not found.\n";
+        return 0;
+    }
     drawCmd.fd = client_fd;
-
-    int id;
-    iss >> id;
-    drawCmd.id = id;
+    bounds.include(Canvas::commandBounds(drawCmd));
 
     std::string subCommand;
     iss >> subCommand;
@@ -243,15 +325,13 @@ void Commands::apply_modify_command(const std::string& command, int client_fd) {
     if (subCommand == "colour") {
         iss >> drawCmd.r >> drawCmd.g >> drawCmd.b;
         iss >> subCommand;  // Read "draw"
-        iss >> drawCmd.x1 >> drawCmd.y1 >> drawCmd.x2 >> drawCmd.y2;
-        drawCmd.type =  "line";  // Assume it's a line for now
-    } else if (subCommand == "draw") {
+    }
+    if (subCommand == "draw") {
         // Keep the existing color
         iss >> drawCmd.x1 >> drawCmd.y1 >> drawCmd.x2 >> drawCmd.y2;
-        drawCmd.type = "line";  // Assume it's a line for now
     }
 
-    canvas.modifyCommand(id, drawCmd);
-
+    bounds.include(Canvas::commandBounds(drawCmd));
     std::cout << "Modifying command: " << command << "\n";
+    return canvas.modifyCommand(id, drawCmd);
 }
\ No newline at end of file
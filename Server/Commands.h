@@ -21,6 +21,7 @@ enum CommandType {
     SHOW,
     EXIT,
     MODIFY,  
+    VIEW,
     INVALID
 };
 
@@ -33,17 +34,22 @@ public:
     bool process(Client& client, const char* buffer, ssize_t bytes_received, int client_fd);
     CommandType get_command_type(const std::string& command_str);
     Commands parse_command(const std::string& input);
+    long get_version() const { return version; }
+    const Bounds& get_bounds() const { return bounds; }
 private:
     CommandType type;
     std::vector<std::string> parameters;
-    void apply_draw_command(const std::string& command, int client_fd);
-    void list_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas);
+    long version = 0; // Version stamped by the last draw, modify or delete processed
+    Bounds bounds; // Area of the canvas covered by the shape a draw or modify changed, before and after
+    long apply_draw_command(const std::string& command, int client_fd);
+    bool list_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas);
     void select_command(Client& client, const std::vector<std::string>& params);
     void delete_command(Client& client, const std::vector<std::string>& params, Canvas& canvas);
     void undo_command(Client& client);
     void clear_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas);
     void show_commands(Client& client, const std::vector<std::string>& params, Canvas& canvas);
-    void apply_modify_command(const std::string& command, int client_fd);
+    long apply_modify_command(const std::string& command, int client_fd);
+    bool view_command(Client& client, const std::vector<std::string>& params, Canvas& canvas);
 };
 
 #endif // COMMANDS_H
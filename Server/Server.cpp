@@ -8,6 +8,7 @@
 #include <chrono>
 #include <fcntl.h>
 #include <sstream>
+#include <algorithm>
 
 using namespace std;
 
@@ -25,7 +26,7 @@ Server::Server(int port) : port(port), num_clients(0), max_fd(-1) {
  * 
  * This function creates a socket, binds it to a port, and listens for incoming connections.
  * It sets the server socket to non-blocking mode and adds it to the master set.
- * It also creates a separate thread to check for inactive clients.
+ * Inactive clients are checked for about once a second from the same loop.
  * 
  * The function enters a loop where it uses the `select` function to monitor the server socket and client sockets for activity.
  * If there is activity on the server socket, a new connection is handled.
@@ -77,23 +78,25 @@ void Server::run() {
     // Add the server socket to the master set
     FD_SET(server_fd, &master_set);
     max_fd = server_fd;
-
-    // Start a separate thread to check for inactive clients
-    thread inactivity_thread(&Server::check_inactivity, this);
-    inactivity_thread.detach();
+    time_t last_inactivity_check = time(nullptr);
 
     while (true) {
         fd_set read_fds;
+        fd_set write_fds;
         FD_ZERO(&read_fds);
+        FD_ZERO(&write_fds);
         FD_SET(server_fd, &read_fds);
         int max_fd = server_fd;
 
         {
             shared_lock<shared_mutex> lock(clients_mutex);
-            // Add all active client sockets to the read_fds set
+            // Add all active client sockets to the read_fds set, and those with queued output to the write_fds set
             for (const auto& client : clients) {
                 if (client.fd != -1) {
                     FD_SET(client.fd, &read_fds);
+                    if (client.has_pending_output()) {
+                        FD_SET(client.fd, &write_fds);
+                    }
                     max_fd = std::max(max_fd, client.fd);
                 }
             }
@@ -104,7 +107,7 @@ void Server::run() {
         timeout.tv_usec = 0;
 
         // Use select to monitor the sockets for activity
-        int activity = select(max_fd + 1, &read_fds, nullptr, nullptr, &timeout);
+        int activity = select(max_fd + 1, &read_fds, &write_fds, nullptr, &timeout);
         if (activity < 0) {
             if (errno == EINTR) {
                 continue;  // Interrupted system call, just continue
@@ -113,9 +116,13 @@ void Server::run() {
             break;
         }
 
-        if (activity == 0) {
-            // Timeout occurred, use this opportunity to clean up disconnected clients
+        // Clean up timed out and disconnected clients about once a second, even while the server is busy
+        if (time(nullptr) != last_inactivity_check) {
+            last_inactivity_check = time(nullptr);
             check_inactivity();
+        }
+
+        if (activity == 0) {
             continue;
         }
 
@@ -124,18 +131,43 @@ void Server::run() {
             handle_new_connection();
         }
 
-        // Check all clients for data
-        vector<Client*> clients_to_remove;
+        // Collect the ready sockets first, since handling a client can remove clients from the vector
+        vector<int> writable_fds;
+        vector<int> readable_fds;
         {
             shared_lock<shared_mutex> lock(clients_mutex);
-            for (auto& client : clients) {
-                if (client.fd != -1 && FD_ISSET(client.fd, &read_fds)) {
-                    if (!handle_client(client)) {
-                        clients_to_remove.push_back(&client);
-                    }
+            for (const auto& client : clients) {
+                if (client.fd == -1) {
+                    continue;
                 }
+                if (FD_ISSET(client.fd, &write_fds)) {
+                    writable_fds.push_back(client.fd);
+                }
+                if (FD_ISSET(client.fd, &read_fds)) {
+                    readable_fds.push_back(client.fd);
+                }
+            }
+        }
+
+        // Flush queued output to the clients whose sockets can take more
+        for (int fd : writable_fds) {
+            Client* client = find_client(fd);
+            if (client != nullptr && !client->flush_output()) {
+                log("Error sending data to client " + std::string(client->nickname) + ": " + std::string(strerror(errno)));
+                remove_client(*client);
+            }
+        }
+
+        // Check all clients for data
+        for (int fd : readable_fds) {
+            Client* client = find_client(fd);
+            if (client != nullptr) {
+                handle_client(*client);
             }
         }
+
+        // Drop clients marked as removed while broadcasting
+        drop_failed_clients();
     }
 
     // Shutdown the server
@@ -145,12 +177,27 @@ void Server::run() {
 /**
  * Handles a client connection.
  *
- * This function receives data from the client, processes the command,
- * sends a response message back to the client, and broadcasts the
- * command to all connected clients.
+ * This function receives data from the client and splits it into newline-terminated messages,
+ * since a client can send several messages before the server reads them. For each complete
+ * message it processes the command, sends a response message back to the client, and broadcasts
+ * the command to all connected clients. A partial message is kept until the rest of it arrives.
+ *
+ * A message may start with "req <id> ", a request id chosen by the client. Such a message is acked
+ * with "ack <id> ok <version>" or "ack <id> invalid" so the client can match the ack to the request,
+ * and is processed and broadcast without the prefix. Other messages get the plain acks. Broadcasts of
+ * draw, modify and delete messages are prefixed with "ver <version>", the version stamped on the
+ * shape, so every client can settle concurrent edits to a shape the same way.
+ *
+ * A "ping <token>" message is a heartbeat. It is answered with "pong <token>" and neither
+ * acked nor broadcast. A client that has sent a ping is dropped after HEARTBEAT_TIMEOUT seconds
+ * without any message, instead of INACTIVITY_TIMEOUT.
+ *
+ * A "view" message subscribes the client to a region of the canvas and is not broadcast. Draws and
+ * modifies are only broadcast to subscribed clients whose region they touch, and a modify reaches
+ * them as a draw of the whole shape, since they may not have the shape it changes.
  *
  * @param client The client object representing the connected client.
- * @return True if the command was processed successfully, false otherwise.
+ * @return True if the client is still connected, false otherwise.
  */
 bool Server::handle_client(Client& client) {
     // Receive data from the client
@@ -165,14 +212,85 @@ bool Server::handle_client(Client& client) {
         // Remove the client from the server
         remove_client(client);
         return false;
-    } else {
+    }
+
+    client.input_buffer.append(buffer, bytes_received);
+    client.last_activity = time(nullptr);
+    size_t line_end;
+    while ((line_end = client.input_buffer.find('\n')) != string::npos) {
+        string message = client.input_buffer.substr(0, line_end + 1);
+        client.input_buffer.erase(0, line_end + 1);
+
+        // Answer heartbeats straight away
+        if (message.compare(0, 5, "ping ") == 0 || message == "ping\n") {
+            client.heartbeat = true;
+            if (!client.queue_output("pong" + message.substr(4) + "END\n")) {
+                log("Error sending data to client " + std::string(client.nickname) + ": " + std::string(strerror(errno)));
+                close(client.fd);
+                client.fd = -1; // Mark client as removed
+                return false;
+            }
+            continue;
+        }
+
+        // Strip the request id, if the client sent one
+        string request_id;
+        if (message.compare(0, 4, "req ") == 0) {
+            size_t id_end = message.find(' ', 4);
+            if (id_end == string::npos) {
+                id_end = message.size() - 1;
+            }
+            request_id = message.substr(4, id_end - 4);
+            message.erase(0, std::min(id_end + 1, message.size() - 1));
+        }
+
         // Process the received command
-        bool success = process_command(client, buffer, bytes_received, client.fd);
-        std::string response_message = success ? "Command processed successfully." : "Invalid command.";
-        // Send the response message back to the client
-        send(client.fd, response_message.c_str(), response_message.size(), 0);
-        // Broadcast the command to all connected clients
-        broadcast_update(client, buffer, bytes_received);
+        long version = 0;
+        Bounds bounds;
+        bool success = process_command(client, message.c_str(), message.size(), client.fd, version, bounds);
+        std::string response_message;
+        if (request_id.empty()) {
+            response_message = success ? "Command processed successfully.\nEND\n" : "Invalid command.\nEND\n";
+        } else if (success) {
+            response_message = "ack " + request_id + " ok " + to_string(version) + "\nEND\n";
+        } else {
+            response_message = "ack " + request_id + " invalid\nEND\n";
+        }
+        // Queue the response message for the client
+        if (!client.queue_output(response_message)) {
+            log("Error sending data to client " + std::string(client.nickname) + ": " + std::string(strerror(errno)));
+            close(client.fd);
+            client.fd = -1; // Mark client as removed
+            return false;
+        }
+        // Subscriptions only concern the client that sent them
+        if (message.compare(0, 5, "view ") == 0) {
+            continue;
+        }
+
+        // Subscribed clients get a modified shape whole
+        string region_update;
+        if (version > 0 && message.compare(0, 7, "modify ") == 0) {
+            istringstream iss(message);
+            string cmdType, id;
+            iss >> cmdType >> id;
+            DrawCommand modified;
+            if (canvas.getCommand(id, modified)) {
+                region_update = Canvas::formatDraw(modified);
+            }
+        }
+
+        // Broadcast the command to all connected clients, stamped with the shape's version
+        if (version > 0) {
+            message = "ver " + to_string(version) + " " + message;
+        }
+        broadcast_update(client, message.c_str(), message.size(), bounds, region_update);
+    }
+
+    if (client.input_buffer.size() > MAX_INPUT_LINE) {
+        log("Message from client " + std::string(client.nickname) + " is too long. Removing client.");
+        remove_client(client);
+        return false;
     }
     return true;
 }
@@ -180,22 +298,39 @@ bool Server::handle_client(Client& client) {
 /**
  * Broadcasts an update to all connected clients, except the sender.
  *
+ * An update that touches a known area of the canvas is skipped for clients subscribed to a
+ * region it does not intersect.
+ *
  * @param sender The client who sent the update.
  * @param buffer A pointer to the buffer containing the update data.
  * @param buffer_length The length of the update data in bytes.
+ * @param bounds The area of the canvas the update touches, or empty if it is not tied to an area.
+ * @param region_update The framed update to send to subscribed clients instead, if not empty.
  */
-void Server::broadcast_update(const Client& sender, const char* buffer, size_t buffer_length) {
+void Server::broadcast_update(const Client& sender, const char* buffer, size_t buffer_length, const Bounds& bounds, const string& region_update) {
+    // Frame the update so the receiver can tell where it ends
+    string update(buffer, buffer_length);
+    update += "END\n";
     printf("Broadcasting update to %lu clients\n", clients.size());
     //shared_lock<shared_mutex> lock(clients_mutex);
     for (auto& client : clients) {
         printf("Client %s\n", client.nickname);
-        if (client.fd != sender.fd) {
+        if (client.fd != -1 && client.fd != sender.fd) {
             printf("Sending to client %s\n", client.nickname);
             if (fcntl(client.fd, F_GETFD) != -1) {
                 //const char* buffer = "Server broadcast"; // Change the assignment to a character array
-                ssize_t num_bytes = send(client.fd, buffer, buffer_length, 0);
-                if (num_bytes < 0) {
+                const string* data = &update;
+                if (client.subscribed && !bounds.empty) {
+                    if (!bounds.intersects(client.view)) {
+                        continue;  // Outside the client's region
+                    }
+                    if (!region_update.empty()) {
+                        data = &region_update;
+                    }
+                }
+                if (!client.queue_output(*data)) {
                     log("Error sending data to client " + std::string(client.nickname) + ": " + std::string(strerror(errno)));
+                    close(client.fd);
                     client.fd = -1; // Mark client as removed
                 }
             } else {
@@ -216,11 +351,16 @@ void Server::broadcast_update(const Client& sender, const char* buffer, size_t b
  * @param buffer The buffer containing the command data.
  * @param bytes_received The number of bytes received in the buffer.
  * @param client_fd The file descriptor of the client connection.
+ * @param version Set to the version stamped on the shape the command changed, or 0 if it changed none.
+ * @param bounds Set to the area of the canvas the command touched, or left empty.
  * @return `true` if the command was processed successfully, `false` otherwise.
  */
-bool Server::process_command(Client& client, const char* buffer, ssize_t bytes_received, int client_fd) {
+bool Server::process_command(Client& client, const char* buffer, ssize_t bytes_received, int client_fd, long& version, Bounds& bounds) {
     Commands processor;
-    return processor.process(client, buffer, bytes_received, client_fd);
+    bool success = processor.process(client, buffer, bytes_received, client_fd);
+    version = processor.get_version();
+    bounds = processor.get_bounds();
+    return success;
 }
 
 
@@ -259,37 +399,28 @@ void Server::remove_client(Client& client) {
  * Also checks for disconnected clients that need to be reconnected.
  */
 void Server::check_inactivity() {
-    // Create a vector to store the clients that need to be removed due to inactivity
-    vector<Client*> clients_to_remove;
-    
     {
-        // Acquire a shared lock on the clients_mutex to safely access the clients vector
-        shared_lock<shared_mutex> lock(clients_mutex); 
-        
+        // Acquire a unique lock, since timed out clients are closed and marked as removed in place
+        unique_lock<shared_mutex> lock(clients_mutex);
+
         // Get the current time
         time_t now = time(nullptr);
-        
-        // Iterate over all clients
+
+        // Close every client that has exceeded its inactivity timeout. The clients are only marked
+        // with fd -1 here and dropped together afterwards, so no client moves while others are closed
         for (auto& client : clients) {
-            // Check if the client is active and has exceeded the inactivity timeout
-            if (client.fd != -1 && difftime(now, client.last_activity) > INACTIVITY_TIMEOUT) {
-                // Add the client to the clients_to_remove vector
-                clients_to_remove.push_back(&client);
+            int timeout = client.heartbeat ? HEARTBEAT_TIMEOUT : INACTIVITY_TIMEOUT;
+            if (client.fd != -1 && difftime(now, client.last_activity) > timeout) {
+                cout << "Client " << client.nickname << " timed out due to inactivity.\n";
+                disconnected_draw_commands[client.nickname] = DisconnectedClient(client.draw_commands, client.last_activity);
+                close(client.fd);
+                client.fd = -1; // Mark client as removed
             }
         }
     }
-    
-    // Remove the inactive clients
-    for (auto client_ptr : clients_to_remove) {
-        // Print a message indicating that the client has timed out due to inactivity
-        cout << "Client " << client_ptr->nickname << " timed out due to inactivity.\n";
-        
-        // Remove the client from the server
-        remove_client(*client_ptr);
-        
-        // Print a message indicating that the client has been removed
-        printf("Client removed %s\n", client_ptr->nickname);
-    }
+
+    // Remove the timed out clients from the vector
+    drop_failed_clients();
 
     {
         unique_lock<shared_mutex> lock(clients_mutex); // Acquire a unique lock to modify the clients vector
@@ -383,13 +514,34 @@ void Server::handle_new_connection() {
     int flags = fcntl(new_socket, F_GETFL, 0);
     fcntl(new_socket, F_SETFL, flags | O_NONBLOCK);
 
-    // Add new client to the client list
-    {
-        unique_lock<shared_mutex> lock(clients_mutex);
-        clients.emplace_back(new_socket, client_addr, client_addr_len, "client_" + to_string(new_socket));
-        cout << "New connection from client " << clients.back().nickname << endl;
+    // Add new client to the client list and queue the current canvas state for it
+    unique_lock<shared_mutex> lock(clients_mutex);
+    clients.emplace_back(new_socket, client_addr, client_addr_len, "client_" + to_string(new_socket));
+    cout << "New connection from client " << clients.back().nickname << endl;
+    if (!clients.back().queue_output(canvas.snapshotCommands())) {
+        log("Error sending the canvas to client " + std::string(clients.back().nickname) + ": " + std::string(strerror(errno)));
+        close(new_socket);
+        clients.pop_back();
     }
+}
+
+/**
+ * Finds a connected client by its file descriptor.
+ *
+ * @param fd The file descriptor of the client.
+ * @return A pointer to the client, or nullptr if no connected client has that file descriptor.
+ */
+Client* Server::find_client(int fd) {
+    auto it = find_if(clients.begin(), clients.end(), [fd](const Client& c) { return c.fd == fd; });
+    return it != clients.end() ? &*it : nullptr;
+}
 
-    // Send current canvas state to the new client
-    canvas.sendCurrentCommands(new_socket);
+/**
+ * Removes the clients that were marked as removed because a send to them failed.
+ */
+void Server::drop_failed_clients() {
+    unique_lock<shared_mutex> lock(clients_mutex);
+    clients.erase(remove_if(clients.begin(), clients.end(),
+        [](const Client& c) { return c.fd == -1; }),
+        clients.end());
 }
\ No newline at end of file
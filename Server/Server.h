@@ -16,6 +16,7 @@
 #define PORT 6001
 #define MAX_CLIENTS 100
 #define INACTIVITY_TIMEOUT 300
+#define HEARTBEAT_TIMEOUT 5 // Seconds of silence after which a client that sends pings is considered dead
 #define RECONNECT_TIMEOUT 60 
 
 using namespace std;
@@ -40,8 +41,8 @@ private:
     shared_mutex fd_mutex;
 
     bool handle_client(Client& client);
-    void broadcast_update(const Client& sender, const char* buffer, size_t buffer_length);
-    bool process_command(Client& client, const char* buffer, ssize_t bytes_received, int client_fd);
+    void broadcast_update(const Client& sender, const char* buffer, size_t buffer_length, const Bounds& bounds = Bounds(), const string& region_update = "");
+    bool process_command(Client& client, const char* buffer, ssize_t bytes_received, int client_fd, long& version, Bounds& bounds);
     void remove_client(Client& client);
     void check_inactivity();
     void adopt_draw_commands(const string& nickname);
@@ -49,6 +50,8 @@ private:
     void shutdown_server();
     string serialize_draw_command(const DrawCommand& cmd);
     void handle_new_connection();
+    Client* find_client(int fd);
+    void drop_failed_clients();
 };
 
 #endif // SERVER_H